@@ -0,0 +1,150 @@
+"""
+Shared helpers for the benchmark scripts: percentiles, memory, result files
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile (None for no values)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def distribution(values: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / mean / max, scaled (seconds -> ms by default)"""
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    return {
+        "p50": round(percentile(values, 50) * scale, 3),
+        "p95": round(percentile(values, 95) * scale, 3),
+        "p99": round(percentile(values, 99) * scale, 3),
+        "mean": round(sum(values) / len(values) * scale, 3),
+        "max": round(max(values) * scale, 3),
+    }
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size of a process in MB (Linux /proc, psutil elsewhere)"""
+    pid = pid or os.getpid()
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process(pid).memory_info().rss / 2**20, 1)
+    except Exception:
+        return None
+
+
+def git_commit() -> Optional[str]:
+    """Current commit of the repository, if available"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata(args) -> Dict:
+    """Context stored with every result file"""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+    }
+
+
+def write_results(name: str, results: Dict, output: Optional[Path] = None) -> Path:
+    """
+    Save results as JSON
+
+    Args:
+        name: Benchmark name (file prefix)
+        results: Result document
+        output: File path (default: benchmarks/results/<name>-<timestamp>.json)
+
+    Returns:
+        Path written
+    """
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    return output
+
+
+def compare(current: Iterable[Dict],
+            baseline: Iterable[Dict],
+            key_fields: List[str],
+            metrics: Dict[str, str],
+            threshold: float) -> List[str]:
+    """
+    Print metric changes against a baseline run and list regressions
+
+    Args:
+        current: Result rows of this run
+        baseline: Result rows of the baseline file
+        key_fields: Fields identifying the same scenario in both runs
+        metrics: Dotted metric path -> "lower" or "higher" (which direction is better)
+        threshold: Relative change (0.1 = 10%) counted as a regression
+
+    Returns:
+        Descriptions of the regressions found
+    """
+    def key(row):
+        return tuple(row.get(f) for f in key_fields)
+
+    def lookup(row, path):
+        for part in path.split("."):
+            row = row.get(part) if isinstance(row, dict) else None
+        return row
+
+    base = {key(row): row for row in baseline}
+    regressions = []
+    matched = 0
+    for row in current:
+        old = base.get(key(row))
+        if old is None:
+            continue
+        matched += 1
+        label = " ".join(f"{f}={v}" for f, v in zip(key_fields, key(row)))
+        print(f"\n📊 {label}")
+        for path, better in metrics.items():
+            new_value, old_value = lookup(row, path), lookup(old, path)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = change > threshold if better == "lower" else change < -threshold
+            flag = "  ⚠️ regression" if worse else ""
+            print(f"   {path:<24} {old_value:>10} -> {new_value:>10} ({change:+.1%}){flag}")
+            if worse:
+                regressions.append(f"{label}: {path} {old_value} -> {new_value} ({change:+.1%})")
+    if not matched:
+        print("⚠️ No scenario of this run matches the baseline")
+    return regressions
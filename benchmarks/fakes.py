@@ -0,0 +1,273 @@
+"""
+Local stand-ins for the services the assistant talks to, for benchmarks
+
+- FakeOllama: /api/chat and /api/generate streaming a scripted ReAct turn
+  (one tool call, then a final answer) at a configurable token rate; with
+  prefix_cache, prefill only pays for the part of the prompt not shared with
+  a recent prompt, like Ollama's per-slot KV cache
+- FakeSpring: in-memory /api/conversations/{id}/messages and /summary
+- FakeSerpApi: /search returning canned Google / YouTube results
+
+Run standalone to point a manually started app at them:
+    python benchmarks/fakes.py --ollama-port 18091 --spring-port 18092 --serpapi-port 18093
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Marker the fake search results carry, so the fake model knows a tool already ran
+RESULT_MARKER = "BENCH_RESULT"
+
+
+class OllamaScript:
+    """What the fake model answers and how fast"""
+
+    def __init__(self,
+                 tool: Optional[str] = "Google_Search",
+                 answer_tokens: int = 60,
+                 tokens_per_second: float = 50.0,
+                 prefill_ms: float = 20.0,
+                 prefix_cache: bool = False,
+                 slots: int = 4,
+                 load_ms: float = 0.0):
+        self.tool = tool
+        self.answer_tokens = answer_tokens
+        self.tokens_per_second = tokens_per_second
+        self.prefill_ms = prefill_ms
+        self.prefix_cache = prefix_cache
+        self.load_ms = load_ms
+        self._slots: List[List[str]] = [[] for _ in range(max(1, slots))]
+        self._num_ctx = None
+        self._lock = threading.Lock()
+
+    def prefill(self, prompt: str, options: Dict) -> Dict[str, float]:
+        """
+        Prefill cost of a prompt: prefill_ms for a full prompt, or only for
+        its words past the longest prefix cached in a slot. A request with
+        another num_ctx reloads the model (load_ms) and empties the cache.
+        """
+        words = prompt.split()
+        with self._lock:
+            load_ms = 0.0
+            num_ctx = options.get("num_ctx")
+            if num_ctx != self._num_ctx:
+                if self._num_ctx is not None or num_ctx is not None:
+                    load_ms = self.load_ms
+                    self._slots = [[] for _ in self._slots]
+                self._num_ctx = num_ctx
+
+            if not self.prefix_cache or not words:
+                return {"prefill_ms": self.prefill_ms, "evaluated": len(words), "load_ms": load_ms}
+
+            def shared(slot: List[str]) -> int:
+                n = 0
+                for a, b in zip(slot, words):
+                    if a != b:
+                        break
+                    n += 1
+                return n
+
+            # Longest match wins, otherwise the least useful slot is overwritten
+            best = max(range(len(self._slots)), key=lambda i: shared(self._slots[i]))
+            cached = shared(self._slots[best])
+            if cached == 0:
+                best = min(range(len(self._slots)), key=lambda i: len(self._slots[i]))
+            self._slots[best] = words
+        evaluated = len(words) - cached
+        return {"prefill_ms": self.prefill_ms * evaluated / len(words), "evaluated": evaluated, "load_ms": load_ms}
+
+    def reply(self, prompt: str) -> str:
+        """Model output for a prompt: tool call first, final answer once a result is present"""
+        if "summarize the conversation" in prompt:
+            return "The user asked about car maintenance and got step-by-step answers."
+        if self.tool and RESULT_MARKER not in prompt:
+            return (
+                "Thought: I should look this up\n"
+                f"Action: {self.tool}\n"
+                "Action Input: brake pad replacement interval"
+            )
+        words = " ".join(f"word{i}" for i in range(self.answer_tokens))
+        return f"Thought: I now know the final answer\nFinal Answer: {words}"
+
+
+def _chunks(text: str) -> List[str]:
+    """Split text into token-like pieces (words with their leading space)"""
+    pieces = text.split(" ")
+    return [pieces[0]] + [" " + p for p in pieces[1:]]
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    script = OllamaScript()
+
+    def do_GET(self):
+        # Health probe (/api/tags)
+        _send_json(self, 200, {"models": [{"name": "fake"}]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        chat = self.path.startswith("/api/chat")
+        if chat:
+            prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        else:
+            prompt = body.get("prompt", "")
+
+        started = time.monotonic()
+        script = self.script
+        cost = script.prefill(prompt, body.get("options") or {})
+        time.sleep((cost["load_ms"] + cost["prefill_ms"]) / 1000)
+        pieces = _chunks(script.reply(prompt))
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        delay = 1 / script.tokens_per_second if script.tokens_per_second > 0 else 0
+        for piece in pieces:
+            if chat:
+                self._write_chunk({"model": "fake", "message": {"role": "assistant", "content": piece}, "done": False})
+            else:
+                self._write_chunk({"model": "fake", "response": piece, "done": False})
+            if delay:
+                time.sleep(delay)
+
+        total_ns = int((time.monotonic() - started) * 1e9)
+        final = {
+            "model": "fake",
+            "done": True,
+            "total_duration": total_ns,
+            "load_duration": int(cost["load_ms"] * 1e6),
+            "prompt_eval_count": cost["evaluated"],
+            "prompt_eval_duration": int(cost["prefill_ms"] * 1e6),
+            "eval_count": len(pieces),
+            "eval_duration": max(1, total_ns - int((cost["load_ms"] + cost["prefill_ms"]) * 1e6)),
+        }
+        if chat:
+            final["message"] = {"role": "assistant", "content": ""}
+        else:
+            final["response"] = ""
+        self._write_chunk(final)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, obj: Dict) -> None:
+        data = (json.dumps(obj) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSpring(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    messages: Dict[str, List[Dict]] = {}
+    summaries: Dict[str, Dict] = {}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            if self.path.endswith("/summary"):
+                summary = self.summaries.get(self.path)
+                _send_json(self, 200 if summary else 404, summary or {"error": "not found"})
+                return
+            _send_json(self, 200, list(self.messages.get(self.path, [])))
+
+    def do_PUT(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.lock:
+            self.summaries[self.path] = body
+        _send_json(self, 200, body)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.lock:
+            self.messages.setdefault(self.path, []).append(body)
+        _send_json(self, 200, body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSerpApi(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency_ms = 30.0
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        engine = params.get("engine", ["google"])[0]
+        time.sleep(self.latency_ms / 1000)
+
+        if engine == "youtube":
+            results = {"video_results": [
+                {"title": f"{RESULT_MARKER} video {i}", "link": f"https://www.youtube.com/watch?v=vid{i}",
+                 "channel": {"name": "Bench Garage"}}
+                for i in range(5)
+            ]}
+        else:
+            results = {"organic_results": [
+                {"title": f"{RESULT_MARKER} result {i}", "link": f"https://example.com/{i}",
+                 "snippet": "Brake pads usually last 30,000 to 70,000 miles depending on driving."}
+                for i in range(5)
+            ]}
+        _send_json(self, 200, results)
+
+    def log_message(self, *args):
+        pass
+
+
+def _send_json(handler: BaseHTTPRequestHandler, code: int, obj) -> None:
+    data = json.dumps(obj).encode()
+    handler.send_response(code)
+    handler.send_header("Content-Type", "application/json")
+    handler.send_header("Content-Length", str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+def serve(handler, port: int) -> ThreadingHTTPServer:
+    """Start a fake on 127.0.0.1:port in a daemon thread"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark fakes")
+    parser.add_argument("--ollama-port", type=int, default=18091)
+    parser.add_argument("--spring-port", type=int, default=18092)
+    parser.add_argument("--serpapi-port", type=int, default=18093)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--prefill-ms", type=float, default=20.0)
+    parser.add_argument("--prefix-cache", action="store_true")
+    parser.add_argument("--tool", default="Google_Search", help="Tool the fake model calls ('none' to answer directly)")
+    args = parser.parse_args()
+
+    FakeOllama.script = OllamaScript(
+        tool=None if args.tool == "none" else args.tool,
+        answer_tokens=args.answer_tokens,
+        tokens_per_second=args.tokens_per_second,
+        prefill_ms=args.prefill_ms,
+        prefix_cache=args.prefix_cache,
+    )
+    serve(FakeOllama, args.ollama_port)
+    serve(FakeSpring, args.spring_port)
+    serve(FakeSerpApi, args.serpapi_port)
+    print(f"🤖 Fake Ollama:  http://127.0.0.1:{args.ollama_port}")
+    print(f"🔗 Fake Spring:  http://127.0.0.1:{args.spring_port}")
+    print(f"🔍 Fake SerpAPI: http://127.0.0.1:{args.serpapi_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+End-to-end load test for /chat and /chat/stream
+
+Starts the FastAPI app (src/main.py) in a subprocess wired to local fakes
+(Ollama, Spring conversations API, SerpAPI), drives the endpoints at one or
+more concurrency levels and reports throughput, time to first token,
+latency percentiles and server RSS. Results are written as JSON; pass
+--compare to diff against an earlier run.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 1,4,16 --requests 64
+    python benchmarks/load_test.py --compare benchmarks/results/baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fakes
+from common import ROOT, compare, distribution, rss_mb, run_metadata, write_results
+
+QUESTION = "How often should I replace my brake pads?"
+
+COMPARE_METRICS = {
+    "throughput_rps": "higher",
+    "latency_ms.p50": "lower",
+    "latency_ms.p95": "lower",
+    "latency_ms.p99": "lower",
+    "ttft_ms.p50": "lower",
+    "ttft_ms.p95": "lower",
+    "rss_mb.peak": "lower",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fakes(args) -> Dict[str, str]:
+    """Start the fakes in this process and return their base URLs"""
+    fakes.FakeOllama.script = fakes.OllamaScript(
+        tool=None if args.tool == "none" else args.tool,
+        answer_tokens=args.answer_tokens,
+        tokens_per_second=args.tokens_per_second,
+        prefill_ms=args.prefill_ms,
+        prefix_cache=args.prefix_cache,
+        load_ms=args.load_ms,
+    )
+    fakes.FakeSerpApi.latency_ms = args.serpapi_latency_ms
+
+    urls = {}
+    for name, handler in (("ollama", fakes.FakeOllama),
+                          ("spring", fakes.FakeSpring),
+                          ("serpapi", fakes.FakeSerpApi)):
+        server = fakes.serve(handler, 0)
+        urls[name] = f"http://127.0.0.1:{server.server_address[1]}"
+    return urls
+
+
+def start_app(args, urls: Dict[str, str]) -> subprocess.Popen:
+    """Start uvicorn serving src/main.py against the fakes"""
+    env = dict(os.environ)
+    env.update({
+        "SERPAPI_API_KEY": "bench",
+        "SERPAPI_BASE_URL": urls["serpapi"],
+        "SPRING_API_URL": urls["spring"],
+        "OLLAMA_BASE_URLS": urls["ollama"],
+        "LOG_LEVEL": "WARNING",
+        "LANGCHAIN_TRACING_V2": "false",
+    })
+    # Every benchmark client counts as one tenant for /chat: don't let the
+    # per-tenant limit turn the run into a rejection test unless asked to
+    env.setdefault("ADMISSION_MAX_PER_TENANT", "100000")
+    env.setdefault("ADMISSION_MAX_QUEUE", "100000")
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    cmd = [sys.executable, "-m", "uvicorn", "main:app",
+           "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=args.app_dir, env=env)
+
+
+def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App not healthy after {timeout:.0f}s")
+
+
+def seed_history(conv_id: str, messages: int) -> None:
+    """Give a conversation prior messages in the fake Spring store"""
+    path = f"/api/conversations/{conv_id}/messages"
+    fakes.FakeSpring.messages[path] = [
+        {"role": "USER" if i % 2 == 0 else "ASSISTANT",
+         "content": f"Earlier message {i} about oil changes, tires and brakes."}
+        for i in range(messages)
+    ]
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS while a scenario runs"""
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[float] = []
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            value = rss_mb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self._done.wait(self.interval)
+
+    def stop(self) -> Dict[str, Optional[float]]:
+        self._done.set()
+        self.join()
+        if not self.samples:
+            return {"start": None, "peak": None, "end": None}
+        return {"start": self.samples[0], "peak": max(self.samples), "end": self.samples[-1]}
+
+
+_session = threading.local()
+
+
+def http() -> requests.Session:
+    """One keep-alive session per client thread"""
+    if not hasattr(_session, "value"):
+        _session.value = requests.Session()
+    return _session.value
+
+
+def chat_request(base_url: str, args) -> Dict:
+    started = time.perf_counter()
+    try:
+        resp = http().post(f"{base_url}/chat", json={"question": QUESTION}, timeout=args.timeout)
+        elapsed = time.perf_counter() - started
+        return {"status": resp.status_code, "latency": elapsed, "ttft": None,
+                "bytes": len(resp.content)}
+    except requests.RequestException as e:
+        return {"status": None, "latency": time.perf_counter() - started, "ttft": None,
+                "bytes": 0, "error": str(e)}
+
+
+def stream_request(base_url: str, args) -> Dict:
+    conv_id = f"bench-{uuid.uuid4().hex[:12]}"
+    if args.history_messages:
+        seed_history(conv_id, args.history_messages)
+
+    body = {"question": QUESTION, "convId": conv_id, "format": args.stream_format}
+    started = time.perf_counter()
+    ttft = None
+    size = 0
+    try:
+        with http().post(f"{base_url}/chat/stream", json=body, stream=True, timeout=args.timeout,
+                         headers={"Authorization": f"Bearer {conv_id}"}) as resp:
+            if resp.status_code != 200:
+                return {"status": resp.status_code, "latency": time.perf_counter() - started,
+                        "ttft": None, "bytes": 0}
+
+            pending = b""
+            for chunk in resp.iter_content(chunk_size=None):
+                size += len(chunk)
+                if ttft is not None or not chunk:
+                    continue
+                if args.stream_format == "text":
+                    ttft = time.perf_counter() - started
+                    continue
+                # Framed: first answer token, not the tool events before it
+                pending += chunk
+                if b'"type": "token"' in pending or b'"type":"token"' in pending:
+                    ttft = time.perf_counter() - started
+                    pending = b""
+
+        return {"status": 200, "latency": time.perf_counter() - started, "ttft": ttft, "bytes": size}
+    except requests.RequestException as e:
+        return {"status": None, "latency": time.perf_counter() - started, "ttft": ttft,
+                "bytes": size, "error": str(e)}
+
+
+def run_scenario(base_url: str, endpoint: str, concurrency: int, args, server_pid: int) -> Dict:
+    """Send args.requests requests with `concurrency` clients and summarize them"""
+    send = chat_request if endpoint == "/chat" else stream_request
+
+    # Warm-up: connection pools, agent imports, first prompt render
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: send(base_url, args), range(min(args.warmup, args.requests))))
+
+    sampler = RssSampler(server_pid)
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: send(base_url, args), range(args.requests)))
+    wall = time.perf_counter() - started
+    rss = sampler.stop()
+
+    ok = [r for r in results if r["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+
+    summary = {
+        "endpoint": endpoint,
+        "format": args.stream_format if endpoint == "/chat/stream" else "json",
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3) if wall else None,
+        "latency_ms": distribution([r["latency"] for r in ok]),
+        "ttft_ms": distribution([r["ttft"] for r in ok if r["ttft"] is not None]),
+        "rss_mb": rss,
+    }
+    errors = [r["error"] for r in results if r.get("error")]
+    if errors:
+        summary["sample_errors"] = errors[:3]
+    return summary
+
+
+def print_summary(row: Dict) -> None:
+    lat, ttft = row["latency_ms"], row["ttft_ms"]
+    print(
+        f"{row['endpoint']:<13} c={row['concurrency']:<3} ok={row['ok']}/{row['requests']} "
+        f"{row['throughput_rps']} req/s | latency p50 {lat['p50']} p95 {lat['p95']} p99 {lat['p99']} ms"
+        + (f" | ttft p50 {ttft['p50']} p95 {ttft['p95']} ms" if ttft["p50"] is not None else "")
+        + f" | rss peak {row['rss_mb']['peak']} MB"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test /chat and /chat/stream against local fakes")
+    parser.add_argument("--endpoints", default="/chat,/chat/stream", help="Comma-separated endpoints")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=4, help="Unmeasured requests per scenario")
+    parser.add_argument("--stream-format", default="text", choices=["text", "ndjson", "sse"])
+    parser.add_argument("--history-messages", type=int, default=0, help="Prior messages per conversation")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    # Fake model / search behaviour
+    parser.add_argument("--tool", default="Google_Search", help="Tool the fake model calls ('none' to answer directly)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--prefill-ms", type=float, default=20.0, help="Prefill time of a whole prompt")
+    parser.add_argument("--prefix-cache", action="store_true",
+                        help="Fake model reuses cached prompt prefixes (prefill only for the new part)")
+    parser.add_argument("--load-ms", type=float, default=0.0, help="Model reload time when num_ctx changes")
+    parser.add_argument("--serpapi-latency-ms", type=float, default=30.0)
+    # App
+    parser.add_argument("--app-dir", type=Path, default=ROOT / "src")
+    parser.add_argument("--port", type=int, default=0, help="App port (0 picks a free one)")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the app, e.g. ADMISSION_MAX_CONCURRENT=8")
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    # Output
+    parser.add_argument("--output", type=Path, help="Result file (default benchmarks/results/load-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    args.port = args.port or free_port()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    urls = start_fakes(args)
+    proc = start_app(args, urls)
+    try:
+        startup = time.perf_counter()
+        wait_ready(base_url, proc, args.startup_timeout)
+        startup_seconds = time.perf_counter() - startup
+        print(f"✅ App ready in {startup_seconds:.2f}s (rss {rss_mb(proc.pid)} MB)")
+
+        runs = []
+        for endpoint in [e.strip() for e in args.endpoints.split(",") if e.strip()]:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                row = run_scenario(base_url, endpoint, concurrency, args, proc.pid)
+                print_summary(row)
+                runs.append(row)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    results = {
+        "benchmark": "load",
+        "meta": run_metadata(args),
+        "startup_seconds": round(startup_seconds, 3),
+        "runs": runs,
+    }
+    path = write_results("load", results, args.output)
+    print(f"💾 Results written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(runs, baseline.get("runs", []),
+                              ["endpoint", "format", "concurrency"], COMPARE_METRICS, args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
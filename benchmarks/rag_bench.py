@@ -0,0 +1,346 @@
+"""
+Retrieval micro-benchmark and quality check for services/rag_service.py
+
+For the shipped index and synthetic corpora scaled up from it, measures:
+- cold load: load_faiss (FAISS from disk) and build_bm25 (BM25 build),
+  with the RSS each adds
+- per-query latency by stage: route, filter, bm25, embed, faiss, fusion,
+  format, and retrieval (wall time of bm25 and embed + faiss, which run
+  concurrently)
+- observation size: approximate tokens of the text the agent reads
+- quality on a labelled query set: recall@k and MRR for the hybrid ranking
+  and for BM25 / FAISS alone
+
+Synthetic corpora keep the shipped chunks and add (N-1) x as many distractor
+chunks, each mixing sentences of three random shipped chunks, with the mean
+of their vectors plus noise. Distractors share the vocabulary and embedding
+space of the real text without being about one topic, so quality at scale
+shows how well the labelled pages still rank in a larger index. Results are written as JSON; --compare flags latency, memory and
+quality regressions against an earlier run.
+
+Usage:
+    python benchmarks/rag_bench.py --scales 1,10,100
+    python benchmarks/rag_bench.py --scales 1 --compare benchmarks/results/rag-20250101-120000.json
+    python benchmarks/rag_bench.py --embeddings fake   # no model download; FAISS quality is meaningless
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import ROOT, compare, distribution, rss_mb, run_metadata, write_results
+
+STAGES = ["route", "filter", "bm25", "embed", "faiss", "retrieval", "fusion", "format"]
+
+PERF_METRICS = {
+    "load.vectorstore_seconds": "lower",
+    "load.bm25_seconds": "lower",
+    "memory_mb.total": "lower",
+    "latency_ms.total.p50": "lower",
+    "latency_ms.total.p95": "lower",
+    "observation_tokens.p50": "lower",
+    **{f"latency_ms.{stage}.p50": "lower" for stage in STAGES},
+}
+
+QUALITY_METRICS = {
+    "quality.hybrid.recall@1": "higher",
+    "quality.hybrid.recall@3": "higher",
+    "quality.hybrid.recall@10": "higher",
+    "quality.hybrid.mrr": "higher",
+}
+
+
+def doc_labels(doc) -> List[str]:
+    """"file.pdf:page" of a chunk, or of every page a compacted chunk stands for (sources may be Windows paths)"""
+    labels = []
+    for ref in doc.metadata.get("refs") or [doc.metadata]:
+        source = re.split(r"[\\/]", str(ref.get("source", "")))[-1]
+        labels.append(f"{source}:{ref.get('page')}")
+    return labels
+
+
+def load_queries(path: Path) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def ranking_quality(ranked: List, relevant: set, ks: List[int]) -> Dict[str, float]:
+    """recall@k over relevant pages and reciprocal rank of the first relevant one"""
+    labels = []
+    for doc in ranked:
+        for label in doc_labels(doc):
+            if label not in labels:
+                labels.append(label)
+
+    scores = {}
+    for k in ks:
+        scores[f"recall@{k}"] = len(relevant & set(labels[:k])) / len(relevant)
+    scores["rr"] = next((1 / rank for rank, label in enumerate(labels, 1) if label in relevant), 0.0)
+    return scores
+
+
+def mean_quality(per_query: List[Dict[str, float]]) -> Dict[str, float]:
+    keys = per_query[0].keys()
+    result = {k: round(sum(q[k] for q in per_query) / len(per_query), 4) for k in keys}
+    result["mrr"] = result.pop("rr")
+    return result
+
+
+def build_synthetic_store(source_path: Path, target: Path, scale: int, jitter: float, seed: int) -> int:
+    """
+    Write a FAISS store with `scale` variants of every chunk of the source store
+
+    Returns:
+        Number of chunks written
+    """
+    import faiss
+    import numpy as np
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from services import rag_service
+
+    base = FAISS.load_local(str(source_path), rag_service.get_embeddings(),
+                            allow_dangerous_deserialization=True)
+    originals = [base.docstore.search(base.index_to_docstore_id[i]) for i in range(base.index.ntotal)]
+    vectors = base.index.reconstruct_n(0, base.index.ntotal)
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    docs: Dict[str, Document] = {}
+    ids: Dict[int, str] = {}
+
+    def add(doc: Document):
+        ids[len(ids)] = doc_id = str(len(ids))
+        docs[doc_id] = doc
+
+    # The shipped chunks first, then the distractors
+    index.add(vectors)
+    for doc in originals:
+        add(doc)
+
+    sentences = [
+        [s for s in re.split(r"(?<=[.!?])\s+|\n", doc.page_content) if s.strip()] or [doc.page_content]
+        for doc in originals
+    ]
+    count = len(originals)
+    dim = vectors.shape[1]
+    for copy in range(1, scale):
+        mixes = np_rng.integers(0, count, size=(count, 3))
+        block = vectors[mixes].mean(axis=1)
+        block += np_rng.normal(0, jitter / np.sqrt(dim), block.shape)
+        index.add(block.astype("float32"))
+        for i, mix in enumerate(mixes):
+            target_len = len(originals[rng.randrange(count)].page_content)
+            pool = [s for m in mix for s in sentences[m]]
+            rng.shuffle(pool)
+            text, parts = 0, []
+            for sentence in pool:
+                if text >= target_len:
+                    break
+                parts.append(sentence)
+                text += len(sentence) + 1
+            add(Document(
+                page_content=" ".join(parts),
+                metadata={"source": f"synthetic_{copy}_{i // 50}.pdf", "page": i % 50},
+            ))
+
+    store = FAISS(
+        embedding_function=rag_service.get_embeddings(),
+        index=index,
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id=ids,
+    )
+    target.mkdir(parents=True, exist_ok=True)
+    store.save_local(str(target))
+    return index.ntotal
+
+
+def cold_load(path: Path) -> Dict:
+    """Load FAISS and build BM25 from scratch, with time and RSS per step"""
+    from services.index_manager import IndexVersion, build_bm25, index_manager, load_faiss
+
+    index_manager.clear()
+    gc.collect()
+
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    vector_store = load_faiss(path)
+    vectorstore_seconds = time.perf_counter() - started
+    rss_vectorstore = rss_mb()
+
+    started = time.perf_counter()
+    bm25_retriever = build_bm25(vector_store)
+    bm25_seconds = time.perf_counter() - started
+    rss_bm25 = rss_mb()
+
+    index_manager.swap(IndexVersion.flat(path.name, path, vector_store, bm25_retriever))
+    return {
+        "chunks": vector_store.index.ntotal,
+        "index_bytes": sum(f.stat().st_size for f in path.iterdir() if f.is_file()),
+        "load": {
+            "vectorstore_seconds": round(vectorstore_seconds, 4),
+            "bm25_seconds": round(bm25_seconds, 4),
+        },
+        "memory_mb": {
+            "vectorstore": round(rss_vectorstore - rss_before, 1) if rss_before else None,
+            "bm25": round(rss_bm25 - rss_vectorstore, 1) if rss_bm25 else None,
+            "total": round(rss_bm25 - rss_before, 1) if rss_before else None,
+            "rss": rss_bm25,
+        },
+    }
+
+
+def measure_latency(queries: List[Dict], repeat: int) -> Tuple[Dict, Dict]:
+    """Per-stage latency distributions of search_pdf_knowledge, and of its output size in tokens"""
+    from services import rag_service
+    from utils.text import estimate_tokens
+
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES + ["total"]}
+    sizes: List[float] = []
+    for _ in range(repeat):
+        # Measure the embedding model, not the query cache
+        rag_service.query_embedder.clear()
+        for item in queries:
+            timings: Dict[str, float] = {}
+            started = time.perf_counter()
+            observation = rag_service.search_pdf_knowledge(item["query"], timings)
+            samples["total"].append(time.perf_counter() - started)
+            sizes.append(estimate_tokens(observation))
+            for stage in STAGES:
+                samples[stage].append(timings.get(stage, 0.0))
+    return {stage: distribution(values) for stage, values in samples.items()}, distribution(sizes, scale=1)
+
+
+def measure_quality(queries: List[Dict], ks: List[int]) -> Dict:
+    """Mean recall@k / MRR of hybrid, BM25-only and FAISS-only rankings"""
+    from services import rag_service
+
+    per_ranking = {"hybrid": [], "bm25": [], "faiss": []}
+    for item in queries:
+        relevant = set(item["relevant"])
+        keyword_docs = rag_service.bm25_search(item["query"])
+        semantic_docs = rag_service.faiss_search(item["query"])
+        hybrid = rag_service.fuse([keyword_docs, semantic_docs],
+                                  [rag_service.BM25_WEIGHT, rag_service.FAISS_WEIGHT])
+        per_ranking["hybrid"].append(ranking_quality(hybrid, relevant, ks))
+        per_ranking["bm25"].append(ranking_quality(keyword_docs, relevant, ks))
+        per_ranking["faiss"].append(ranking_quality(semantic_docs, relevant, ks))
+    return {name: mean_quality(scores) for name, scores in per_ranking.items()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark rag_service load time, latency and quality")
+    parser.add_argument("--scales", default="1,10,100,1000", help="Corpus sizes as multiples of the shipped index")
+    parser.add_argument("--index-path", type=Path, default=ROOT / "data" / "vector_store_faiss")
+    parser.add_argument("--queries", type=Path, default=ROOT / "benchmarks" / "data" / "rag_queries.jsonl")
+    parser.add_argument("--k", default="1,3,5,10", help="Cut-offs for recall@k")
+    parser.add_argument("--repeat", type=int, default=3, help="Latency passes over the query set")
+    parser.add_argument("--embeddings", choices=["model", "fake"], default="model",
+                        help="'fake' uses deterministic random vectors (timing only, no model download)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Vector noise of distractor chunks (L2 norm)")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--workdir", type=Path, help="Where synthetic stores are kept (default: temp dir)")
+    parser.add_argument("--app-dir", type=Path, default=ROOT / "src")
+    parser.add_argument("--output", type=Path, help="Result file (default benchmarks/results/rag-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown counted as a regression")
+    parser.add_argument("--quality-threshold", type=float, default=0.0,
+                        help="Relative quality drop counted as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, str(args.app_dir))
+    os.environ.setdefault("SERPAPI_API_KEY", "bench")
+    os.environ.setdefault("SPRING_API_URL", "http://127.0.0.1:1")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from services import rag_service
+
+    started = time.perf_counter()
+    rss_before = rss_mb()
+    if args.embeddings == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        import faiss
+        dim = faiss.read_index(str(args.index_path / "index.faiss")).d
+        rag_service.embeddings = DeterministicFakeEmbedding(size=dim)
+    rag_service.get_embeddings().embed_query("warm up")
+    embedder = {
+        "kind": args.embeddings,
+        "load_seconds": round(time.perf_counter() - started, 4),
+        "memory_mb": round(rss_mb() - rss_before, 1) if rss_before else None,
+    }
+    print(f"🧠 Embeddings ({args.embeddings}) ready in {embedder['load_seconds']}s")
+
+    queries = load_queries(args.queries)
+    ks = [int(k) for k in args.k.split(",")]
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="rag-bench-"))
+
+    runs = []
+    try:
+        for scale in [int(s) for s in args.scales.split(",")]:
+            if scale == 1:
+                path = args.index_path
+            else:
+                path = workdir / f"scale-{scale}-seed-{args.seed}"
+                if not (path / "index.faiss").exists():
+                    t = time.perf_counter()
+                    chunks = build_synthetic_store(args.index_path, path, scale, args.jitter, args.seed)
+                    print(f"🏗️ Built {scale}x corpus ({chunks} chunks) in {time.perf_counter() - t:.1f}s")
+
+            row = {"scale": scale, "embeddings": args.embeddings, **cold_load(path)}
+            row["latency_ms"], row["observation_tokens"] = measure_latency(queries, args.repeat)
+            row["quality"] = measure_quality(queries, ks)
+            runs.append(row)
+
+            lat, hybrid = row["latency_ms"], row["quality"]["hybrid"]
+            print(
+                f"{scale:>5}x {row['chunks']:>8} chunks | load faiss {row['load']['vectorstore_seconds']}s "
+                f"bm25 {row['load']['bm25_seconds']}s (+{row['memory_mb']['total']} MB) | "
+                f"query p50 {lat['total']['p50']} ms ["
+                + ", ".join(f"{s} {lat[s]['p50']}" for s in STAGES)
+                + f"] obs {row['observation_tokens']['p50']} tokens | recall@3 {hybrid.get('recall@3')} mrr {hybrid['mrr']}"
+            )
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        "benchmark": "rag",
+        "meta": run_metadata(args),
+        "embedder": embedder,
+        "queries": len(queries),
+        "runs": runs,
+    }
+    path = write_results("rag", results, args.output)
+    print(f"💾 Results written to {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text()).get("runs", [])
+        key = ["scale", "embeddings"]
+        regressions = compare(runs, baseline, key, PERF_METRICS, args.threshold)
+        regressions += compare(runs, baseline, key, QUALITY_METRICS, args.quality_threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} regression(s)")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
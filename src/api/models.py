@@ -2,18 +2,45 @@
 Pydantic models for API requests and responses
 """
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Union
 
 
 class QueryRequest(BaseModel):
     """Request model for chat queries"""
     question: str = Field(..., description="User's question")
+    verbose: bool = Field(False, description="Log the agent's reasoning steps for this request")
 
 
 class StreamQueryRequest(BaseModel):
     """Request model for streaming chat queries"""
     question: str = Field(..., description="User's question")
     convId: str = Field(..., description="Conversation ID")
+    format: Optional[str] = Field(
+        None,
+        description="Stream format: 'text' (default), 'ndjson' or 'sse'"
+    )
+    verbose: bool = Field(False, description="Log the agent's reasoning steps for this request")
+
+
+class BatchItemRequest(BaseModel):
+    """One question of a batch"""
+    question: str = Field(..., description="User's question")
+    id: Optional[Union[str, int]] = Field(None, description="Caller's ID, echoed in the result")
+
+
+class BatchRequest(BaseModel):
+    """Request model for batch answering"""
+    items: List[BatchItemRequest] = Field(..., description="Questions, answered without conversation history")
+    concurrency: Optional[int] = Field(
+        None,
+        description="Questions answered at once (default BATCH_CONCURRENCY, capped by ADMISSION_MAX_PER_TENANT)"
+    )
+
+
+class IndexReloadRequest(BaseModel):
+    """Request model for knowledge index reloads"""
+    version: Optional[str] = Field(None, description="Index generation to activate (default: newest)")
+    force: bool = Field(False, description="Reload even if the version is already active")
 
 
 class ChatResponse(BaseModel):
@@ -1,52 +1,341 @@
 """
 FastAPI routes for the automotive assistant
 """
+import asyncio
+import logging
 import queue
 import threading
+import time
+from typing import Any, Callable, Optional, Tuple
 from fastapi import APIRouter, HTTPException, Header, Request
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
-from api.models import QueryRequest, ChatResponse
+from api.models import QueryRequest, ChatResponse, IndexReloadRequest, BatchRequest
+from config.settings import settings
 from core import (
     setup_memory,
     load_previous_history,
+    summary_updater,
     create_conversational_agent,
-    QueueCallback
+    EventQueueCallback,
+    AgentTraceLogger,
+    MEDIA_TYPES,
+    resolve_stream_format,
+    encode_event,
+    TokenCoalescer
 )
+from core.admission import admission, AdmissionRejected, Ticket, tenant_key
+from core.backends import backend_pool, Lease, NoBackendAvailable
+from core.batch import BatchItem, BatchRunner
+from core.deadline import CancelToken, CancellationCallback, RequestCancelled, use_token
+from core.metrics import REGISTRY, MetricsCallback, Trace, record_cancelled
+from core.runs import end_run, release_run
+from core.singleflight import Flight, agent_flights, flight_key, history_independent
 from services.api_service import save_message
+from services.index_manager import index_manager, IndexNotFound
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# How often a request waiting on the agent checks whether its client is still there
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+def wants_verbose(request: Request, requested: Optional[bool] = None) -> bool:
+    """
+    Whether the agent's reasoning should be logged for this request
+    (body "verbose": true or header X-Agent-Verbose: 1)
+    """
+    if requested:
+        return True
+    return request.headers.get("x-agent-verbose", "").lower() in ("1", "true", "yes")
+
+
+def run_callbacks_for(trace: Trace, verbose: bool, *handlers) -> list:
+    """Callbacks for one agent run: given handlers, metrics and optional tracing"""
+    callbacks = [*handlers, MetricsCallback(trace)]
+    if verbose:
+        callbacks.append(AgentTraceLogger(trace.request_id))
+    return callbacks
+
+
+async def admit(tenant: str, affinity_key: Optional[str] = None,
+                timeout: Optional[float] = None) -> Tuple[Ticket, Lease]:
+    """
+    Wait for an agent execution slot and pick an Ollama backend,
+    translating rejections to HTTP errors
+    
+    Args:
+        tenant: Fairness key for the request
+        affinity_key: Requests with the same key prefer the same backend
+        timeout: Time left in the request's budget (caps the queue wait)
+        
+    Returns:
+        Admission ticket and backend lease to release when the agent run ends
+    """
+    try:
+        ticket = await admission.acquire(tenant, timeout=timeout)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    try:
+        lease = backend_pool.acquire(affinity_key)
+    except NoBackendAvailable as e:
+        admission.release(ticket)
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(int(settings.OLLAMA_CIRCUIT_COOLDOWN))}
+        )
+    
+    return ticket, lease
+
+
+def request_token() -> CancelToken:
+    """Cancellation token of a new chat request, with its REQUEST_TIMEOUT deadline"""
+    return CancelToken(settings.REQUEST_TIMEOUT if settings.REQUEST_TIMEOUT > 0 else None)
+
+
+async def run_watching_client(request: Request, fn: Callable, *args,
+                              on_disconnect: Callable[[], None]) -> Tuple[Any, bool]:
+    """
+    Run a blocking call in the thread pool while watching the client
+    
+    Args:
+        request: Incoming request
+        fn: Blocking call (it should end early once on_disconnect cancelled its work)
+        on_disconnect: Called once if the client goes away before fn returns
+        
+    Returns:
+        (fn's result, True if the client disconnected)
+    """
+    task = asyncio.ensure_future(run_in_threadpool(fn, *args))
+    disconnected = False
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result(), disconnected
+        if not disconnected and await request.is_disconnected():
+            disconnected = True
+            on_disconnect()
+
+
+@router.get("/admission")
+async def admission_stats():
+    """Queue depth, in-flight runs and admission wait times"""
+    return admission.snapshot()
+
+
+@router.get("/backends")
+async def backends_status():
+    """Health, circuit state and load of each Ollama backend"""
+    return backend_pool.snapshot()
+
+
+def require_admin(token: Optional[str]) -> None:
+    """Check the X-Admin-Token header when ADMIN_TOKEN is configured"""
+    if settings.ADMIN_TOKEN and token != settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/admin/index")
+async def index_status(x_admin_token: str = Header(None)):
+    """Active knowledge index version, versions still draining, generations on disk"""
+    require_admin(x_admin_token)
+    return index_manager.status()
+
+
+@router.post("/admin/index/reload")
+async def reload_index(body: Optional[IndexReloadRequest] = None, x_admin_token: str = Header(None)):
+    """
+    Load an index generation and swap it in without downtime
+    (queries in flight finish on the previous version)
+    
+    Args:
+        body: Optional version to activate (default: newest) and force flag
+        
+    Returns:
+        Index status after the swap, with "changed"
+    """
+    require_admin(x_admin_token)
+    body = body or IndexReloadRequest()
+    try:
+        return await run_in_threadpool(index_manager.reload, body.version, body.force)
+    except IndexNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index reload failed: {e}")
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage latencies, LLM and tool timings, queue state"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(query: QueryRequest):
+async def chat(query: QueryRequest, request: Request):
     """
     Returns AI response to a user query (non-streaming)
     
+    The answer depends only on the question (no history), so a request for
+    a question that is already being answered waits for that run instead
+    of starting its own. The request is cancelled after REQUEST_TIMEOUT
+    (504) or when the client disconnects.
+    
     Args:
         query: QueryRequest with user's question
+        request: Incoming request (client address is the fairness key)
         
     Returns:
         ChatResponse with AI's answer
     """
-    memory = setup_memory()
-    agent_executor = create_conversational_agent(memory)
+    trace = Trace("chat")
+    token = request_token()
+    client = request.client.host if request.client else "anonymous"
+    key = flight_key(query.question)
+    ticket = lease = None
+    
+    if agent_flights.get(key) is None:
+        try:
+            with trace.span("admission"):
+                ticket, lease = await admit(f"client:{client}", timeout=token.remaining())
+        except HTTPException:
+            token.finish()
+            trace.finish("rejected")
+            raise
+    
+    flight, leader = agent_flights.start(key, token)
+    if not leader:
+        token.finish()
+        if ticket is not None:
+            # An identical run started while this request was queued
+            release_run(ticket, lease)
+        with trace.span("coalesced_wait"):
+            _, disconnected = await run_watching_client(
+                request, flight.wait, on_disconnect=lambda: agent_flights.leave(flight)
+            )
+        if disconnected:
+            record_cancelled("chat", "disconnect")
+            trace.finish("cancelled")
+        else:
+            trace.finish("error" if flight.error else "coalesced")
+        if flight.error:
+            return ChatResponse(answer="An error occurred while generating the response.")
+        return ChatResponse(answer=flight.answer)
+    
+    if ticket is None:
+        # The run this request meant to join ended before it attached
+        try:
+            with trace.span("admission"):
+                ticket, lease = await admit(f"client:{client}", timeout=token.remaining())
+        except HTTPException as e:
+            agent_flights.end(flight, error=str(e.detail))
+            token.finish()
+            trace.finish("rejected")
+            raise
+    error = None
+    answer = ""
+    # Streams attached to this run (same question on /chat/stream) get its tokens
+    cb = EventQueueCallback(flight)
+    callbacks = run_callbacks_for(trace, wants_verbose(request, query.verbose), cb, CancellationCallback(token))
+    run_started = time.monotonic()
     
     try:
-        result = agent_executor.invoke({
-            "input": query.question,
-            "chat_history": memory.chat_memory.messages
-        })
+        memory = setup_memory()
+        with trace.span("agent_build"):
+            agent_executor = create_conversational_agent(memory, streaming_handler=cb, base_url=lease.url)
+        
+        def invoke():
+            with use_token(token):
+                return agent_executor.invoke(
+                    {
+                        "input": query.question,
+                        "chat_history": memory.chat_memory.messages
+                    },
+                    config={"callbacks": callbacks}
+                )
+        
+        with trace.span("agent_run"):
+            result, _ = await run_watching_client(
+                request, invoke, on_disconnect=lambda: agent_flights.leave(flight)
+            )
         
         if result and "output" in result:
-            ai_response = result["output"]
-            return ChatResponse(answer=ai_response)
+            answer = result["output"]
+            return ChatResponse(answer=answer)
         else:
             return ChatResponse(answer="I'm having trouble processing your request.")
     
     except Exception as e:
-        print(f"❌ Error in chat endpoint: {e}")
+        # An aborted LLM stream surfaces as a connection error: report the cause
+        error = RequestCancelled(token.reason) if token.cancelled else e
+        flight.put(("error", {"message": str(error)}))
+        if isinstance(error, RequestCancelled):
+            if error.reason == "deadline":
+                raise HTTPException(status_code=504, detail="Request deadline exceeded")
+            return ChatResponse(answer="The request was cancelled.")
+        logger.error(f"❌ Error in chat endpoint: {e}", extra={"request_id": trace.request_id})
         return ChatResponse(answer="An error occurred while generating the response.")
+    
+    finally:
+        outcome = end_run(ticket, lease, token, error, "chat", run_started, cb.llm_tokens)
+        agent_flights.end(flight, answer or cb.answer_text(), cb.usage(), str(error) if error else None)
+        trace.finish(outcome)
+
+
+@router.post("/chat/batch")
+async def chat_batch(batch: BatchRequest, request: Request):
+    """
+    Answers many questions (offline evaluation, FAQ pre-generation)
+    
+    Every question is answered without conversation history by a shared
+    agent, a bounded number at a time (see core/batch.py). Results stream
+    back as NDJSON, one line per question in completion order, with its
+    index, answer or error and per-question timings. Disconnecting cancels
+    the questions still running or queued.
+    
+    Args:
+        batch: BatchRequest with the questions and optional concurrency
+        request: Incoming request (client address is the fairness key)
+    
+    Returns:
+        StreamingResponse of result lines
+    """
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="No questions in the batch")
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large ({len(batch.items)} questions, limit {settings.BATCH_MAX_ITEMS})"
+        )
+    
+    client = request.client.host if request.client else "anonymous"
+    runner = BatchRunner(tenant=f"batch:{client}", concurrency=batch.concurrency)
+    items = [BatchItem(i, item.question, item.id) for i, item in enumerate(batch.items)]
+    logger.info(f"📦 Batch of {len(items)} questions from {client}, {runner.concurrency} at a time")
+    
+    async def generate():
+        results = runner.run(items)
+        try:
+            async for result in results:
+                yield encode_event(result, "ndjson")
+        finally:
+            # Closed before the end (client gone): cancel what is left
+            await results.aclose()
+    
+    return StreamingResponse(
+        generate(),
+        media_type=MEDIA_TYPES["ndjson"],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/chat/stream")
@@ -57,29 +346,26 @@ async def chat_stream(request: Request, authorization: str = Header(None)):
     Expects JSON body:
         {
             "question": "user question",
-            "convId": "conversation-uuid"
+            "convId": "conversation-uuid",
+            "format": "text" | "ndjson" | "sse",   (optional)
+            "verbose": true                        (optional, log agent steps)
         }
     
     Headers:
         Authorization: Bearer <access_token>
+        X-Agent-Verbose: 1   (optional, same as "verbose": true)
+        Accept: text/event-stream | application/x-ndjson   (optional, used when no format is given)
     
     Returns:
-        StreamingResponse with text/plain content
+        StreamingResponse with bare tokens (text/plain), or framed
+        token / tool_start / tool_end / error / done events (ndjson, sse)
     """
-
-        # ADD THIS DEBUG LOGGING:
-    
     # Parse request body
     body = await request.json()
 
-    print("=" * 60)
-    print("📥 Received request body:")
-    print(body)
-    print(f"Authorization header: {authorization}")
-    print("=" * 60)
-
     question = body.get("question")
     conv_id = body.get("convId")
+    verbose = wants_verbose(request, body.get("verbose"))
     
     if not question or not conv_id:
         raise HTTPException(
@@ -87,6 +373,13 @@ async def chat_stream(request: Request, authorization: str = Header(None)):
             detail="question and convId are required"
         )
     
+    try:
+        stream_format = resolve_stream_format(
+            body.get("format"), request.headers.get("accept")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Extract access token
     access_token = None
     if authorization:
@@ -101,82 +394,292 @@ async def chat_stream(request: Request, authorization: str = Header(None)):
             detail="Missing Authorization token"
         )
     
+    trace = Trace("chat_stream")
+    token = request_token()
+    # Never log the body or the token: only what helps correlate a request
+    logger.debug(
+        "📥 Stream request",
+        extra={"request_id": trace.request_id, "conv_id": conv_id,
+               "format": stream_format, "question_chars": len(question)}
+    )
+    
+    # Wait for a model slot before doing any work (fast 429/503 when overloaded).
+    # The conversation ID keeps follow-up turns on the same Ollama backend.
+    try:
+        with trace.span("admission"):
+            ticket, lease = await admit(
+                tenant_key(access_token, conv_id), affinity_key=conv_id, timeout=token.remaining()
+            )
+    except HTTPException:
+        token.finish()
+        trace.finish("rejected")
+        raise
+    
+    # Request state shared by the stream generator (thread pool) and the
+    # disconnect watcher (event loop)
+    state_lock = threading.Lock()
+    state = {"flight": None, "outcome": None}
+    stream_done = threading.Event()
+    
+    def finish_request(outcome: str) -> None:
+        """Record the request's outcome once"""
+        with state_lock:
+            if state["outcome"] is not None:
+                return
+            state["outcome"] = outcome
+        trace.finish(outcome)
+    
     # Save user message to Spring Boot API
     try:
         import requests
-        from config.settings import settings
         from services.api_service import api_headers
         
         spring_url = f"{settings.SPRING_API_URL}/api/conversations/{conv_id}/messages"
-        resp = requests.post(
-            spring_url,
-            json={"role": "USER", "content": question},
-            headers=api_headers(access_token),
-            timeout=5
-        )
+        with trace.span("user_message_save"):
+            resp = requests.post(
+                spring_url,
+                json={"role": "USER", "content": question},
+                headers=api_headers(access_token),
+                timeout=token.timeout(settings.SPRING_TIMEOUT)
+            )
         
         if resp.status_code >= 400:
+            release_run(ticket, lease)
+            token.finish()
+            trace.finish("persist_error")
             raise HTTPException(
                 status_code=resp.status_code,
                 detail=f"Spring API error: {resp.text}"
             )
     
-    except requests.RequestException as e:
+    except (requests.RequestException, RequestCancelled) as e:
+        release_run(ticket, lease)
+        token.finish()
+        trace.finish("persist_error")
         raise HTTPException(
             status_code=502,
             detail=f"Failed to persist user message: {e}"
         )
     
-    # Setup streaming response
-    def generate_response():
-        """Generator for streaming tokens"""
-        q = queue.Queue()
-        cb = QueueCallback(q)
-        collected = []
+    def start_agent() -> Optional[Tuple[Flight, bool]]:
+        """
+        Load history and run the agent in a background thread, or attach to
+        an identical run in flight when the answer does not depend on history
         
-        # Setup memory and agent
+        Returns:
+            (flight whose events to stream, True if this request runs the agent),
+            or None if the request was cancelled before the agent started
+        """
         memory = setup_memory()
-        load_previous_history(memory, conv_id, access_token)
-        agent_executor = create_conversational_agent(memory, streaming_handler=cb)
+        try:
+            with use_token(token), trace.span("history_fetch"):
+                load_previous_history(memory, conv_id, access_token)
+        except RequestCancelled:
+            pass
+        
+        key = flight_key(question) if history_independent(memory, question) else None
+        with state_lock:
+            if token.cancelled:
+                # Client gone or budget spent before the run started
+                release_run(ticket, lease)
+                cancelled = True
+            else:
+                flight, leader = agent_flights.start(key, token)
+                state["flight"] = flight
+                cancelled = False
+        if cancelled:
+            record_cancelled("chat_stream", token.reason)
+            token.finish()
+            finish_request("cancelled")
+            return None
+        
+        if not leader:
+            # Same question already being answered: stream that run, free this slot
+            release_run(ticket, lease)
+            token.finish()
+            threading.Thread(target=save_shared_answer, args=(flight,), daemon=True).start()
+            return flight, False
+        
+        # Attaching the handler to the run as well delivers tool events;
+        # LangChain de-duplicates it for the LLM token callbacks.
+        cb = EventQueueCallback(flight)
+        with trace.span("agent_build"):
+            agent_executor = create_conversational_agent(
+                memory, streaming_handler=cb, base_url=lease.url
+            )
         
         def run_agent():
             """Run agent in separate thread"""
-            nonlocal collected
+            error = None
+            run_started = time.monotonic()
             try:
-                agent_executor.invoke({
-                    "input": question,
-                    "chat_history": memory.chat_memory.messages
-                })
+                with use_token(token), trace.span("agent_run"):
+                    agent_executor.invoke(
+                        {
+                            "input": question,
+                            "chat_history": memory.chat_memory.messages
+                        },
+                        config={"callbacks": run_callbacks_for(trace, verbose, cb, CancellationCallback(token))}
+                    )
             except Exception as e:
-                q.put(f"[Agent error: {e}]")
+                # An aborted LLM stream surfaces as a connection error: report the cause
+                error = RequestCancelled(token.reason) if token.cancelled else e
+                flight.put(("error", {"message": str(error)}))
             finally:
-                q.put(None)
+                outcome = end_run(ticket, lease, token, error, "chat_stream", run_started, cb.llm_tokens)
+                agent_flights.end(flight, cb.answer_text(), cb.usage(), str(error) if error else None)
                 
-                # Save AI response after completion
-                full_output = "".join(collected)
-                try:
-                    save_message(conv_id, "ASSISTANT", full_output, access_token)
-                    print(f"✅ Saved AI response to conversation {conv_id}")
-                except Exception as e:
-                    print(f"❌ Failed to save AI response: {e}")
+                # Nobody is waiting for a cancelled answer, or it is incomplete: don't save it
+                if outcome != "cancelled":
+                    # Save AI response after completion
+                    try:
+                        with trace.span("assistant_save"):
+                            save_message(conv_id, "ASSISTANT", cb.answer_text(), access_token)
+                        logger.debug(f"✅ Saved AI response to conversation {conv_id}")
+                    except Exception as e:
+                        logger.error(f"❌ Failed to save AI response: {e}", extra={"conv_id": conv_id})
+                    
+                    # Fold messages that left the window into the summary (off the request path)
+                    summary_updater.schedule(memory, access_token)
+                finish_request(outcome)
         
         # Start agent in background thread
         threading.Thread(target=run_agent, daemon=True).start()
-        
-        # Yield tokens as they arrive
-        while True:
-            token = q.get()
-            if token is None:
-                break
-            collected.append(token)
-            yield token
+        return flight, True
+    
+    def save_shared_answer(flight: Flight):
+        """Save the answer of the run this request attached to, once it is over"""
+        flight.wait()
+        if flight.token is not None and flight.token.cancelled:
+            record_cancelled("chat_stream", flight.token.reason)
+            finish_request("cancelled")
+            return
+        try:
+            with trace.span("assistant_save"):
+                save_message(conv_id, "ASSISTANT", flight.answer, access_token)
+        except Exception as e:
+            logger.error(f"❌ Failed to save AI response: {e}", extra={"conv_id": conv_id})
+        finish_request("error" if flight.error else "coalesced")
+    
+    def abandon():
+        """The client went away: leave the run (cancelled once nobody waits for it) or don't start it"""
+        with state_lock:
+            if stream_done.is_set():
+                return
+            stream_done.set()
+            flight = state["flight"]
+            if flight is None:
+                token.cancel("disconnect")
+        if flight is not None:
+            agent_flights.leave(flight)
+        else:
+            # start_agent() will not run the agent; free the slot now in case it never runs
+            release_run(ticket, lease)
+    
+    async def watch_client():
+        """Poll for a disconnect while the stream is silent (tool calls, prefill)"""
+        while not stream_done.is_set():
+            await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+            if not stream_done.is_set() and await request.is_disconnected():
+                abandon()
+    
+    # Setup streaming response
+    def generate_response():
+        """Generator for streaming tokens"""
+        try:
+            started = start_agent()
+            if started is None:
+                stream_done.set()
+                return
+            flight, _ = started
+            q = flight.subscribe()
+            
+            # Yield tokens as they arrive
+            while True:
+                item = q.get()
+                if item is None:
+                    break
+                kind, payload = item
+                if kind == "token":
+                    yield payload
+                elif kind == "error":
+                    yield f"[Agent error: {payload['message']}]"
+            stream_done.set()
+        finally:
+            # Closed before the end: the client disconnected
+            abandon()
     
+    def generate_events():
+        """Generator for framed (ndjson / sse) events with coalesced tokens"""
+        try:
+            started = start_agent()
+            if started is None:
+                yield encode_event({"type": "error", "message": f"Request cancelled ({token.reason})"}, stream_format)
+                stream_done.set()
+                return
+            flight, leader = started
+            q = flight.subscribe()
+            coalescer = TokenCoalescer(
+                max_delay=settings.STREAM_COALESCE_MS / 1000,
+                max_bytes=settings.STREAM_COALESCE_BYTES
+            )
+            
+            def token_event(text):
+                return encode_event({"type": "token", "text": text}, stream_format)
+            
+            while True:
+                try:
+                    item = q.get(timeout=coalescer.time_until_flush())
+                except queue.Empty:
+                    # Oldest pending token reached the time threshold
+                    batch = coalescer.flush()
+                    if batch:
+                        yield token_event(batch)
+                    continue
+                
+                if item is None:
+                    break
+                
+                kind, payload = item
+                if kind == "token":
+                    batch = coalescer.add(payload)
+                    if batch:
+                        yield token_event(batch)
+                    continue
+                
+                # Keep ordering: pending answer text goes out before the event
+                batch = coalescer.flush()
+                if batch:
+                    yield token_event(batch)
+                yield encode_event({"type": kind, **payload}, stream_format)
+            
+            batch = coalescer.flush()
+            if batch:
+                yield token_event(batch)
+            yield encode_event(
+                {"type": "done", "request_id": trace.request_id, "usage": flight.usage,
+                 "coalesced": not leader},
+                stream_format
+            )
+            stream_done.set()
+        finally:
+            # Closed before the end: the client disconnected
+            abandon()
+    
+    def response_closed():
+        """Runs when the response ends, normally or because the client went away"""
+        watcher.cancel()
+        abandon()
+    
+    watcher = asyncio.create_task(watch_client())
     return StreamingResponse(
-        generate_response(),
-        media_type="text/plain",
+        generate_response() if stream_format == "text" else generate_events(),
+        media_type=MEDIA_TYPES[stream_format],
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
-        }
-    )
\ No newline at end of file
+            "X-Request-ID": trace.request_id,
+        },
+        background=BackgroundTask(response_closed)
+    )
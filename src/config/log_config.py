@@ -0,0 +1,93 @@
+"""
+Logging setup: levels, text or JSON output, and a non-blocking queue handler.
+
+Application threads only put records on an in-memory queue; a single
+listener thread formats them and writes to stdout, so request and
+streaming threads never wait on terminal or pipe I/O.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+from config.settings import settings
+
+_listener = None
+
+# Attributes every LogRecord has; anything else was passed via extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including fields passed with extra={...}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+                  + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def _start_listener(*handlers: logging.Handler) -> None:
+    """Route root logging through a new queue and listener thread"""
+    global _listener
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=False)
+    _listener.start()
+    logging.getLogger().handlers = [logging.handlers.QueueHandler(log_queue)]
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_after_fork() -> None:
+    """
+    Threads do not survive fork: a pre-forked worker (gunicorn --preload)
+    needs its own listener, or its records would pile up in the queue
+    """
+    if _listener is None:
+        return
+    handlers = _listener.handlers
+    _listener._thread = None  # the parent's thread; nothing to stop here
+    _start_listener(*handlers)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def setup_logging() -> None:
+    """
+    Configure the root logger from LOG_LEVEL / LOG_FORMAT (idempotent)
+    """
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT.lower() == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+
+    _start_listener(stream)
+    atexit.register(_stop_listener)
+    logging.getLogger().setLevel(settings.LOG_LEVEL.upper())
+
+    # Keep third-party chatter out of the hot path
+    for noisy in ("httpx", "httpcore", "urllib3", "langsmith", "sentence_transformers", "faiss"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
@@ -1,33 +1,154 @@
 import os
 from pathlib import Path
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     # API Keys
     SERPAPI_API_KEY: str 
+    SERPAPI_BASE_URL: str = "https://serpapi.com"
     
     # Model Configuration
     OLLAMA_MODEL: str = "mistral:latest"
     MEMORY_WINDOW: int = 5
     SAVE_HISTORY: bool = True
+    # Rolling summary of messages older than MEMORY_WINDOW exchanges
+    SUMMARY_ENABLED: bool = True
+    SUMMARY_MAX_TOKENS: int = 250
+    # Seconds a summary generation may take (updates run one at a time)
+    SUMMARY_TIMEOUT: int = 60
     
     # Spring Boot API
     SPRING_API_URL: str
-    OLLAMA_BASE_URL: str = "http://ollama:11434"
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
 
+    # Ollama backend pool: comma-separated URLs (falls back to OLLAMA_BASE_URL)
+    OLLAMA_BASE_URLS: str = ""
+    OLLAMA_HEALTH_INTERVAL: float = 10.0
+    OLLAMA_FAILURE_THRESHOLD: int = 3
+    OLLAMA_CIRCUIT_COOLDOWN: float = 30.0
+    # Model residency: how long Ollama keeps the model (and its prompt cache)
+    # loaded after a request ("30m", "-1" = forever). OLLAMA_NUM_CTX fixes the
+    # context size of every request (0 = model default); requests with a
+    # different num_ctx make Ollama reload the model and lose the cache.
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    OLLAMA_NUM_CTX: int = 0
+
+    # Server worker processes (gunicorn_conf.py); model capacity is split between them
+    WORKERS: int = 1
+
+    # Admission control: concurrent agent runs allowed against the model backends.
+    # ADMISSION_MAX_CONCURRENT=0 sizes it as OLLAMA_NUM_PARALLEL per backend.
+    OLLAMA_NUM_PARALLEL: int = 2
+    ADMISSION_MAX_CONCURRENT: int = 0
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_MAX_PER_TENANT: int = 2
+    ADMISSION_QUEUE_TIMEOUT: float = 30.0
+
+    # Time budget of one chat request, from arrival to the end of the answer
+    # (0 = none). Outgoing calls get the time left, capped by their own timeout;
+    # a request past its deadline or whose client disconnected is cancelled.
+    REQUEST_TIMEOUT: float = 120.0
+    SPRING_TIMEOUT: float = 5.0
+    SERPAPI_TIMEOUT: float = 10.0
+
+    # Share in-flight work between identical concurrent requests: tool calls
+    # with the same input, agent runs for the same history-independent question
+    COALESCE_TOOLS: bool = True
+    COALESCE_AGENT_RUNS: bool = True
+
+    # Batch answering (POST /chat/batch, python -m core.batch): questions run
+    # at once (0 = admission capacity, always capped by ADMISSION_MAX_PER_TENANT)
+    # and the largest batch the endpoint accepts
+    BATCH_CONCURRENCY: int = 0
+    BATCH_MAX_ITEMS: int = 10000
+
+    # Prompt budget (approximate tokens) per ReAct prompt section
+    PROMPT_HISTORY_TOKENS: int = 600
+    PROMPT_OBSERVATION_TOKENS: int = 400
+    PROMPT_SCRATCHPAD_TOKENS: int = 1200
+
+    # Logging: level and output format ("text" or "json")
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+
+    # Fraction of requests whose span trace is written to TRACE_LOG_PATH
+    TRACE_SAMPLE_RATE: float = 0.01
+
+    # Framed streaming (ndjson / sse): flush a token batch after this many ms or bytes
+    STREAM_COALESCE_MS: int = 50
+    STREAM_COALESCE_BYTES: int = 256
     
+    # Warm-up at startup: "background" (serve at once, /ready when loaded),
+    # "blocking" (load before serving) or "lazy" (load on first use)
+    WARMUP_MODE: str = "background"
+    # Load the model on every Ollama backend during warm-up (one-token generation)
+    WARMUP_OLLAMA: bool = True
+    OLLAMA_WARMUP_TIMEOUT: float = 120.0
+    # Failed warm-up steps are retried after N seconds, doubling up to WARMUP_RETRY_MAX (0 = never)
+    WARMUP_RETRY_SECONDS: float = 5.0
+    WARMUP_RETRY_MAX: float = 300.0
+
+    # Knowledge index hot reload: poll VECTORSTORE_PATH for a newer generation
+    # every N seconds (0 = only on POST /admin/index/reload)
+    INDEX_WATCH_INTERVAL: float = 0.0
+    # Sharded indexes: load each shard on its first query instead of at warm-up
+    INDEX_LAZY_SHARDS: bool = False
+    # Hybrid retrieval: BM25 and FAISS run concurrently and are merged when both
+    # are done, RAG_STRAGGLER_MS after the first one returned results, or
+    # RAG_RETRIEVAL_TIMEOUT seconds after the start (0 = no limit), whichever
+    # comes first; a retriever still running then is left out of the answer
+    RAG_RETRIEVAL_TIMEOUT: float = 2.0
+    RAG_STRAGGLER_MS: float = 250.0
+    # What the agent reads of each retrieved chunk: "summary" (key sentences
+    # precomputed at ingest, services/snippets.py) or "full" (the whole chunk)
+    RAG_OBSERVATION_VIEW: str = "summary"
+    # Query embeddings: searches waiting for the model are embedded together
+    # (up to RAG_EMBED_BATCH_SIZE per call); recent ones are cached by text
+    RAG_EMBED_BATCH_SIZE: int = 32
+    RAG_QUERY_CACHE_SIZE: int = 1024
+    # Token required in X-Admin-Token by the /admin endpoints (empty = no check)
+    ADMIN_TOKEN: str = ""
+
+    # Car listings store (services/listing_store.py): car_search skips listings
+    # not scraped for this many hours (0 = keep all), ranks every match and
+    # returns the CAR_SEARCH_LIMIT best
+    LISTINGS_MAX_AGE_HOURS: float = 72.0
+    CAR_SEARCH_LIMIT: int = 3
+    # Scraping runs (services/scraper_service.py): parallel searches, headless
+    # browsers for pages that need JavaScript, fetch/wait timeout in seconds
+    SCRAPER_WORKERS: int = 8
+    SCRAPER_BROWSERS: int = 2
+    SCRAPER_TIMEOUT: float = 15.0
+
+    # Sentence-transformers model of the FAISS index (queries must use the same one)
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+
     # Paths
     BASE_DIR: Path = Path(__file__).resolve().parent.parent.parent
     DATA_DIR: Path = BASE_DIR / "data" / "PDF"
     VECTORSTORE_PATH: Path = BASE_DIR / "data" / "vector_store_faiss"
+    SUMMARY_DIR: Path = BASE_DIR / "data" / "summaries"
+    TRACE_LOG_PATH: Path = BASE_DIR / "data" / "traces.jsonl"
+    LISTINGS_DB_PATH: Path = BASE_DIR / "data" / "listings.sqlite3"
     
     class Config:
         env_file = ".env"
         case_sensitive = True
 
-settings = Settings()
+    def ollama_urls(self) -> List[str]:
+        """List of Ollama backend URLs"""
+        urls = [u.strip() for u in self.OLLAMA_BASE_URLS.split(",") if u.strip()]
+        return urls or [self.OLLAMA_BASE_URL]
+
+    def ollama_model_options(self) -> Dict[str, Any]:
+        """ChatOllama arguments every request must share to reuse the loaded model"""
+        keep_alive: Any = self.OLLAMA_KEEP_ALIVE.strip()
+        if keep_alive.lstrip("-").isdigit():
+            keep_alive = int(keep_alive)  # seconds; Ollama rejects unitless strings
+        options: Dict[str, Any] = {"keep_alive": keep_alive}
+        if self.OLLAMA_NUM_CTX > 0:
+            options["num_ctx"] = self.OLLAMA_NUM_CTX
+        return options
 
-# Ensure directories exist
-settings.DATA_DIR.mkdir(parents=True, exist_ok=True)
-settings.VECTORSTORE_PATH.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
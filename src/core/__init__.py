@@ -2,13 +2,28 @@
 Core module exports
 """
 from .agent import create_conversational_agent, get_agent_tools
-from .memory import setup_memory, load_previous_history
-from .callbacks import QueueCallback
+from .memory import setup_memory, load_previous_history, summary_updater
+from .callbacks import QueueCallback, EventQueueCallback, AgentTraceLogger
+from .streaming import (
+    STREAM_FORMATS,
+    MEDIA_TYPES,
+    resolve_stream_format,
+    encode_event,
+    TokenCoalescer
+)
 
 __all__ = [
     "create_conversational_agent",
     "get_agent_tools",
     "setup_memory",
     "load_previous_history",
+    "summary_updater",
     "QueueCallback",
+    "EventQueueCallback",
+    "AgentTraceLogger",
+    "STREAM_FORMATS",
+    "MEDIA_TYPES",
+    "resolve_stream_format",
+    "encode_event",
+    "TokenCoalescer",
 ]
\ No newline at end of file
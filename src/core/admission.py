@@ -0,0 +1,318 @@
+"""
+Admission control in front of agent execution.
+
+A bounded number of agent runs may use the model backend at once. Extra
+requests wait in a per-tenant queue that is served round-robin, so one
+busy user or conversation cannot starve the others. Requests that cannot
+be admitted in time are rejected quickly with a Retry-After estimate.
+"""
+import asyncio
+import base64
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional
+
+from config.settings import settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """An admitted (or waiting) request"""
+    tenant: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    granted_at: Optional[float] = None
+    released: bool = False
+
+
+@dataclass
+class _Waiter:
+    ticket: Ticket
+    future: asyncio.Future
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with fair per-tenant queues.
+
+    All state changes happen on the event loop thread; release() may be
+    called from any thread (agents run in worker threads).
+    """
+
+    def __init__(self,
+                 max_concurrent: int,
+                 max_queue: int,
+                 max_per_tenant: int,
+                 queue_timeout: float):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self.max_per_tenant = max_per_tenant
+        self.queue_timeout = queue_timeout
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._in_flight = 0
+        self._tenant_load: Dict[str, int] = {}
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+
+        # Metrics
+        self._service_time = 5.0  # EWMA of seconds a slot is held
+        self._recent_waits: Deque[float] = deque(maxlen=1000)
+        self._wait_sum = 0.0
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {"tenant_limit": 0, "queue_full": 0, "timeout": 0}
+        self._lock = threading.Lock()  # guards metrics read from other threads
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        """
+        Build a controller from application settings. The model capacity is
+        shared by all worker processes, so each worker admits its share.
+        """
+        max_concurrent = (
+            settings.ADMISSION_MAX_CONCURRENT
+            or settings.OLLAMA_NUM_PARALLEL * len(settings.ollama_urls())
+        )
+        return cls(
+            max_concurrent=max(1, max_concurrent // max(1, settings.WORKERS)),
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            max_per_tenant=settings.ADMISSION_MAX_PER_TENANT,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        )
+
+    async def acquire(self, tenant: str, timeout: Optional[float] = None) -> Ticket:
+        """
+        Wait for an execution slot
+
+        Args:
+            tenant: Fairness key (user or conversation)
+            timeout: Time left in the request's budget, if shorter than the queue timeout
+
+        Returns:
+            Ticket that must be passed to release()
+
+        Raises:
+            AdmissionRejected: On tenant limit, full queue or queue timeout
+        """
+        self._loop = asyncio.get_running_loop()
+        ticket = Ticket(tenant=tenant)
+
+        if self.max_per_tenant and self._tenant_load.get(tenant, 0) >= self.max_per_tenant:
+            self._reject("tenant_limit")
+            raise AdmissionRejected(
+                429,
+                f"Too many concurrent requests for this user (limit {self.max_per_tenant})",
+                self.retry_after(),
+            )
+
+        if self._in_flight < self.max_concurrent and self._queued == 0:
+            self._tenant_load[tenant] = self._tenant_load.get(tenant, 0) + 1
+            self._grant(ticket)
+            return ticket
+
+        if self._queued >= self.max_queue:
+            self._reject("queue_full")
+            raise AdmissionRejected(503, "Server busy, request queue is full", self.retry_after())
+
+        self._tenant_load[tenant] = self._tenant_load.get(tenant, 0) + 1
+        waiter = _Waiter(ticket, self._loop.create_future())
+        self._queues.setdefault(tenant, deque()).append(waiter)
+        self._queued += 1
+
+        try:
+            wait = self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+            await asyncio.wait_for(asyncio.shield(waiter.future), wait)
+            return ticket
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                # Granted while the timeout fired
+                return ticket
+            self._remove_waiter(waiter)
+            self._reject("timeout")
+            raise AdmissionRejected(503, "Timed out waiting for a free model slot", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                self._release(ticket)
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+    def acquire_threadsafe(self, tenant: str, timeout: Optional[float] = None) -> Optional[Ticket]:
+        """
+        Blocking acquire() for work that runs off the event loop (background threads)
+
+        Args:
+            tenant: Fairness key
+            timeout: Cap on the queue wait
+
+        Returns:
+            Ticket, or None if no request has started the event loop yet
+            (nothing competes for the backends then)
+
+        Raises:
+            AdmissionRejected: On tenant limit, full queue or queue timeout
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return None
+        return asyncio.run_coroutine_threadsafe(self.acquire(tenant, timeout), loop).result()
+
+    def release(self, ticket: Optional[Ticket]) -> None:
+        """
+        Free the slot held by a ticket (idempotent, thread-safe)
+
+        Args:
+            ticket: Ticket returned by acquire()
+        """
+        if ticket is None or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            self._release(ticket)
+        else:
+            self._loop.call_soon_threadsafe(self._release, ticket)
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a new request could start"""
+        ahead = self._queued + 1
+        return max(1, math.ceil(self._service_time * ahead / self.max_concurrent))
+
+    def snapshot(self) -> Dict:
+        """Current queue depth and wait-time metrics"""
+        with self._lock:
+            waits = sorted(self._recent_waits)
+            rejected = dict(self._rejected)
+            admitted = self._admitted
+            wait_sum = self._wait_sum
+
+        def pct(p):
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 4)
+
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queued_per_tenant": {t: len(q) for t, q in self._queues.items() if q},
+            "admitted_total": admitted,
+            "rejected_total": rejected,
+            "wait_seconds": {
+                "avg": round(wait_sum / admitted, 4) if admitted else 0.0,
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "p99": pct(0.99),
+                "max": round(waits[-1], 4) if waits else 0.0,
+            },
+            "service_seconds_ewma": round(self._service_time, 3),
+            "retry_after_estimate": self.retry_after(),
+        }
+
+    # ------------------------------------------------------------------
+    # Event-loop-only helpers
+    # ------------------------------------------------------------------
+
+    def _grant(self, ticket: Ticket) -> None:
+        ticket.granted_at = time.monotonic()
+        self._in_flight += 1
+        wait = ticket.granted_at - ticket.enqueued_at
+        with self._lock:
+            self._admitted += 1
+            self._wait_sum += wait
+            self._recent_waits.append(wait)
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.released or ticket.granted_at is None:
+            return
+        ticket.released = True
+        self._in_flight -= 1
+
+        load = self._tenant_load.get(ticket.tenant, 1) - 1
+        if load > 0:
+            self._tenant_load[ticket.tenant] = load
+        else:
+            self._tenant_load.pop(ticket.tenant, None)
+
+        held = time.monotonic() - ticket.granted_at
+        self._service_time = 0.8 * self._service_time + 0.2 * held
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting tenants in round-robin order"""
+        while self._in_flight < self.max_concurrent and self._queued:
+            tenant, waiters = next(iter(self._queues.items()))
+            waiter = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+
+            if waiter.future.done():
+                continue
+            self._grant(waiter.ticket)
+            waiter.future.set_result(True)
+
+    def _remove_waiter(self, waiter: _Waiter) -> None:
+        waiters = self._queues.get(waiter.ticket.tenant)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del self._queues[waiter.ticket.tenant]
+
+        load = self._tenant_load.get(waiter.ticket.tenant, 1) - 1
+        if load > 0:
+            self._tenant_load[waiter.ticket.tenant] = load
+        else:
+            self._tenant_load.pop(waiter.ticket.tenant, None)
+
+    def _reject(self, reason: str) -> None:
+        with self._lock:
+            self._rejected[reason] += 1
+
+
+def tenant_key(access_token: Optional[str], fallback: str) -> str:
+    """
+    Derive the fairness key for a request.
+    Uses the JWT subject when available (the signature is verified by the
+    Spring API, here it only groups requests), otherwise the fallback.
+
+    Args:
+        access_token: Bearer token
+        fallback: Key to use without a readable token (e.g. conversation ID)
+
+    Returns:
+        Tenant key
+    """
+    if access_token and access_token.count(".") == 2:
+        try:
+            payload = access_token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            if claims.get("sub"):
+                return f"user:{claims['sub']}"
+        except (ValueError, TypeError):
+            pass
+    return f"conv:{fallback}"
+
+
+# Global controller shared by all routes
+admission = AdmissionController.from_settings()
@@ -1,18 +1,22 @@
 """
 Agent creation and management
+
+LangChain's agent, model and hub modules take most of the application's
+import time, so they are imported when the first agent is built rather
+than when the API starts.
 """
-from langchain.agents import AgentExecutor, create_react_agent, Tool
-from langchain_community.chat_models import ChatOllama
-from langchain.callbacks import StreamingStdOutCallbackHandler
-from langchain.prompts import PromptTemplate
-from langchain import hub
-from langchain.memory import ConversationBufferWindowMemory
-from typing import Optional
+import logging
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
 from config.settings import settings
-from services.rag_service import search_pdf_knowledge
-from services.search_service import youtube_search, google_search
-from services.car_deal_service import car_search
+
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+    from langchain.memory import ConversationBufferWindowMemory
+    from langchain_core.prompts import BasePromptTemplate
+
+logger = logging.getLogger(__name__)
 
 
 # Define tools with clear descriptions
@@ -23,6 +27,18 @@ def get_agent_tools():
     Returns:
         List of Tool instances
     """
+    from langchain.agents import Tool
+    from services.rag_service import search_pdf_knowledge
+    from services.search_service import youtube_search, google_search
+    from services.car_deal_service import car_search
+    from core.singleflight import tool_flights
+    
+    # Concurrent identical calls (same tool, same input) share one execution
+    search_pdf_knowledge = tool_flights.wrap("PDF_Knowledge_Base", search_pdf_knowledge)
+    youtube_search = tool_flights.wrap("YouTube_Search", youtube_search)
+    google_search = tool_flights.wrap("Google_Search", google_search)
+    car_search = tool_flights.wrap("car_search", car_search)
+    
     return [
         Tool(
             name="PDF_Knowledge_Base",
@@ -67,51 +83,39 @@ def get_agent_tools():
               - Finding cars for sale
               - Searching listings
               - Queries like "find me a 2020 BMW X5 under €50,000 "
+            Returns the 3 best matching listings as JSON, already ranked best first
+            (title, price, year, mileage, fuel, link, freshness).
+            Present them in the given order; do not re-rank or compare them yourself.
+            Never show the raw JSON: summarize the 3 options with title, price, year,
+            fuel, mileage and link.
             Input: natural language query about the desired car.
             """
         ),
     ]
 
 
-def create_conversational_agent(
-    memory: ConversationBufferWindowMemory,
-    streaming_handler: Optional[object] = None
-) -> AgentExecutor:
+@lru_cache(maxsize=1)
+def get_react_prompt() -> "BasePromptTemplate":
     """
-    Create a conversational ReAct agent with proper prompt template
-    
-    Args:
-        memory: Conversation memory instance
-        streaming_handler: Optional callback handler for streaming
-        
+    ReAct prompt of every agent in this process
+
+    Resolved once, so that the static part of the prompt (instructions and
+    tool descriptions, everything before the history) is byte-identical in
+    every LLM call and Ollama can reuse its cached prefix.
+
     Returns:
-        AgentExecutor instance
+        Prompt template from the hub, or the built-in one if the hub is unavailable
     """
+    from langchain import hub
+    from langchain.prompts import PromptTemplate
+
+    # Try to get prompt from hub, fallback to custom
     try:
-        # Setup callbacks
-        callbacks = []
-        if streaming_handler:
-            callbacks.append(streaming_handler)
-        else:
-            callbacks.append(StreamingStdOutCallbackHandler())
-        
-        # Create LLM with streaming
-        llm = ChatOllama(
-            model=settings.OLLAMA_MODEL,
-            # base_url=settings.OLLAMA_BASE_URL,  # Add this line
-            verbose=False,
-            callbacks=callbacks,
-            streaming=True,
-        )
-        
-        # Try to get prompt from hub, fallback to custom
-        try:
-            prompt = hub.pull("hwchase17/react-chat")
-            # raise Exception("Force custom")  # <--- remove this if you want hub to actually work
-            print("✅ Using standard ReAct prompt from hub")
-        except Exception:
-            print("⚠️ Hub unavailable, using custom prompt")
-            template = """You are an expert automotive assistant. Answer the following questions as best you can. You have access to the following tools:
+        prompt = hub.pull("hwchase17/react-chat")
+        logger.debug("✅ Using standard ReAct prompt from hub")
+    except Exception:
+        logger.debug("⚠️ Hub unavailable, using custom prompt")
+        template = """You are an expert automotive assistant. Answer the following questions as best you can. You have access to the following tools:
 
 {tools}
 
@@ -128,11 +132,7 @@ Final Answer: the final answer to the original input question
 
 IMPORTANT RULES:
 For car_search:
-- The tool returns up to 10 car listings in JSON (title, price, year, mileage, fuel, link).
-- YOU MUST analyze these results and select ONLY the top 3 that best match the user’s request.
-- Consider criteria like price, year, mileage, fuel type, and transmission.
-- Never return the full raw JSON to the user. 
-- Instead, provide a clear, human-readable summary of the 3 best options with title, price, year, fuel, mileage, and link.
+- Follow the presentation rules in its description.
 
 For PDF_Knowledge_Base:
 - Use this first for technical "how-to" questions.
@@ -149,21 +149,64 @@ Previous conversation:
 
 Question: {input}
 Thought: {agent_scratchpad}"""
-            
-            
-            prompt = PromptTemplate(
-                input_variables=["tools", "tool_names", "chat_history", "input", "agent_scratchpad"],
-                template=template
-            )
+        
+        
+        prompt = PromptTemplate(
+            input_variables=["tools", "tool_names", "chat_history", "input", "agent_scratchpad"],
+            template=template
+        )
+    return prompt
+
+
+def create_conversational_agent(
+    memory: Optional["ConversationBufferWindowMemory"],
+    streaming_handler: Optional[object] = None,
+    base_url: Optional[str] = None
+) -> "AgentExecutor":
+    """
+    Create a conversational ReAct agent with proper prompt template
+    
+    Args:
+        memory: Conversation memory instance (None: stateless agent, shared by
+            batch runs that pass an empty chat_history, see core/batch.py)
+        streaming_handler: Optional callback handler for streaming
+        base_url: Ollama backend to use (defaults to OLLAMA_BASE_URL)
+        
+    Returns:
+        AgentExecutor instance
+    """
+    from langchain.agents import AgentExecutor
+    from langchain_community.chat_models import ChatOllama
+    from core.deadline import abort_on_cancel
+    from core.prompt_builder import PromptBudget, create_budgeted_react_agent
+    
+    try:
+        # Setup callbacks (tokens are only forwarded to a streaming consumer)
+        callbacks = []
+        if streaming_handler:
+            callbacks.append(streaming_handler)
+        
+        # Create LLM with streaming
+        llm = ChatOllama(
+            model=settings.OLLAMA_MODEL,
+            base_url=base_url or settings.OLLAMA_BASE_URL,
+            verbose=False,
+            callbacks=callbacks,
+            streaming=True,
+            # Closes the stream when the request is cancelled (Ollama then stops generating)
+            auth=abort_on_cancel,
+            **settings.ollama_model_options(),
+        )
         
         # Get tools
         tools = get_agent_tools()
         
-        # Create ReAct agent
-        agent = create_react_agent(
+        # Create ReAct agent (history and tool observations trimmed to the prompt budget)
+        agent = create_budgeted_react_agent(
             llm=llm,
             tools=tools,
-            prompt=prompt
+            prompt=get_react_prompt(),
+            budget=PromptBudget.from_settings()
         )
         
         # Create agent executor
@@ -171,20 +214,19 @@ Thought: {agent_scratchpad}"""
             agent=agent,
             tools=tools,
             memory=memory,
-            verbose=True,  # CHANGE THIS to see what's happening
+            verbose=False,  # per-request tracing: AgentTraceLogger
             handle_parsing_errors=True,
             max_iterations=3,
             return_intermediate_steps=False,
-            early_stopping_method="generate",  # ADD THIS - stops after first valid answer
-
+            early_stopping_method="generate",
         )
         
-        print("✅ Agent created successfully")
+        logger.debug("✅ Agent created successfully")
         return agent_executor
     
     except Exception as e:
-        print(f"❌ Error creating agent: {e}")
-        print("Please ensure:")
-        print("1. Ollama is running: ollama serve")
-        print(f"2. Model is pulled: ollama pull {settings.OLLAMA_MODEL}")
+        logger.error(
+            f"❌ Error creating agent: {e}. Please ensure Ollama is running (ollama serve) "
+            f"and the model is pulled (ollama pull {settings.OLLAMA_MODEL})"
+        )
         raise
\ No newline at end of file
@@ -0,0 +1,266 @@
+"""
+Pool of Ollama backends with load balancing, health probing and circuit breaking.
+
+Requests go to the backend with the fewest outstanding requests. Requests
+that share an affinity key (the conversation ID) prefer the same backend,
+found by rendezvous hashing, so its KV cache stays warm. The preferred
+backend is skipped when it is much busier than the least-loaded one.
+"""
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import requests
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(Exception):
+    """Raised when every backend is unhealthy or has an open circuit"""
+
+
+@dataclass
+class Backend:
+    """Runtime state of one Ollama endpoint"""
+    url: str
+    outstanding: int = 0
+    healthy: bool = True
+    consecutive_failures: int = 0
+    open_until: float = 0.0          # circuit is open until this monotonic time
+    half_open_in_flight: bool = False
+    total_requests: int = 0
+    total_failures: int = 0
+    last_probe_ms: Optional[float] = None
+
+
+@dataclass
+class Lease:
+    """A request in flight on a backend"""
+    backend: Backend
+    started_at: float
+    trial: bool = False
+    released: bool = False
+
+    @property
+    def url(self) -> str:
+        return self.backend.url
+
+
+class BackendPool:
+    """Least-outstanding-requests balancer over several Ollama URLs"""
+
+    def __init__(self,
+                 urls: List[str],
+                 failure_threshold: int = 3,
+                 cooldown: float = 30.0,
+                 probe_interval: float = 10.0,
+                 affinity_slack: int = 1):
+        if not urls:
+            raise ValueError("At least one Ollama URL is required")
+        self.backends = [Backend(url=u.rstrip("/")) for u in urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.affinity_slack = affinity_slack
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_settings(cls) -> "BackendPool":
+        """Build the pool from application settings"""
+        return cls(
+            urls=settings.ollama_urls(),
+            failure_threshold=settings.OLLAMA_FAILURE_THRESHOLD,
+            cooldown=settings.OLLAMA_CIRCUIT_COOLDOWN,
+            probe_interval=settings.OLLAMA_HEALTH_INTERVAL,
+        )
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    def acquire(self, affinity_key: Optional[str] = None) -> Lease:
+        """
+        Pick a backend for one agent run
+
+        Args:
+            affinity_key: Requests with the same key prefer the same backend
+
+        Returns:
+            Lease to pass to release()
+
+        Raises:
+            NoBackendAvailable: If no backend can take the request
+        """
+        with self._lock:
+            candidates = []
+            for b in self.backends:
+                state = self._circuit(b)
+                if not b.healthy or state == "open":
+                    continue
+                if state == "half_open" and b.half_open_in_flight:
+                    continue
+                candidates.append(b)
+
+            if not candidates:
+                raise NoBackendAvailable("No healthy Ollama backend available")
+
+            least = min(candidates, key=lambda b: b.outstanding)
+            chosen = least
+            if affinity_key:
+                preferred = max(candidates, key=lambda b: self._rendezvous(affinity_key, b.url))
+                if preferred.outstanding <= least.outstanding + self.affinity_slack:
+                    chosen = preferred
+
+            trial = self._circuit(chosen) == "half_open"
+            if trial:
+                chosen.half_open_in_flight = True
+            chosen.outstanding += 1
+            chosen.total_requests += 1
+            return Lease(backend=chosen, started_at=time.monotonic(), trial=trial)
+
+    def release(self, lease: Optional[Lease], ok: bool = True) -> None:
+        """
+        Return a lease and record the outcome for the circuit breaker
+
+        Args:
+            lease: Lease from acquire()
+            ok: False when the request failed because of the backend
+        """
+        with self._lock:
+            if lease is None or lease.released:
+                return
+            lease.released = True
+            b = lease.backend
+            b.outstanding = max(0, b.outstanding - 1)
+            if lease.trial:
+                b.half_open_in_flight = False
+            if ok:
+                b.consecutive_failures = 0
+                b.healthy = True
+            else:
+                self._record_failure(b)
+
+    def _circuit(self, b: Backend) -> str:
+        """Circuit state: closed, open or half_open"""
+        if b.consecutive_failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() < b.open_until:
+            return "open"
+        return "half_open"
+
+    def _record_failure(self, b: Backend) -> None:
+        b.total_failures += 1
+        b.consecutive_failures += 1
+        if b.consecutive_failures >= self.failure_threshold:
+            b.open_until = time.monotonic() + self.cooldown
+            logger.warning(f"⚠️ Circuit open for Ollama backend {b.url} ({self.cooldown:.0f}s)")
+
+    @staticmethod
+    def _rendezvous(key: str, url: str) -> int:
+        digest = hashlib.blake2b(f"{key}|{url}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    # ------------------------------------------------------------------
+    # Health probing
+    # ------------------------------------------------------------------
+
+    def probe(self, backend: Backend, timeout: float = 2.0) -> bool:
+        """
+        Check one backend with GET /api/tags
+
+        Args:
+            backend: Backend to probe
+            timeout: Request timeout in seconds
+
+        Returns:
+            True if the backend answered
+        """
+        started = time.monotonic()
+        try:
+            resp = requests.get(f"{backend.url}/api/tags", timeout=timeout)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+
+        with self._lock:
+            backend.last_probe_ms = round((time.monotonic() - started) * 1000, 1)
+            if ok:
+                backend.healthy = True
+                if self._circuit(backend) == "half_open":
+                    backend.consecutive_failures = 0
+            else:
+                if backend.healthy:
+                    logger.warning(f"⚠️ Ollama backend unhealthy: {backend.url}")
+                backend.healthy = False
+                self._record_failure(backend)
+        return ok
+
+    def probe_all(self) -> Dict[str, bool]:
+        """Probe every backend once"""
+        return {b.url: self.probe(b) for b in self.backends}
+
+    def start_health_checks(self) -> None:
+        """Probe backends periodically in a daemon thread"""
+        if self._probe_thread is not None or self.probe_interval <= 0:
+            return
+
+        def loop():
+            while not self._stop.wait(self.probe_interval):
+                self.probe_all()
+
+        self._probe_thread = threading.Thread(target=loop, name="ollama-health", daemon=True)
+        self._probe_thread.start()
+
+    def stop_health_checks(self) -> None:
+        """Stop the probe thread"""
+        self._stop.set()
+
+    def has_available(self) -> bool:
+        """True if at least one backend could take a request now"""
+        with self._lock:
+            return any(b.healthy and self._circuit(b) != "open" for b in self.backends)
+
+    def snapshot(self) -> List[Dict]:
+        """State of every backend"""
+        with self._lock:
+            return [
+                {
+                    "url": b.url,
+                    "healthy": b.healthy,
+                    "circuit": self._circuit(b),
+                    "outstanding": b.outstanding,
+                    "consecutive_failures": b.consecutive_failures,
+                    "total_requests": b.total_requests,
+                    "total_failures": b.total_failures,
+                    "last_probe_ms": b.last_probe_ms,
+                }
+                for b in self.backends
+            ]
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """
+    Tell backend failures (connection errors, 5xx) from agent errors
+
+    Args:
+        exc: Exception raised by the agent run
+
+    Returns:
+        True if the exception should count against the backend
+    """
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if type(exc).__name__ == "OllamaEndpointNotFoundError":
+        return True
+    return "Ollama call failed" in str(exc)
+
+
+# Global pool shared by all routes
+backend_pool = BackendPool.from_settings()
@@ -0,0 +1,329 @@
+"""
+Batch question answering for offline jobs (evaluation runs, FAQ pre-generation)
+
+Questions are answered without conversation history by one shared agent
+per Ollama backend: built once, it keeps no state between runs, so the
+ReAct prompt, tools and LLM client are not rebuilt per question. At most
+`concurrency` questions run at a time, each through admission control under
+the batch's tenant key: a batch never holds more than ADMISSION_MAX_PER_TENANT
+slots, so interactive requests keep their share of the model. Identical
+questions are answered once, and the query embeddings of concurrent PDF
+searches are computed together (services/rag_service.QueryEmbedder).
+
+    cd src
+    python -m core.batch questions.jsonl -o answers.jsonl               # in this process
+    python -m core.batch questions.jsonl --url http://localhost:8000    # via POST /chat/batch
+
+Input: one JSON object per line, {"question": "...", "id": optional}.
+Output: one JSON object per question, in completion order:
+
+    {"index": 0, "id": "q1", "question": "...", "answer": "...", "error": null,
+     "coalesced": false,
+     "timings": {"queue_ms": .., "agent_ms": .., "total_ms": .., "tools": [..]},
+     "usage": {...}}
+"""
+import argparse
+import asyncio
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from config.settings import settings
+from core.admission import AdmissionRejected, admission
+from core.backends import NoBackendAvailable, backend_pool
+from core.callbacks import EventQueueCallback
+from core.deadline import CancelToken, CancellationCallback, RequestCancelled, use_token
+from core.metrics import MetricsCallback, Trace
+from core.runs import end_run
+from core.singleflight import flight_key
+
+if TYPE_CHECKING:
+    from langchain.agents import AgentExecutor
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchItem:
+    """One question of a batch"""
+    index: int
+    question: str
+    id: Any = None
+
+
+def read_items(lines: Iterable[str]) -> List[BatchItem]:
+    """
+    Parse JSONL questions (blank lines skipped)
+
+    Raises:
+        ValueError: For a line that is not an object with a non-empty "question"
+    """
+    items = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        question = record.get("question") if isinstance(record, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise ValueError(f"Line {number}: expected an object with a non-empty \"question\"")
+        items.append(BatchItem(len(items), question, record.get("id")))
+    return items
+
+
+_agents: Dict[str, "AgentExecutor"] = {}
+_agents_lock = threading.Lock()
+
+
+def shared_agent(base_url: str) -> "AgentExecutor":
+    """Stateless agent (no memory) for a backend, built on first use"""
+    from core.agent import create_conversational_agent
+
+    with _agents_lock:
+        agent = _agents.get(base_url)
+        if agent is None:
+            agent = _agents[base_url] = create_conversational_agent(None, base_url=base_url)
+    return agent
+
+
+def _drain(q: "queue.Queue") -> List:
+    events = []
+    while True:
+        try:
+            events.append(q.get_nowait())
+        except queue.Empty:
+            return events
+
+
+class BatchRunner:
+    """Runs the questions of one batch with bounded parallelism"""
+
+    def __init__(self, tenant: str = "batch", concurrency: Optional[int] = None):
+        """
+        Args:
+            tenant: Admission fairness key of the batch
+            concurrency: Questions run at once (default BATCH_CONCURRENCY, or the
+                admission capacity); capped by ADMISSION_MAX_PER_TENANT
+        """
+        limit = concurrency or settings.BATCH_CONCURRENCY or admission.max_concurrent
+        if admission.max_per_tenant:
+            limit = min(limit, admission.max_per_tenant)
+        self.concurrency = max(1, limit)
+        self.tenant = tenant
+        self.token = CancelToken()  # The whole batch (no deadline: each question has its own)
+        self._active: Set[CancelToken] = set()
+        self._lock = threading.Lock()
+        self._answers: Dict[str, "asyncio.Future"] = {}
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-agent")
+
+    def cancel(self, reason: str = "disconnect") -> None:
+        """Stop the batch: running questions are cancelled, queued ones are not started"""
+        if self.token.cancel(reason):
+            with self._lock:
+                active = list(self._active)
+            for token in active:
+                token.cancel(reason)
+
+    async def run(self, items: List[BatchItem]) -> AsyncIterator[Dict]:
+        """Answer the items, yielding each result as soon as it is ready"""
+        started = time.monotonic()
+        todo: "asyncio.Queue[BatchItem]" = asyncio.Queue()
+        for item in items:
+            todo.put_nowait(item)
+        results: "asyncio.Queue[Dict]" = asyncio.Queue()
+
+        async def worker():
+            while not todo.empty():
+                item = todo.get_nowait()
+                item_started = time.monotonic()
+                try:
+                    result = await self._answer(item)
+                except Exception as e:
+                    # Every item must yield a result, or the stream would wait for it forever
+                    logger.exception(f"❌ Batch item {item.index} failed")
+                    total_ms = round((time.monotonic() - item_started) * 1000, 1)
+                    result = {"index": item.index, "id": item.id, "question": item.question,
+                              "answer": None, "error": str(e), "coalesced": False,
+                              "timings": {"queue_ms": 0.0, "agent_ms": 0.0, "total_ms": total_ms, "tools": []}}
+                await results.put(result)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(min(self.concurrency, len(items)))]
+        errors = coalesced = 0
+        try:
+            for _ in range(len(items)):
+                result = await results.get()
+                errors += result["error"] is not None
+                coalesced += result["coalesced"]
+                yield result
+        finally:
+            # Consumer gone before the end: stop the rest
+            if any(not w.done() for w in workers):
+                self.cancel("disconnect")
+                for w in workers:
+                    w.cancel()
+            self.token.finish()
+            self._pool.shutdown(wait=False)
+        elapsed = time.monotonic() - started
+        logger.info(
+            f"📦 Batch of {len(items)} done in {elapsed:.1f}s ({len(items) / max(elapsed, 1e-9):.2f}/s, "
+            f"concurrency {self.concurrency}): {errors} errors, {coalesced} coalesced"
+        )
+
+    async def _answer(self, item: BatchItem) -> Dict:
+        """Result of one item: its own run, or the run of an identical question"""
+        key = flight_key(item.question)
+        leader = self._answers.get(key)
+        if leader is not None:
+            try:
+                shared = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled():
+                    raise  # This item was cancelled, not the leader
+                # The leader's run was abandoned: answer this item itself
+            else:
+                return {**shared, "index": item.index, "id": item.id, "question": item.question,
+                        "coalesced": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._answers[key] = future
+        try:
+            result = await self._run(item)
+        except BaseException:
+            # Cancelled or failed: followers answer their items themselves
+            future.cancel()
+            raise
+        future.set_result(result)
+        return result
+
+    async def _run(self, item: BatchItem) -> Dict:
+        """Admit, run the shared agent and time one question"""
+        trace = Trace("batch")
+        started = time.monotonic()
+        result = {"index": item.index, "id": item.id, "question": item.question,
+                  "answer": None, "error": None, "coalesced": False}
+
+        def timings(queued: float, ran: float = 0.0, tools: Optional[List[Dict]] = None) -> Dict:
+            return {"queue_ms": round(queued * 1000, 1), "agent_ms": round(ran * 1000, 1),
+                    "total_ms": round((time.monotonic() - started) * 1000, 1), "tools": tools or []}
+
+        # Busy server (queue full / queue timeout): wait and try again
+        ticket = None
+        while ticket is None:
+            if self.token.cancelled:
+                trace.finish("cancelled")
+                return {**result, "error": f"Request cancelled ({self.token.reason})",
+                        "timings": timings(time.monotonic() - started)}
+            try:
+                with trace.span("admission"):
+                    ticket = await admission.acquire(self.tenant)
+            except AdmissionRejected as e:
+                await asyncio.sleep(e.retry_after)
+        try:
+            lease = backend_pool.acquire()
+        except NoBackendAvailable as e:
+            admission.release(ticket)
+            trace.finish("error")
+            return {**result, "error": str(e), "timings": timings(time.monotonic() - started)}
+        queued = time.monotonic() - started
+
+        token = CancelToken(settings.REQUEST_TIMEOUT if settings.REQUEST_TIMEOUT > 0 else None)
+        with self._lock:
+            self._active.add(token)
+        if self.token.cancelled:
+            token.cancel(self.token.reason)
+
+        sink: "queue.Queue" = queue.Queue()
+        cb = EventQueueCallback(sink)
+        error = None
+        run_started = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            answer = await loop.run_in_executor(self._pool, self._invoke, item.question, lease.url, token, cb, trace)
+            result["answer"] = answer
+        except asyncio.CancelledError:
+            # Batch abandoned: stop the agent thread as well
+            token.cancel("disconnect")
+            error = RequestCancelled(token.reason)
+            raise
+        except Exception as e:
+            # An aborted LLM stream surfaces as a connection error: report the cause
+            error = RequestCancelled(token.reason) if token.cancelled else e
+            result["error"] = str(error)
+        finally:
+            with self._lock:
+                self._active.discard(token)
+            trace.finish(end_run(ticket, lease, token, error, "batch", run_started, cb.llm_tokens))
+
+        tools = [payload for kind, payload in _drain(sink) if kind == "tool_end"]
+        return {**result, "timings": timings(queued, time.monotonic() - run_started, tools), "usage": cb.usage()}
+
+    @staticmethod
+    def _invoke(question: str, base_url: str, token: CancelToken,
+                cb: EventQueueCallback, trace: Trace) -> str:
+        agent = shared_agent(base_url)
+        with use_token(token), trace.span("agent_run"):
+            result = agent.invoke(
+                {"input": question, "chat_history": []},
+                config={"callbacks": [cb, CancellationCallback(token), MetricsCallback(trace)]}
+            )
+        return result.get("output") or cb.answer_text()
+
+
+async def run_local(items: List[BatchItem], out, concurrency: Optional[int] = None) -> None:
+    """Answer items in this process, writing results as JSONL to out"""
+    runner = BatchRunner(concurrency=concurrency)
+    logger.info(f"📦 Answering {len(items)} questions, {runner.concurrency} at a time")
+    async for result in runner.run(items):
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+
+
+def run_remote(url: str, items: List[BatchItem], out, concurrency: Optional[int] = None) -> None:
+    """Send items to a running server's POST /chat/batch, writing its results to out"""
+    import requests
+
+    body = {"items": [{"question": item.question, "id": item.id} for item in items], "concurrency": concurrency}
+    with requests.post(f"{url.rstrip('/')}/chat/batch", json=body, stream=True, timeout=(10, None)) as resp:
+        resp.raise_for_status()
+        resp.encoding = "utf-8"  # application/x-ndjson carries no charset
+        for line in resp.iter_lines(decode_unicode=True):
+            if line:
+                out.write(line + "\n")
+                out.flush()
+
+
+def main():
+    from config.log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions")
+    parser.add_argument("input", help="JSONL file of {\"question\": ..., \"id\": ...} ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL results file (default: stdout)")
+    parser.add_argument("--concurrency", type=int, help="Questions answered at once")
+    parser.add_argument("--url", help="Send the batch to a running server instead (e.g. http://localhost:8000)")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.input == "-":
+        items = read_items(sys.stdin)
+    else:
+        with open(args.input, encoding="utf-8") as f:
+            items = read_items(f)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.url:
+            run_remote(args.url, items, out, args.concurrency)
+        else:
+            asyncio.run(run_local(items, out, args.concurrency))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
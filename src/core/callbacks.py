@@ -1,8 +1,37 @@
 """
 Callback handlers for streaming responses
 """
+import logging
 import queue
-from langchain.callbacks.base import BaseCallbackHandler
+import time
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+agent_logger = logging.getLogger("agent.trace")
+
+
+def llm_timings(response) -> dict:
+    """
+    Prefill figures Ollama reports in the last chunk of a generation
+
+    Args:
+        response: LLMResult passed to on_llm_end
+
+    Returns:
+        {"prefill_ms", "prompt_eval_tokens", "load_ms"} (keys the backend sent)
+    """
+    try:
+        info = response.generations[0][0].generation_info or {}
+    except (AttributeError, IndexError, TypeError):
+        return {}
+    timings = {}
+    if info.get("prompt_eval_duration") is not None:
+        timings["prefill_ms"] = round(info["prompt_eval_duration"] / 1e6, 1)
+    if info.get("prompt_eval_count") is not None:
+        # Tokens actually evaluated: a prefix reused from the KV cache is not counted
+        timings["prompt_eval_tokens"] = info["prompt_eval_count"]
+    if info.get("load_duration"):
+        timings["load_ms"] = round(info["load_duration"] / 1e6, 1)
+    return timings
 
 
 class QueueCallback(BaseCallbackHandler):
@@ -10,11 +39,12 @@ class QueueCallback(BaseCallbackHandler):
     Callback handler that puts tokens into a queue for streaming responses.
     Only starts collecting after 'Final Answer:' is detected.
     """
-    
+
     def __init__(self, q: queue.Queue):
         self.q = q
         self.collecting = False
         self.buffer = ""
+        self.answer_parts = []
 
     def on_llm_new_token(self, token: str, **kwargs):
         """Called when a new token is generated"""
@@ -23,10 +53,155 @@ class QueueCallback(BaseCallbackHandler):
         if not self.collecting and "Final Answer:" in self.buffer:
             self.collecting = True
             token = self.buffer.split("Final Answer:", 1)[1]
-            self.q.put(token)
+            self.emit_token(token)
         elif self.collecting:
-            self.q.put(token)
+            self.emit_token(token)
+
+    def emit_token(self, token: str):
+        """Forward an answer token to the consumer"""
+        self.answer_parts.append(token)
+        self.q.put(token)
+
+    def answer_text(self) -> str:
+        """Full answer streamed so far"""
+        return "".join(self.answer_parts)
 
     def on_chain_end(self, outputs, **kwargs):
         """Called when the chain ends - signal completion"""
-        self.q.put(None)
\ No newline at end of file
+        self.q.put(None)
+
+
+class EventQueueCallback(QueueCallback):
+    """
+    Callback handler for framed streaming.
+    Puts ("token", text), ("tool_start", info) and ("tool_end", info) events
+    into the queue and keeps usage counters for the final summary.
+    Completion is signalled by the caller, not by chain callbacks, because
+    this handler is attached to the whole agent run.
+    """
+
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.answer_tokens = 0
+        self.llm_tokens = 0
+        self.tool_calls = 0
+        self.prompt_tokens = 0
+        self.last_prompt_tokens = None
+        self.iterations = []
+        self._tool_runs = {}
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        """Count every generated token, forward only the answer"""
+        self.llm_tokens += 1
+        super().on_llm_new_token(token, **kwargs)
+
+    def emit_token(self, token: str):
+        """Forward an answer token as an event"""
+        if not token:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        self.answer_tokens += 1
+        self.answer_parts.append(token)
+        self.q.put(("token", token))
+
+    def on_chain_end(self, outputs, **kwargs):
+        """Sub-chains end many times per run; completion comes from the caller"""
+
+    def on_custom_event(self, name, data, **kwargs):
+        """Prompt size reported by the prompt builder for each LLM call"""
+        if name == "prompt_budget":
+            self.last_prompt_tokens = data["prompt_tokens"]
+            self.prompt_tokens += data["prompt_tokens"]
+            self.iterations.append({
+                "iteration": data["iteration"],
+                "prompt_tokens": data["prompt_tokens"],
+                "prefix_tokens": data.get("prefix_tokens"),
+            })
+
+    def on_llm_end(self, response, **kwargs):
+        """Prefill time of the LLM call, attached to its iteration"""
+        if self.iterations and "prefill_ms" not in self.iterations[-1]:
+            self.iterations[-1].update(llm_timings(response))
+
+    def on_tool_start(self, serialized, input_str, *, run_id=None, **kwargs):
+        """Called when the agent starts a tool"""
+        name = (serialized or {}).get("name", "tool")
+        self.tool_calls += 1
+        self._tool_runs[run_id] = (name, time.monotonic())
+        self.q.put(("tool_start", {
+            "tool": name,
+            "input": input_str,
+            "elapsed_ms": self._elapsed_ms(),
+        }))
+
+    def on_tool_end(self, output, *, run_id=None, **kwargs):
+        """Called when a tool returns"""
+        self._tool_finished(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id=None, **kwargs):
+        """Called when a tool raises"""
+        self._tool_finished(run_id, "error", str(error))
+
+    def _tool_finished(self, run_id, status: str, error: str = None):
+        name, started = self._tool_runs.pop(run_id, ("tool", time.monotonic()))
+        info = {
+            "tool": name,
+            "status": status,
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+        }
+        if error:
+            info["error"] = error
+        self.q.put(("tool_end", info))
+
+    def _elapsed_ms(self) -> float:
+        return round((time.monotonic() - self.started_at) * 1000, 1)
+
+    def usage(self) -> dict:
+        """Usage summary for the final event"""
+        ttft = None
+        if self.first_token_at is not None:
+            ttft = round((self.first_token_at - self.started_at) * 1000, 1)
+        prefill = [it["prefill_ms"] for it in self.iterations if "prefill_ms" in it]
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "last_prompt_tokens": self.last_prompt_tokens,
+            "prefill_ms": round(sum(prefill), 1) if prefill else None,
+            "iterations": self.iterations,
+            "answer_tokens": self.answer_tokens,
+            "llm_tokens": self.llm_tokens,
+            "tool_calls": self.tool_calls,
+            "time_to_first_token_ms": ttft,
+            "duration_ms": self._elapsed_ms(),
+        }
+
+
+class AgentTraceLogger(BaseCallbackHandler):
+    """
+    Logs agent steps (actions, tool results, final answer) for one run.
+    Attached only when a request asks for verbose tracing, instead of
+    AgentExecutor(verbose=True) printing every run to stdout.
+    """
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+
+    def _log(self, message: str, **fields):
+        agent_logger.info(message, extra={"request_id": self.request_id, **fields})
+
+    def on_agent_action(self, action, **kwargs):
+        self._log(
+            f"🧠 [{self.request_id}] {action.log.strip()}",
+            tool=action.tool, tool_input=str(action.tool_input)
+        )
+
+    def on_tool_end(self, output, **kwargs):
+        self._log(f"🔧 [{self.request_id}] Observation: {output}")
+
+    def on_tool_error(self, error, **kwargs):
+        self._log(f"❌ [{self.request_id}] Tool error: {error}", error=str(error))
+
+    def on_agent_finish(self, finish, **kwargs):
+        self._log(f"🏁 [{self.request_id}] {finish.log.strip()}")
@@ -0,0 +1,346 @@
+"""
+Request deadlines and cooperative cancellation
+
+Every agent request gets a CancelToken with a deadline (REQUEST_TIMEOUT).
+The token is made current in the thread that runs the agent, so the layers
+below pick it up without extra arguments:
+
+- LLM calls: Ollama's streaming response is registered with the token and
+  closed on cancellation, which stops generation on the backend (also
+  during prefill); CancellationCallback raises at the next token or step.
+- Tools and persistence: HTTP calls use io_timeout() (the remaining budget
+  capped by their own timeout) and check the token before starting; calls
+  that cannot be interrupted go through run_cancellable().
+
+The token is cancelled by the watchdog when its deadline passes and by the
+routes when the client disconnects. Work done for a cancelled request is
+counted as wasted (see core.metrics).
+"""
+import heapq
+import itertools
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Iterator, List, Optional
+
+import requests
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCancelled(Exception):
+    """Raised when the request's deadline passed or its client went away"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Request cancelled ({reason})")
+        self.reason = reason
+
+
+class CancelToken:
+    """Deadline and cancellation state of one request (thread-safe)"""
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout if timeout else None
+        self.reason: Optional[str] = None
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._finished = False
+        self._lock = threading.Lock()
+        self._watch_state: Optional[str] = None  # "watched" / "dead" in the watchdog's heap (guarded by it)
+        if self.deadline is not None:
+            watchdog.watch(self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished
+
+    def cancel(self, reason: str) -> bool:
+        """
+        Cancel the request and run the registered on_cancel callbacks
+
+        Args:
+            reason: "deadline", "disconnect", ...
+
+        Returns:
+            True if this call cancelled the token (False if it already was or the request is over)
+        """
+        with self._lock:
+            if self._cancelled.is_set() or self._finished:
+                return False
+            self.reason = reason
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Cancel callback failed: {e}")
+        return True
+
+    def finish(self) -> None:
+        """The request is over: later deadlines or disconnects change nothing"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self._callbacks = []
+        if self.deadline is not None:
+            watchdog.forget(self)
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Run callback on cancellation (right away if already cancelled)"""
+        with self._lock:
+            if self._finished:
+                return
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline (None: no deadline)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """
+        Raises:
+            RequestCancelled: If the token is cancelled or its deadline passed
+        """
+        if not self._cancelled.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline")
+        if self._cancelled.is_set():
+            raise RequestCancelled(self.reason)
+
+    def timeout(self, default: float) -> float:
+        """Timeout for one blocking call: default, capped by the time left"""
+        self.check()
+        remaining = self.remaining()
+        return default if remaining is None else max(0.001, min(default, remaining))
+
+    def wait_for(self, event: threading.Event, poll: float = 0.1) -> None:
+        """
+        Wait for an event set by another thread, giving up on cancellation
+
+        Raises:
+            RequestCancelled: If the token is cancelled first
+        """
+        while not event.wait(self.timeout(poll)):
+            pass
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+class _Watchdog:
+    """
+    One daemon thread cancelling tokens whose deadline passed
+
+    Most requests finish long before their deadline. Their entries are
+    dropped when they reach the top of the heap, and the heap is rebuilt
+    without them once they are the majority, so it stays about as large as
+    the number of requests in progress.
+    """
+
+    COMPACT_MIN = 64  # finished entries tolerated before a rebuild is considered
+
+    def __init__(self):
+        self._heap: List = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._finished = 0  # entries of finished tokens still in the heap
+
+    def watch(self, token: CancelToken) -> None:
+        with self._cond:
+            heapq.heappush(self._heap, (token.deadline, next(self._counter), token))
+            token._watch_state = "watched"
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="deadline-watchdog", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def forget(self, token: CancelToken) -> None:
+        """A watched token finished: its entry is dead"""
+        with self._cond:
+            if token._watch_state != "watched":
+                return  # Already out of the heap
+            token._watch_state = "dead"
+            self._finished += 1
+            if self._finished > self.COMPACT_MIN and self._finished * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if entry[2]._watch_state != "dead"]
+                heapq.heapify(self._heap)
+                self._finished = 0
+
+    def _pop(self) -> CancelToken:
+        token = heapq.heappop(self._heap)[2]
+        if token._watch_state == "dead":
+            self._finished -= 1
+        token._watch_state = None
+        return token
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                deadline, _, token = self._heap[0]
+                if token.finished:
+                    self._pop()
+                    continue
+                delay = deadline - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                self._pop()
+            if token.cancel("deadline"):
+                logger.info(f"⏱️ Request deadline passed after {token.elapsed():.1f}s")
+
+
+watchdog = _Watchdog()
+
+_current: ContextVar[Optional[CancelToken]] = ContextVar("cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    """Token of the request running in this thread, if any"""
+    return _current.get()
+
+
+@contextmanager
+def use_token(token: Optional[CancelToken]) -> Iterator[Optional[CancelToken]]:
+    """
+    Make token current in this thread. New threads and pool workers do not
+    inherit it: submit with copy_context().run
+    """
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+def check_cancelled() -> None:
+    """Raise RequestCancelled if the current request is cancelled"""
+    token = _current.get()
+    if token is not None:
+        token.check()
+
+
+def io_timeout(default: float) -> float:
+    """
+    Timeout for an outgoing call of the current request
+
+    Args:
+        default: The call's own timeout in seconds
+
+    Returns:
+        default, capped by the time left before the request's deadline
+
+    Raises:
+        RequestCancelled: If the request is already cancelled
+    """
+    token = _current.get()
+    return default if token is None else token.timeout(default)
+
+
+def wait_event(event: threading.Event) -> None:
+    """Wait for an event, or until the current request is cancelled"""
+    token = _current.get()
+    if token is None:
+        event.wait()
+    else:
+        token.wait_for(event)
+
+
+# Blocking calls the request may give up on (see run_cancellable)
+_io_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cancellable-io")
+
+
+def run_cancellable(fn: Callable, *args, **kwargs):
+    """
+    Run a blocking call that cannot be interrupted (a third-party HTTP
+    client) so that the current request can stop waiting for it: on
+    cancellation RequestCancelled is raised at once and the call finishes
+    in the background, bounded by its own timeout
+
+    Raises:
+        RequestCancelled: If the request is cancelled before the call returns
+    """
+    token = _current.get()
+    if token is None:
+        return fn(*args, **kwargs)
+    token.check()
+    future = _io_pool.submit(copy_context().run, fn, *args, **kwargs)
+    done = threading.Event()
+    future.add_done_callback(lambda f: done.set())
+    token.wait_for(done)
+    return future.result()
+
+
+class AbortOnCancel(requests.auth.AuthBase):
+    """
+    requests auth hook (ChatOllama's auth=) tying each HTTP response to the
+    current request: cancelling the token closes the connection, and Ollama
+    stops generating for a closed connection
+    """
+
+    def __call__(self, r):
+        token = _current.get()
+        if token is not None:
+            token.check()
+            r.register_hook("response", lambda response, **kwargs: token.on_cancel(lambda: abort_response(response)))
+        return r
+
+
+def abort_response(response: requests.Response) -> None:
+    """
+    Close a streaming response from another thread: shut the socket down
+    first, which wakes up the reader and tells the server at once
+    (closing alone keeps the descriptor open while the reader holds it)
+    """
+    sock = getattr(getattr(response.raw, "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+abort_on_cancel = AbortOnCancel()
+
+
+class CancellationCallback(BaseCallbackHandler):
+    """Stops an agent run between steps and between tokens once its token is cancelled"""
+
+    raise_error = True
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.token.check()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.token.check()
+
+    def on_llm_new_token(self, token: str, **kwargs):
+        self.token.check()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.token.check()
+
+    def on_agent_action(self, action, **kwargs):
+        self.token.check()
@@ -1,19 +1,45 @@
 """
 Conversation memory management
+
+Recent exchanges are kept verbatim (MEMORY_WINDOW). Older messages are
+folded into a rolling summary that is computed in the background after a
+turn completes and stored with the conversation in the Spring API (and in a
+local file cache), so each turn only reads it, on any node.
 """
-from langchain.memory import ConversationBufferWindowMemory
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 from config.settings import settings
-from services.api_service import fetch_conversation_history
+from services.api_service import (
+    fetch_conversation_history,
+    fetch_conversation_summary,
+    save_conversation_summary,
+)
+from utils.text import truncate_tokens
+
+if TYPE_CHECKING:
+    from core.window_memory import SummaryWindowMemory
+
+logger = logging.getLogger(__name__)
 
 
-def setup_memory() -> ConversationBufferWindowMemory:
+def setup_memory() -> "SummaryWindowMemory":
     """
-    Setup conversation memory to keep last N exchanges
-    
+    Setup conversation memory to keep last N exchanges plus a summary of older ones
+
     Returns:
-        ConversationBufferWindowMemory configured with settings
+        SummaryWindowMemory configured with settings
     """
-    return ConversationBufferWindowMemory(
+    from core.window_memory import SummaryWindowMemory
+
+    return SummaryWindowMemory(
         k=settings.MEMORY_WINDOW,
         return_messages=True,
         memory_key="chat_history",
@@ -21,26 +47,223 @@ def setup_memory() -> ConversationBufferWindowMemory:
     )
 
 
-def load_previous_history(memory: ConversationBufferWindowMemory, 
-                         conv_id: str, 
+def load_previous_history(memory: "SummaryWindowMemory",
+                         conv_id: str,
                          access_token: str) -> None:
     """
     Load previous conversation history from Spring Boot API
-    
+
     Args:
         memory: The conversation memory instance
         conv_id: Conversation ID
         access_token: Authorization token
     """
     messages = fetch_conversation_history(conv_id, access_token)
-    
+
     if not messages:
         return
-    
-    for msg in messages:
+
+    window = settings.MEMORY_WINDOW * 2
+    older, recent = messages[:-window], messages[-window:]
+
+    for msg in recent:
         if msg['role'] == 'USER':
             memory.chat_memory.add_user_message(msg['content'])
         else:
             memory.chat_memory.add_ai_message(msg['content'])
-    
-    print(f"✅ Loaded {len(messages)} previous messages")
\ No newline at end of file
+
+    memory.conv_id = conv_id
+    memory.older_messages = older
+    if older and settings.SUMMARY_ENABLED:
+        record = summary_store.load(conv_id, access_token)
+        covered = 0
+        if record and record["covered"] <= len(older):
+            memory.summary = record["summary"]
+            covered = record["covered"]
+        # Update of the last turns still running (or failed): send them verbatim,
+        # at most one window's worth (the prompt budget trims further)
+        memory.unsummarized = older[covered:][-window:]
+
+    logger.debug(f"✅ Loaded {len(messages)} previous messages ({len(older)} summarized)")
+
+
+class SummaryStore:
+    """
+    Conversation summaries stored with the conversation in the Spring API,
+    cached as one JSON file per conversation (used when the API is unreachable
+    or does not store summaries)
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, conv_id: str) -> Path:
+        safe = "".join(c for c in conv_id if c.isalnum() or c in "-_")
+        return self.directory / f"{safe}.json"
+
+    def load(self, conv_id: str, access_token: Optional[str] = None) -> Optional[Dict]:
+        """
+        Read a stored summary: the one of the API or of the local cache,
+        whichever covers more messages
+
+        Args:
+            conv_id: Conversation ID
+            access_token: Authorization token (None: local cache only)
+
+        Returns:
+            {"summary", "covered", ...} or None
+        """
+        records = []
+        if access_token:
+            records.append(fetch_conversation_summary(conv_id, access_token))
+        try:
+            with open(self._path(conv_id), encoding="utf-8") as f:
+                records.append(json.load(f))
+        except (OSError, ValueError):
+            pass
+        records = [r for r in records if r]
+        return max(records, key=lambda r: r.get("covered", 0)) if records else None
+
+    def save(self, conv_id: str, summary: str, covered: int,
+             access_token: Optional[str] = None) -> None:
+        """
+        Store a summary with the conversation and write the cache file atomically
+
+        Args:
+            conv_id: Conversation ID
+            summary: Summary text
+            covered: Number of leading messages the summary includes
+            access_token: Authorization token (None: local cache only)
+        """
+        if access_token:
+            save_conversation_summary(conv_id, summary, covered, access_token)
+        record = {"summary": summary, "covered": covered, "updated_at": time.time()}
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp, self._path(conv_id))
+
+
+SUMMARY_PROMPT = """Progressively summarize the conversation between a user and an automotive assistant.
+Keep facts that matter later: the user's car (make, model, year, engine), problems, decisions, preferences and answers already given.
+Write at most {max_words} words.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{lines}
+
+New summary:"""
+
+
+class SummaryUpdater:
+    """Updates conversation summaries on a background thread, one job per conversation"""
+
+    def __init__(self, store: SummaryStore):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, memory: "SummaryWindowMemory", access_token: Optional[str] = None) -> bool:
+        """
+        Queue a summary update if messages before the window are not covered yet
+
+        Args:
+            memory: Memory of the finished turn
+            access_token: Authorization token to store the summary with the conversation
+
+        Returns:
+            True if an update was queued
+        """
+        if not settings.SUMMARY_ENABLED or not memory.conv_id or not memory.older_messages:
+            return False
+
+        conv_id = memory.conv_id
+        with self._lock:
+            if conv_id in self._pending:
+                return False
+            self._pending.add(conv_id)
+
+        self._executor.submit(self._update, conv_id, list(memory.older_messages), access_token)
+        return True
+
+    def _update(self, conv_id: str, older: List[Dict], access_token: Optional[str] = None) -> None:
+        try:
+            record = self.store.load(conv_id, access_token) or {"summary": "", "covered": 0}
+            covered = record["covered"]
+            if covered > len(older):
+                # History was edited: start over
+                record, covered = {"summary": "", "covered": 0}, 0
+            if covered == len(older):
+                return
+
+            lines = "\n".join(
+                f"{'User' if m['role'] == 'USER' else 'Assistant'}: {m['content']}"
+                for m in older[covered:]
+            )
+            started = time.monotonic()
+            summary = summarize(conv_id, record["summary"], lines)
+            self.store.save(conv_id, summary, len(older), access_token)
+            logger.info(f"🧾 Updated summary for {conv_id} ({len(older)} messages, {time.monotonic() - started:.1f}s)")
+        except Exception as e:
+            logger.warning(f"⚠️ Summary update failed for {conv_id}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(conv_id)
+
+
+def summarize(conv_id: str, summary: str, lines: str) -> str:
+    """
+    Fold new conversation lines into a summary with the LLM. The call
+    takes an admission slot like an agent run and goes to the
+    conversation's backend, whose prompt cache already holds its messages.
+
+    Args:
+        conv_id: Conversation ID (backend affinity key)
+        summary: Current summary (may be empty)
+        lines: New transcript lines
+
+    Returns:
+        Updated summary, capped at SUMMARY_MAX_TOKENS
+    """
+    from langchain_community.chat_models import ChatOllama
+    from core.admission import admission
+    from core.backends import backend_pool, is_backend_failure
+
+    ticket = admission.acquire_threadsafe("summary")
+    try:
+        lease = backend_pool.acquire(affinity_key=conv_id)
+        error = None
+        try:
+            llm = ChatOllama(
+                model=settings.OLLAMA_MODEL,
+                base_url=lease.url,
+                temperature=0,
+                num_predict=settings.SUMMARY_MAX_TOKENS * 2,
+                timeout=settings.SUMMARY_TIMEOUT,
+                **settings.ollama_model_options(),
+            )
+            result = llm.invoke(SUMMARY_PROMPT.format(
+                max_words=settings.SUMMARY_MAX_TOKENS * 3 // 4,
+                summary=summary or "(none)",
+                lines=lines,
+            ))
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            backend_pool.release(lease, ok=error is None or not is_backend_failure(error))
+    finally:
+        admission.release(ticket)
+
+    return truncate_tokens(result.content.strip(), settings.SUMMARY_MAX_TOKENS)
+
+
+# Global store and updater
+summary_store = SummaryStore(settings.SUMMARY_DIR)
+summary_updater = SummaryUpdater(summary_store)
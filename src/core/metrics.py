@@ -0,0 +1,376 @@
+"""
+Latency instrumentation: Prometheus-style metrics and per-request traces.
+
+Metrics are kept in-process and rendered in the Prometheus text format by
+the /metrics endpoint, every sample labelled with the worker's pid (each
+gunicorn worker has its own counters). Each request builds a Trace of timed spans (history
+fetch, saves, agent build, LLM calls, tool calls); a sample of traces is
+appended to TRACE_LOG_PATH as JSON lines.
+"""
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks.base import BaseCallbackHandler
+
+from config.settings import settings
+from core.callbacks import llm_timings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+
+def _escape(value: object) -> str:
+    """Label value escaped for the Prometheus text format (backslash, quote, newline)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labelnames: Sequence[str], values: Tuple, *extra: str) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, values)]
+    pairs.extend(label for label in extra if label)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self, worker: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.labelnames, key, worker)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(self, name: str, help_text: str,
+                 labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self, worker: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = _label_str(self.labelnames, key, worker, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            inf = _label_str(self.labelnames, key, worker, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key, worker)} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key, worker)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples are read from a callback at scrape time"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, help_text: str, collect: Callable[[], Dict[Tuple, float]],
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self, worker: str = "") -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            samples = self.collect()
+        except Exception:
+            samples = {}
+        for key, value in sorted(samples.items()):
+            lines.append(f"{self.name}{_label_str(self.labelnames, key, worker)} {value}")
+        return lines
+
+
+class CollectedCounter(Gauge):
+    """Counter whose totals are kept by another component and read at scrape time"""
+
+    metric_type = "counter"
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        # Read at scrape time: the app is imported in the gunicorn master, before the fork
+        worker = f'worker="{os.getpid()}"'
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(worker))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chat_stage_seconds", "Duration of request stages", ["endpoint", "stage"]))
+LLM_CALL_SECONDS = REGISTRY.register(Histogram(
+    "llm_call_seconds", "Duration of one LLM call"))
+LLM_TTFT_SECONDS = REGISTRY.register(Histogram(
+    "llm_time_to_first_token_seconds", "Time from LLM call start to first token"))
+LLM_TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "llm_tokens_per_second", "Generation rate after the first token", buckets=RATE_BUCKETS))
+LLM_PREFILL_SECONDS = REGISTRY.register(Histogram(
+    "llm_prefill_seconds", "Prompt evaluation time reported by the backend for one LLM call"))
+LLM_PROMPT_EVAL_TOKENS = REGISTRY.register(Counter(
+    "llm_prompt_eval_tokens_total", "Prompt tokens the backend evaluated (cached prefixes excluded)"))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "llm_generated_tokens_total", "Tokens generated by the LLM"))
+TOOL_SECONDS = REGISTRY.register(Histogram(
+    "tool_call_seconds", "Duration of agent tool calls", ["tool", "status"]))
+RETRIEVER_SECONDS = REGISTRY.register(Histogram(
+    "rag_retriever_seconds", "Duration of one hybrid retrieval source (late: finished after the merge)",
+    ["retriever", "status"]))
+REQUESTS = REGISTRY.register(Counter(
+    "chat_requests_total", "Chat requests by outcome", ["endpoint", "outcome"]))
+CANCELLED = REGISTRY.register(Counter(
+    "cancelled_requests_total", "Requests cancelled before their answer was complete", ["endpoint", "reason"]))
+WASTED_LLM_TOKENS = REGISTRY.register(Counter(
+    "wasted_llm_tokens_total", "Tokens generated for agent runs that were cancelled", ["reason"]))
+WASTED_AGENT_SECONDS = REGISTRY.register(Counter(
+    "wasted_agent_seconds_total", "Agent run time spent on runs that were cancelled", ["reason"]))
+COALESCED = REGISTRY.register(Counter(
+    "coalesced_calls_total", "Tool calls and agent runs that ran (leader) or joined an identical one in flight (follower)",
+    ["kind", "role"]))
+
+
+def record_cancelled(endpoint: str, reason: str, run_seconds: float = 0.0, llm_tokens: int = 0) -> None:
+    """Count a cancelled request and the agent work thrown away with it"""
+    CANCELLED.inc(endpoint=endpoint, reason=reason)
+    if run_seconds:
+        WASTED_AGENT_SECONDS.inc(run_seconds, reason=reason)
+    if llm_tokens:
+        WASTED_LLM_TOKENS.inc(llm_tokens, reason=reason)
+    logger.info(
+        f"🛑 {endpoint} request cancelled ({reason}) after {run_seconds:.1f}s of agent run, "
+        f"{llm_tokens} tokens discarded"
+    )
+
+
+# ----------------------------------------------------------------------
+# Request traces
+# ----------------------------------------------------------------------
+
+class Trace:
+    """Timed spans of one request"""
+
+    def __init__(self, endpoint: str, sampled: Optional[bool] = None):
+        self.endpoint = endpoint
+        self.request_id = uuid.uuid4().hex[:16]
+        self.started = time.monotonic()
+        self.started_wall = time.time()
+        self.spans: List[Dict] = []
+        self.sampled = random.random() < settings.TRACE_SAMPLE_RATE if sampled is None else sampled
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        """Time a block as a request stage"""
+        start = time.monotonic()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(stage, time.monotonic() - start, start=start, status=status, **attrs)
+
+    def record(self, stage: str, seconds: float, start: Optional[float] = None,
+               observe: bool = True, **attrs) -> None:
+        """Add a finished span"""
+        if observe:
+            STAGE_SECONDS.observe(seconds, endpoint=self.endpoint, stage=stage)
+        if start is None:
+            start = time.monotonic() - seconds
+        span = {
+            "stage": stage,
+            "start_ms": round((start - self.started) * 1000, 1),
+            "duration_ms": round(seconds * 1000, 1),
+        }
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, outcome: str = "ok") -> None:
+        """Record the total duration and write the trace if sampled"""
+        total = time.monotonic() - self.started
+        STAGE_SECONDS.observe(total, endpoint=self.endpoint, stage="total")
+        REQUESTS.inc(endpoint=self.endpoint, outcome=outcome)
+        if self.sampled:
+            with self._lock:
+                record = {
+                    "request_id": self.request_id,
+                    "endpoint": self.endpoint,
+                    "timestamp": self.started_wall,
+                    "outcome": outcome,
+                    "duration_ms": round(total * 1000, 1),
+                    "spans": list(self.spans),
+                }
+            _write_trace(record)
+
+
+_trace_lock = threading.Lock()
+
+
+def _write_trace(record: Dict) -> None:
+    try:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with _trace_lock:
+            settings.TRACE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(settings.TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        logger.warning(f"⚠️ Failed to write trace: {e}")
+
+
+class MetricsCallback(BaseCallbackHandler):
+    """
+    Records LLM calls (duration, time-to-first-token, tokens/sec) and tool
+    calls into the metrics registry and the request trace.
+    Attach it to the agent run so it sees every nested LLM and tool call.
+    """
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._llm_runs: Dict = {}   # run_id -> [start, first_token_at, tokens]
+        self._tool_runs: Dict = {}  # run_id -> (name, start)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id=None, **kwargs):
+        self._llm_runs[run_id] = [time.monotonic(), None, 0]
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs):
+        self._llm_runs[run_id] = [time.monotonic(), None, 0]
+
+    def on_llm_new_token(self, token, *, run_id=None, **kwargs):
+        run = self._llm_runs.get(run_id)
+        if run is None:
+            return
+        if run[1] is None:
+            run[1] = time.monotonic()
+        run[2] += 1
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs):
+        self._finish_llm(run_id, "ok", llm_timings(response))
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs):
+        self._finish_llm(run_id, "error")
+
+    def _finish_llm(self, run_id, status: str, timings: Optional[Dict] = None) -> None:
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        start, first, tokens = run
+        end = time.monotonic()
+        LLM_CALL_SECONDS.observe(end - start)
+        attrs = {"status": status, "tokens": tokens, **(timings or {})}
+        if timings and "prefill_ms" in timings:
+            LLM_PREFILL_SECONDS.observe(timings["prefill_ms"] / 1000)
+        if timings and "prompt_eval_tokens" in timings:
+            LLM_PROMPT_EVAL_TOKENS.inc(timings["prompt_eval_tokens"])
+        if first is not None:
+            LLM_TTFT_SECONDS.observe(first - start)
+            attrs["ttft_ms"] = round((first - start) * 1000, 1)
+            if tokens > 1 and end > first:
+                rate = (tokens - 1) / (end - first)
+                LLM_TOKENS_PER_SECOND.observe(rate)
+                attrs["tokens_per_sec"] = round(rate, 1)
+        LLM_TOKENS.inc(tokens)
+        self.trace.record("llm_call", end - start, start=start, observe=False, **attrs)
+
+    def on_tool_start(self, serialized, input_str, *, run_id=None, **kwargs):
+        self._tool_runs[run_id] = ((serialized or {}).get("name", "tool"), time.monotonic())
+
+    def on_tool_end(self, output, *, run_id=None, **kwargs):
+        self._finish_tool(run_id, "ok")
+
+    def on_tool_error(self, error, *, run_id=None, **kwargs):
+        self._finish_tool(run_id, "error")
+
+    def _finish_tool(self, run_id, status: str) -> None:
+        name, start = self._tool_runs.pop(run_id, ("tool", time.monotonic()))
+        seconds = time.monotonic() - start
+        TOOL_SECONDS.observe(seconds, tool=name, status=status)
+        self.trace.record("tool_call", seconds, start=start, observe=False, tool=name, status=status)
+
+
+def register_runtime_gauges() -> None:
+    """Expose admission and backend pool state (gauges, and the rejection counter)"""
+    from core.admission import admission
+    from core.backends import backend_pool
+
+    REGISTRY.register(Gauge(
+        "admission_queue_depth", "Requests waiting for an agent slot",
+        lambda: {(): admission.snapshot()["queue_depth"]}))
+    REGISTRY.register(Gauge(
+        "admission_in_flight", "Agent runs holding a slot",
+        lambda: {(): admission.snapshot()["in_flight"]}))
+    REGISTRY.register(Gauge(
+        "admission_wait_seconds", "Admission wait-time percentiles over recent requests",
+        lambda: {(q,): v for q, v in admission.snapshot()["wait_seconds"].items()},
+        labelnames=["quantile"]))
+    REGISTRY.register(CollectedCounter(
+        "admission_rejected_total", "Rejected requests by reason",
+        lambda: {(r,): v for r, v in admission.snapshot()["rejected_total"].items()},
+        labelnames=["reason"]))
+    REGISTRY.register(Gauge(
+        "ollama_backend_outstanding", "Outstanding requests per Ollama backend",
+        lambda: {(b["url"],): b["outstanding"] for b in backend_pool.snapshot()},
+        labelnames=["backend"]))
+    REGISTRY.register(Gauge(
+        "ollama_backend_up", "1 if the backend is healthy with a closed circuit",
+        lambda: {(b["url"],): int(b["healthy"] and b["circuit"] == "closed")
+                 for b in backend_pool.snapshot()},
+        labelnames=["backend"]))
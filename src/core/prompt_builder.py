@@ -0,0 +1,278 @@
+"""
+Token-budgeted prompt assembly for the ReAct agent.
+
+Each section of the prompt has its own budget:
+- history: most recent exchanges that fit, oldest dropped first
+- observations: each tool result is trimmed to the sentences that best
+  match the tool input (RAG snippets keep their source header)
+- scratchpad: when all steps together exceed the budget, older
+  observations are replaced by a short placeholder
+
+Everything before the history (instructions, tool descriptions) is the
+static prefix: rendered once per agent and identical in every LLM call, so
+the backend can reuse its cached prefill. The history and scratchpad only
+grow at the end between calls, except when the budget drops old parts.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Sequence, Tuple
+
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from langchain.tools.render import render_text_description
+from langchain_core.agents import AgentAction
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from config.settings import settings
+from utils.text import estimate_tokens, top_sentences, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_MARKER = "📄 ["
+OMITTED_OBSERVATION = "[earlier observation omitted to fit the prompt budget]"
+
+
+@dataclass
+class PromptBudget:
+    """Token budget per prompt section"""
+    history_tokens: int
+    observation_tokens: int
+    scratchpad_tokens: int
+
+    @classmethod
+    def from_settings(cls) -> "PromptBudget":
+        return cls(
+            history_tokens=settings.PROMPT_HISTORY_TOKENS,
+            observation_tokens=settings.PROMPT_OBSERVATION_TOKENS,
+            scratchpad_tokens=settings.PROMPT_SCRATCHPAD_TOKENS,
+        )
+
+
+def render_history(messages: Sequence, max_tokens: int) -> str:
+    """
+    Render chat history as text, keeping the most recent messages that fit.
+    Leading system messages (the conversation summary) are always kept,
+    using at most half of the budget.
+
+    Args:
+        messages: Chat messages (oldest first)
+        max_tokens: Token budget for the history section
+
+    Returns:
+        "Human: ... / AI: ..." transcript
+    """
+    messages = list(messages or [])
+    pinned: List[str] = []
+    while messages and isinstance(messages[0], BaseMessage) and messages[0].type == "system":
+        pinned.append(truncate_tokens(f"System: {messages.pop(0).content}", max_tokens // 2))
+
+    lines: List[str] = []
+    used = sum(estimate_tokens(line) for line in pinned)
+    for msg in reversed(messages):
+        if isinstance(msg, BaseMessage):
+            role = "Human" if msg.type == "human" else "AI"
+            line = f"{role}: {msg.content}"
+        else:
+            line = str(msg)
+
+        cost = estimate_tokens(line)
+        if used + cost > max_tokens:
+            if not lines:
+                # The latest message alone is too long: keep its beginning
+                lines.append(truncate_tokens(line, max_tokens - used))
+            break
+        lines.append(line)
+        used += cost
+
+    return "\n".join(pinned + list(reversed(lines)))
+
+
+def trim_observation(observation: str, query: str, max_tokens: int) -> str:
+    """
+    Trim a tool observation to its budget
+
+    Args:
+        observation: Raw tool output
+        query: Text the observation should answer (tool input)
+        max_tokens: Token budget for this observation
+
+    Returns:
+        Trimmed observation
+    """
+    if estimate_tokens(observation) <= max_tokens:
+        return observation
+
+    stripped = observation.lstrip()
+    if stripped.startswith(("[", "{")):
+        # Structured output (JSON listings): cutting text would break it
+        try:
+            return trim_json(json.loads(stripped), max_tokens)
+        except ValueError:
+            pass
+
+    if SNIPPET_MARKER in observation:
+        blocks = [b for b in observation.split("\n\n" + SNIPPET_MARKER)]
+        blocks = [blocks[0]] + [SNIPPET_MARKER + b for b in blocks[1:]]
+        per_block = max(1, max_tokens // len(blocks))
+        trimmed = []
+        for block in blocks:
+            header, _, body = block.partition("\n")
+            if not header.startswith(SNIPPET_MARKER):
+                header, body = "", block
+            body_budget = max(1, per_block - estimate_tokens(header))
+            body = top_sentences(body, query, body_budget)
+            trimmed.append(f"{header}\n{body}" if header else body)
+        return "\n\n".join(trimmed)
+
+    return top_sentences(observation, query, max_tokens)
+
+
+def _containers(value: Any) -> Iterator[Any]:
+    """Every list and dict in a JSON value, outermost first"""
+    if isinstance(value, (list, dict)):
+        yield value
+        for child in value.values() if isinstance(value, dict) else value:
+            yield from _containers(child)
+
+
+def trim_json(value: Any, max_tokens: int) -> str:
+    """
+    Serialize a JSON value within max_tokens, dropping whole trailing items
+    (of the largest list first), then trailing fields, so it stays valid JSON
+
+    Returns:
+        Compact JSON (over budget only if a single scalar is too long)
+    """
+    text = json.dumps(value, ensure_ascii=False)
+    while estimate_tokens(text) > max_tokens:
+        containers = list(_containers(value))
+        lists = [c for c in containers if isinstance(c, list) and len(c) > 1]
+        # Fields of the innermost objects (a listing's), not whole sections
+        records = [c for c in containers if isinstance(c, dict) and len(c) > 1
+                   and not any(isinstance(v, (list, dict)) for v in c.values())]
+        candidates = lists or records or [c for c in containers if c]
+        if not candidates:
+            break
+        largest = max(candidates, key=lambda c: len(json.dumps(c, ensure_ascii=False)))
+        if isinstance(largest, list):
+            largest.pop()
+        else:
+            largest.popitem()
+        text = json.dumps(value, ensure_ascii=False)
+    return text
+
+
+def format_scratchpad(intermediate_steps: List[Tuple[AgentAction, str]],
+                      question: str,
+                      budget: PromptBudget) -> str:
+    """
+    Budgeted equivalent of langchain's format_log_to_str
+
+    Each observation is trimmed on its own, so a step renders the same way
+    in every later iteration; only when the whole scratchpad is over budget
+    are older observations replaced by a placeholder.
+
+    Args:
+        intermediate_steps: (action, observation) pairs so far
+        question: User question (fallback query for trimming)
+        budget: Prompt budget
+
+    Returns:
+        Scratchpad text
+    """
+    steps = []
+    for action, observation in intermediate_steps:
+        query = action.tool_input if isinstance(action.tool_input, str) else question
+        steps.append([action.log, trim_observation(str(observation), query, budget.observation_tokens)])
+
+    total = sum(estimate_tokens(log) + estimate_tokens(obs) for log, obs in steps)
+    # The latest observation is what the model needs next; never drop it
+    for step in steps[:-1]:
+        if total <= budget.scratchpad_tokens:
+            break
+        total -= estimate_tokens(step[1]) - estimate_tokens(OMITTED_OBSERVATION)
+        step[1] = OMITTED_OBSERVATION
+
+    return "".join(f"{log}\nObservation: {obs}\nThought: " for log, obs in steps)
+
+
+def static_prefix(prompt: BasePromptTemplate) -> str:
+    """
+    Part of a ReAct prompt that does not depend on the request
+
+    Args:
+        prompt: ReAct prompt with tools and tool_names already bound
+
+    Returns:
+        Prompt text before the first request variable (history, input or scratchpad)
+    """
+    marker = "\x00"
+    text = prompt.format(chat_history=marker, input=marker, agent_scratchpad=marker)
+    return text.split(marker, 1)[0]
+
+
+def create_budgeted_react_agent(llm,
+                                tools: Sequence,
+                                prompt: BasePromptTemplate,
+                                budget: PromptBudget) -> Runnable:
+    """
+    ReAct agent runnable like langchain's create_react_agent, with the
+    history and scratchpad rendered under a token budget and the prompt
+    size reported for every LLM call
+
+    Args:
+        llm: Chat model
+        tools: Agent tools
+        prompt: ReAct prompt (tools, tool_names, chat_history, input, agent_scratchpad)
+        budget: Prompt budget
+
+    Returns:
+        Agent runnable for AgentExecutor
+    """
+    prompt = prompt.partial(
+        tools=render_text_description(list(tools)),
+        tool_names=", ".join(t.name for t in tools),
+    )
+    prefix = static_prefix(prompt)
+    prefix_tokens = estimate_tokens(prefix)
+
+    def assemble(inputs: dict, config: RunnableConfig):
+        steps = inputs.get("intermediate_steps", [])
+        history = render_history(inputs.get("chat_history", []), budget.history_tokens)
+        scratchpad = format_scratchpad(steps, inputs["input"], budget)
+
+        variables = {k: v for k, v in inputs.items() if k != "intermediate_steps"}
+        variables.update(chat_history=history, agent_scratchpad=scratchpad)
+        prompt_value = prompt.invoke(variables, config)
+        text = prompt_value.to_string()
+        if not text.startswith(prefix):
+            logger.warning("⚠️ ReAct prompt does not start with its static prefix; backend prompt cache will miss")
+
+        report = {
+            "iteration": len(steps) + 1,
+            "prompt_tokens": estimate_tokens(text),
+            "prefix_tokens": prefix_tokens,
+            "history_tokens": estimate_tokens(history),
+            "scratchpad_tokens": estimate_tokens(scratchpad),
+        }
+        logger.debug(
+            "📏 Prompt tokens (iteration %d): %d [static %d, history %d, scratchpad %d]",
+            report["iteration"], report["prompt_tokens"], report["prefix_tokens"],
+            report["history_tokens"], report["scratchpad_tokens"],
+            extra=report,
+        )
+        try:
+            dispatch_custom_event("prompt_budget", report, config=config)
+        except RuntimeError:
+            # No parent run (agent invoked outside a traced context)
+            pass
+        return prompt_value
+
+    return (
+        RunnableLambda(assemble)
+        | llm.bind(stop=["\nObservation"])
+        | ReActSingleInputOutputParser()
+    )
@@ -0,0 +1,58 @@
+"""
+Bookkeeping at the end of an agent run, shared by /chat, /chat/stream and
+batches (core/batch.py): give back the admission slot and the backend lease,
+finish the cancel token and count cancelled work.
+"""
+import time
+from typing import Optional
+
+from core.admission import Ticket, admission
+from core.backends import Lease, backend_pool, is_backend_failure
+from core.deadline import CancelToken, RequestCancelled
+from core.metrics import record_cancelled
+
+
+def release_run(ticket: Optional[Ticket], lease: Optional[Lease],
+                error: Optional[BaseException] = None) -> None:
+    """
+    Give back the admission slot and the backend lease (idempotent)
+
+    Args:
+        ticket: Admission ticket
+        lease: Backend lease
+        error: Exception raised by the agent run, if any
+    """
+    backend_pool.release(lease, ok=error is None or not is_backend_failure(error))
+    admission.release(ticket)
+
+
+def end_run(ticket: Optional[Ticket],
+            lease: Optional[Lease],
+            token: CancelToken,
+            error: Optional[BaseException],
+            endpoint: str,
+            run_started: float,
+            llm_tokens: int = 0) -> str:
+    """
+    Release a finished agent run and record how it ended
+
+    Args:
+        ticket: Admission ticket of the run
+        lease: Backend lease of the run
+        token: The run's cancel token (finished here)
+        error: Exception the run ended with (RequestCancelled if cancelled), if any
+        endpoint: Endpoint label of the cancellation metrics
+        run_started: time.monotonic() when the agent started
+        llm_tokens: Tokens generated so far (thrown away if cancelled)
+
+    Returns:
+        Outcome for the trace: "ok", "error" or "cancelled"
+    """
+    cancelled = isinstance(error, RequestCancelled)
+    # A cancelled run says nothing about the backend's health
+    release_run(ticket, lease, None if cancelled else error)
+    token.finish()
+    if cancelled:
+        record_cancelled(endpoint, error.reason, time.monotonic() - run_started, llm_tokens)
+        return "cancelled"
+    return "error" if error else "ok"
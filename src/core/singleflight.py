@@ -0,0 +1,261 @@
+"""
+In-flight request coalescing (single flight)
+
+When the same work is requested again while it is still running, the new
+caller attaches to the running execution instead of starting its own:
+
+- Tool calls: concurrent calls of a tool with the same input share one
+  call and its result (one SerpAPI request, one retrieval).
+- Agent runs: requests whose answer does not depend on conversation history
+  (a first question, /chat) share one agent run per question. The run's
+  events go to a Flight, which replays them to late subscribers and fans
+  out new ones, so every waiting stream gets the same tokens.
+
+Only work that is in flight is shared; nothing is cached after it ends.
+"""
+import logging
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config.settings import settings
+from core.deadline import CancelToken, RequestCancelled, wait_event
+from core.metrics import COALESCED
+
+if TYPE_CHECKING:
+    from core.window_memory import SummaryWindowMemory
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(text: str) -> str:
+    """Case- and whitespace-insensitive form of a question or tool input"""
+    return " ".join(str(text).lower().split())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers of the same key share its outcome"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Call fn, or wait for the identical call already running
+
+        Returns:
+            fn's result (the same object for every caller of the flight)
+
+        Raises:
+            Whatever fn raised, in every caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED.inc(kind=self.kind, role="follower")
+            wait_event(call.done)
+            if isinstance(call.error, RequestCancelled):
+                # The leader's request was cancelled, not this one: run it again
+                return self.do(key, fn, *args, **kwargs)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        COALESCED.inc(kind=self.kind, role="leader")
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def wrap(self, name: str, fn: Callable[[str], Any]) -> Callable[[str], Any]:
+        """Single-input tool function whose concurrent identical calls are shared"""
+        if not settings.COALESCE_TOOLS:
+            return fn
+
+        def coalesced(tool_input: str) -> Any:
+            return self.do((name, normalize_key(tool_input)), fn, tool_input)
+
+        coalesced.__name__ = getattr(fn, "__name__", name)
+        coalesced.__doc__ = fn.__doc__
+        return coalesced
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class Flight:
+    """
+    Events of one agent run, for every request attached to it
+
+    Queue-like for the producer (put), so a streaming callback can write to
+    it directly; put(None) is not used, the run ends with finish().
+    """
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.answer = ""
+        self.usage: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.subscribers = 1
+        # Cancelled when every attached request has left (set by the leader)
+        self.token: Optional[CancelToken] = None
+        self._events: List[Any] = []
+        self._queues: List[queue.Queue] = []
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def put(self, event: Any) -> None:
+        """Publish an event ("token", text) / ("tool_start", info) / ... to all subscribers"""
+        if event is None:
+            return
+        with self._lock:
+            self._events.append(event)
+            for q in self._queues:
+                q.put(event)
+
+    def subscribe(self) -> "queue.Queue":
+        """
+        Queue receiving every event of the run: those already published,
+        then live ones, then None when the run is over
+        """
+        q: queue.Queue = queue.Queue()
+        with self._lock:
+            for event in self._events:
+                q.put(event)
+            if self._finished.is_set():
+                q.put(None)
+            else:
+                self._queues.append(q)
+        return q
+
+    def finish(self, answer: str = "", usage: Optional[Dict] = None, error: Optional[str] = None) -> None:
+        """End the run: record its outcome and close every subscription"""
+        with self._lock:
+            self.answer, self.usage, self.error = answer, usage, error
+            self._finished.set()
+            queues, self._queues = self._queues, []
+        for q in queues:
+            q.put(None)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the run is over"""
+        return self._finished.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+
+class AgentFlights:
+    """Agent runs in progress, by question, for history-independent requests"""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Optional[str]) -> Optional[Flight]:
+        """Run in flight for a key, if any"""
+        if key is None:
+            return None
+        with self._lock:
+            return self._flights.get(key)
+
+    def start(self, key: Optional[str], token: Optional[CancelToken] = None) -> Tuple[Flight, bool]:
+        """
+        Attach to the run for key, or register a new one
+
+        Args:
+            key: flight_key() of the question, None for a private run
+                 (history-dependent requests, coalescing disabled)
+            token: Cancellation token of the caller; becomes the run's token
+                   if the caller is the leader
+
+        Returns:
+            (flight, True if the caller must run the agent and finish() it)
+        """
+        if key is None or not settings.COALESCE_AGENT_RUNS:
+            flight = Flight(None)
+            flight.token = token
+            return flight, True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.finished:
+                flight.subscribers += 1
+                COALESCED.inc(kind="agent", role="follower")
+                return flight, False
+            flight = self._flights[key] = Flight(key)
+            flight.token = token
+        COALESCED.inc(kind="agent", role="leader")
+        return flight, True
+
+    def leave(self, flight: Flight) -> None:
+        """
+        Detach a request whose client went away; the run is cancelled when
+        no attached request is left
+        """
+        with self._lock:
+            flight.subscribers -= 1
+            last = flight.subscribers <= 0
+            if last and flight.key is not None and self._flights.get(flight.key) is flight:
+                # Nobody to answer: new requests must not attach to a dying run
+                del self._flights[flight.key]
+        if last and flight.token is not None:
+            flight.token.cancel("disconnect")
+
+    def end(self, flight: Flight, answer: str = "", usage: Optional[Dict] = None,
+            error: Optional[str] = None) -> None:
+        """Finish a run and stop attaching new requests to it"""
+        with self._lock:
+            if flight.key is not None and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        flight.finish(answer, usage, error)
+        if flight.subscribers > 1:
+            logger.info(f"🔗 Agent run shared by {flight.subscribers} requests")
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+def flight_key(question: str) -> str:
+    """Key of an agent run: the normalized question and the model answering it"""
+    return f"{settings.OLLAMA_MODEL}\n{normalize_key(question)}"
+
+
+def history_independent(memory: "SummaryWindowMemory", question: str) -> bool:
+    """
+    Whether an agent run's prompt depends only on the question: no summary,
+    no older messages and no history besides the question itself (the
+    stream endpoint saves the question before fetching history)
+    """
+    if memory.summary or memory.older_messages:
+        return False
+    messages = memory.chat_memory.messages
+    if not messages:
+        return True
+    return len(messages) == 1 and normalize_key(messages[0].content) == normalize_key(question)
+
+
+# Global coalescing layers
+tool_flights = SingleFlight("tool")
+agent_flights = AgentFlights()
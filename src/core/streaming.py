@@ -0,0 +1,108 @@
+"""
+Framed streaming protocol (NDJSON / Server-Sent Events) for chat responses
+"""
+import json
+import time
+from typing import Dict, Optional
+
+
+# Supported stream formats for /chat/stream
+STREAM_FORMATS = ("text", "ndjson", "sse")
+
+MEDIA_TYPES = {
+    "text": "text/plain",
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def resolve_stream_format(requested: Optional[str], accept: Optional[str] = None) -> str:
+    """
+    Pick the stream format from the request body or the Accept header
+
+    Args:
+        requested: Format named in the request body ("text", "ndjson", "sse")
+        accept: Value of the Accept header
+
+    Returns:
+        One of STREAM_FORMATS
+
+    Raises:
+        ValueError: If the requested format is not supported
+    """
+    if requested:
+        fmt = requested.strip().lower()
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(
+                f"Unsupported stream format '{requested}', expected one of {', '.join(STREAM_FORMATS)}"
+            )
+        return fmt
+
+    accept = (accept or "").lower()
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept:
+        return "ndjson"
+    return "text"
+
+
+def encode_event(event: Dict, fmt: str) -> str:
+    """
+    Serialize one event for the wire
+
+    Args:
+        event: Event dictionary with a "type" key
+        fmt: "ndjson" or "sse"
+
+    Returns:
+        Encoded frame
+    """
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+class TokenCoalescer:
+    """
+    Batches streamed tokens so that each frame carries several of them.
+    A batch is flushed once it holds max_bytes of UTF-8 text or once its
+    oldest token has waited max_delay seconds.
+    """
+
+    def __init__(self, max_delay: float = 0.05, max_bytes: int = 256):
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+        self._parts = []
+        self._size = 0
+        self._started_at: Optional[float] = None
+
+    def add(self, token: str) -> Optional[str]:
+        """Add a token, returning a batch if a threshold was reached"""
+        if not token:
+            return None
+        if not self._parts:
+            self._started_at = time.monotonic()
+        self._parts.append(token)
+        self._size += len(token.encode("utf-8"))
+
+        if self._size >= self.max_bytes or self.time_until_flush() == 0:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[str]:
+        """Return the pending batch (if any) and reset"""
+        if not self._parts:
+            return None
+        batch = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        self._started_at = None
+        return batch
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until the pending batch is due, or None when empty"""
+        if self._started_at is None:
+            return None
+        elapsed = time.monotonic() - self._started_at
+        return max(0.0, self.max_delay - elapsed)
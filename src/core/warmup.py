@@ -0,0 +1,265 @@
+"""
+Startup warm-up and readiness
+
+The API accepts connections as soon as it is imported; slow loading runs as
+warm-up steps on a background thread: embedding model, a dummy embedding,
+the knowledge index (FAISS + BM25), and a one-token generation on every Ollama backend so
+the model is resident before the first user arrives.
+/health only reports that the process is alive, /ready reports whether the
+warm-up finished and a model backend is available. Failed steps are retried
+in the background with exponential backoff, so a node that started while
+Ollama was down becomes ready once it is back.
+"""
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Step = Tuple[str, Callable[[], object]]
+
+
+class Warmup:
+    """Runs named warm-up steps, retries the failed ones and records their status and timing"""
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | ready | failed (retrying)
+        self.steps: Dict[str, Dict] = {}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.next_retry_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._retry_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self, steps: List[Step]) -> None:
+        """Run the steps on a daemon thread (no-op if already started)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+        self._thread.start()
+
+    def run(self, steps: List[Step]) -> bool:
+        """
+        Run the steps in order; a failed step does not stop the later
+        ones (they may still warm other components). Failed steps are
+        retried on a daemon thread (WARMUP_RETRY_SECONDS)
+
+        Args:
+            steps: (name, callable) pairs; a step fails by raising and may
+                return a dict of details to report
+
+        Returns:
+            True if every step succeeded
+        """
+        self.status = "running"
+        self.started_at = time.time()
+        for name, _ in steps:
+            self.steps[name] = {"status": "pending"}
+
+        failed = self._run_steps(steps)
+        self.status = "failed" if failed else "ready"
+        self.finished_at = time.time()
+        if failed and settings.WARMUP_RETRY_SECONDS > 0:
+            self._retry_thread = threading.Thread(
+                target=self._retry, args=(failed,), name="warmup-retry", daemon=True
+            )
+            self._retry_thread.start()
+        return not failed
+
+    def _run_steps(self, steps: List[Step]) -> List[Step]:
+        """Run steps in order, returning the failed ones"""
+        failed = []
+        for name, step in steps:
+            attempts = self.steps.get(name, {}).get("attempts", 0) + 1
+            self.steps[name] = {"status": "running", "attempts": attempts}
+            started = time.perf_counter()
+            try:
+                detail = step()
+            except Exception as e:
+                duration = round((time.perf_counter() - started) * 1000, 1)
+                self.steps[name] = {"status": "failed", "attempts": attempts,
+                                    "duration_ms": duration, "error": str(e)}
+                logger.warning(f"⚠️ Warm-up step '{name}' failed after {duration} ms: {e}")
+                failed.append((name, step))
+                continue
+            duration = round((time.perf_counter() - started) * 1000, 1)
+            self.steps[name] = {"status": "done", "attempts": attempts, "duration_ms": duration}
+            if isinstance(detail, dict):
+                self.steps[name]["detail"] = detail
+            logger.info(f"✅ Warm-up step '{name}' done in {duration} ms")
+        return failed
+
+    def _retry(self, failed: List[Step]) -> None:
+        """Retry failed steps with exponential backoff until they all succeed"""
+        delay = settings.WARMUP_RETRY_SECONDS
+        while failed:
+            self.next_retry_at = time.time() + delay
+            logger.info(f"🔁 Retrying warm-up step(s) {', '.join(name for name, _ in failed)} in {delay:.0f}s")
+            if self._stop.wait(delay):
+                return
+            failed = self._run_steps(failed)
+            delay = min(delay * 2, max(settings.WARMUP_RETRY_MAX, settings.WARMUP_RETRY_SECONDS))
+        self.next_retry_at = None
+        self.status = "ready"
+        self.finished_at = time.time()
+        logger.info("✅ Warm-up finished after retries")
+
+    def stop(self) -> None:
+        """Stop retrying failed steps"""
+        self._stop.set()
+
+    def mark_ready(self) -> None:
+        """Nothing to warm up (lazy mode)"""
+        self.status = "ready"
+        self.started_at = self.finished_at = time.time()
+
+    def snapshot(self) -> Dict:
+        """Status, per-step status/duration and total warm-up time"""
+        total = None
+        if self.started_at is not None:
+            total = round(((self.finished_at or time.time()) - self.started_at) * 1000, 1)
+        report = {
+            "status": self.status,
+            "ready": self.ready,
+            "steps": {name: dict(info) for name, info in self.steps.items()},
+            "duration_ms": total,
+        }
+        if self.next_retry_at is not None:
+            report["retry_in_s"] = round(max(0.0, self.next_retry_at - time.time()), 1)
+        return report
+
+
+def warm_ollama(prompt: str = "Hi") -> Dict[str, float]:
+    """
+    Load the model on every Ollama backend with a one-token generation
+
+    Returns:
+        Milliseconds per backend that answered
+
+    Raises:
+        RuntimeError: If no backend answered
+    """
+    from core.backends import backend_pool
+
+    # Same keep_alive and num_ctx as the agent, or its first call would reload the model
+    model_options = settings.ollama_model_options()
+    keep_alive = model_options.pop("keep_alive")
+
+    timings, errors = {}, {}
+    for backend in backend_pool.backends:
+        started = time.perf_counter()
+        try:
+            resp = requests.post(
+                f"{backend.url}/api/generate",
+                json={
+                    "model": settings.OLLAMA_MODEL,
+                    "prompt": prompt,
+                    "stream": False,
+                    "keep_alive": keep_alive,
+                    "options": {"num_predict": 1, **model_options},
+                },
+                timeout=settings.OLLAMA_WARMUP_TIMEOUT,
+            )
+            resp.raise_for_status()
+            timings[backend.url] = round((time.perf_counter() - started) * 1000, 1)
+        except requests.RequestException as e:
+            errors[backend.url] = str(e)
+            logger.warning(f"⚠️ Ollama warm-up failed for {backend.url}: {e}")
+
+    if not timings:
+        raise RuntimeError(f"No Ollama backend answered: {errors}")
+    return timings
+
+
+def warm_index() -> Dict:
+    """
+    Load the newest index generation (FAISS + BM25)
+
+    Returns:
+        Active version and chunk count
+    """
+    from services.index_manager import index_manager
+
+    index = index_manager.ensure_loaded()
+    if index is None:
+        raise RuntimeError("Knowledge index not available")
+    return {"version": index.version, "chunks": index.chunks}
+
+
+def warmup_steps() -> List[Step]:
+    """
+    The warm-up pipeline: embedder, dummy embedding, index, Ollama
+    """
+    from services.rag_service import get_embeddings
+
+    steps: List[Step] = [
+        ("embedder", get_embeddings),
+        ("embedding", lambda: get_embeddings().embed_query("warm-up")),
+        ("index", warm_index),
+    ]
+    if settings.WARMUP_OLLAMA:
+        steps.append(("ollama", warm_ollama))
+    return steps
+
+
+def preload_shared() -> Dict[str, float]:
+    """
+    Load the read-only RAG artifacts in a pre-fork parent process
+
+    Workers forked afterwards share the FAISS vectors, documents, BM25
+    statistics and embedding weights copy-on-write instead of loading their
+    own copies. No inference runs here: thread pools started before a fork
+    are not usable in the children. gc.freeze() keeps the collector from
+    writing to (and so copying) the pages of these long-lived objects.
+
+    Returns:
+        Milliseconds per artifact
+    """
+    import gc
+    from services.rag_service import get_embeddings
+
+    timings = {}
+    for name, loader in (("embedder", get_embeddings), ("index", warm_index)):
+        started = time.perf_counter()
+        try:
+            loader()
+        except Exception as e:
+            logger.warning(f"⚠️ Preload of {name} failed (workers will load it): {e}")
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    gc.collect()
+    gc.freeze()
+    logger.info(f"📦 Preloaded shared RAG artifacts: {timings}")
+    return timings
+
+
+def readiness() -> Tuple[bool, Dict]:
+    """
+    Ready = warm-up finished and at least one Ollama backend can take requests
+
+    Returns:
+        (ready, report)
+    """
+    from core.backends import backend_pool
+
+    report = warmup.snapshot()
+    report["backends_available"] = backend_pool.has_available()
+    report["ready"] = report["ready"] and report["backends_available"]
+    return report["ready"], report
+
+
+# Global warm-up state
+warmup = Warmup()
@@ -0,0 +1,35 @@
+"""
+LangChain window memory with a rolling summary (see core.memory)
+
+Kept apart from core.memory so that importing the API does not import
+langchain.memory; setup_memory() loads this module on first use.
+"""
+from typing import Dict, List, Optional
+
+from langchain.memory import ConversationBufferWindowMemory
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+
+class SummaryWindowMemory(ConversationBufferWindowMemory):
+    """
+    Window memory with a rolling summary of the messages before the window.
+    The summary is exposed as a leading system message, followed by the
+    messages before the window that it does not cover yet.
+    """
+
+    summary: str = ""
+    conv_id: Optional[str] = None
+    # Messages before the window, oldest first (input for the next summary update)
+    older_messages: List[Dict] = []
+    # Tail of older_messages the stored summary does not include yet
+    unsummarized: List[Dict] = []
+
+    @property
+    def buffer_as_messages(self) -> List[BaseMessage]:
+        messages = [
+            HumanMessage(content=m["content"]) if m["role"] == "USER" else AIMessage(content=m["content"])
+            for m in self.unsummarized
+        ] + super().buffer_as_messages
+        if self.summary:
+            return [SystemMessage(content=f"Summary of earlier conversation: {self.summary}")] + messages
+        return messages
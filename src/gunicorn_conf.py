@@ -0,0 +1,33 @@
+"""
+Production server configuration (multiple workers, no reload)
+
+    cd src && gunicorn -c gunicorn_conf.py main:app
+
+The app is imported once in the master (preload_app) and the read-only RAG
+artifacts are loaded there before the workers are forked, so the workers
+share them copy-on-write: memory grows by much less than one index per
+worker. Each worker then runs the rest of the warm-up (dummy embedding,
+Ollama generation) and reports it on /ready.
+"""
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WORKERS", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Streaming answers can take minutes on a busy model
+timeout = int(os.getenv("WORKER_TIMEOUT", "300"))
+graceful_timeout = 30
+keepalive = 5
+
+# Workers read WORKERS to size their share of the admission capacity
+os.environ["WORKERS"] = str(workers)
+
+
+def when_ready(server):
+    """Master, after the app is imported and before any worker is forked"""
+    from config.settings import settings
+    from core.warmup import preload_shared
+
+    if settings.WARMUP_MODE.lower() != "lazy":
+        preload_shared()
@@ -1,11 +1,19 @@
 """
 FastAPI application entry point for Automotive Assistant AI
 """
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from api import router
 from config.settings import settings
+from config.log_config import setup_logging
+from core.warmup import warmup, warmup_steps, readiness
+
+setup_logging()
+logger = logging.getLogger("main")
 
 # Create FastAPI application
 app = FastAPI(
@@ -30,27 +38,39 @@ app.include_router(router, prefix="", tags=["chat"])
 @app.on_event("startup")
 async def startup_event():
     """Run on application startup"""
-    print("=" * 60)
-    print("🚗 Automotive Assistant API Starting...")
-    print("=" * 60)
-    print(f"📁 Base directory: {settings.BASE_DIR}")
-    print(f"📁 Data directory: {settings.DATA_DIR}")
-    print(f"📁 Vectorstore path: {settings.VECTORSTORE_PATH}")
-    print(f"🤖 Model: {settings.OLLAMA_MODEL}")
-    print(f"🔗 Spring API: {settings.SPRING_API_URL}")
-    print("=" * 60)
+    logger.info("🚗 Automotive Assistant API Starting...")
+    logger.info(f"📁 Base directory: {settings.BASE_DIR}")
+    logger.info(f"📁 Data directory: {settings.DATA_DIR}")
+    logger.info(f"📁 Vectorstore path: {settings.VECTORSTORE_PATH}")
+    logger.info(f"🤖 Model: {settings.OLLAMA_MODEL}")
+    logger.info(f"🖥️ Ollama backends: {', '.join(settings.ollama_urls())}")
+    logger.info(f"🔗 Spring API: {settings.SPRING_API_URL}")
+    
+    # Probe Ollama backends in the background (circuit breaking / failover)
+    from core.backends import backend_pool
+    backend_pool.start_health_checks()
+    
+    # Queue and backend gauges for /metrics
+    from core.metrics import register_runtime_gauges
+    register_runtime_gauges()
     
-    # Pre-load vectorstore for faster first query
-    try:
-        from services.rag_service import load_vectorstore, load_bm25
-        load_vectorstore()
-        load_bm25()
-        print("✅ RAG system initialized")
-    except Exception as e:
-        print(f"⚠️ RAG system initialization warning: {e}")
+    # Swap in new knowledge index generations as they are published
+    if settings.INDEX_WATCH_INTERVAL > 0:
+        from services.index_manager import index_manager
+        index_manager.start_watching(settings.INDEX_WATCH_INTERVAL)
     
-    print("✅ Application ready!")
-    print("=" * 60)
+    # Load index, embedder and model before the first user needs them (readiness: /ready)
+    mode = settings.WARMUP_MODE.lower()
+    if mode == "blocking":
+        if warmup.run(warmup_steps()):
+            logger.info("✅ Warm-up finished")
+    elif mode == "lazy":
+        warmup.mark_ready()
+    else:
+        warmup.start(warmup_steps())
+        logger.info("⏳ Warm-up running in the background")
+    
+    logger.info("✅ Application accepting requests")
 
 
 @app.get("/")
@@ -61,17 +81,32 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "chat": "/chat (POST)",
-            "stream_chat": "/chat/stream (POST)"
+            "stream_chat": "/chat/stream (POST)",
+            "admission": "/admission (GET)",
+            "backends": "/backends (GET)",
+            "metrics": "/metrics (GET)",
+            "health": "/health (GET)",
+            "ready": "/ready (GET)"
         }
     }
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
+    """Liveness: the process is up and serving requests"""
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: warm-up finished and a model backend is available
+    (503 while loading, after a failed step or with every backend down)
+    """
+    ready, report = readiness()
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+
 if __name__ == "__main__":
     import uvicorn
     
@@ -1,25 +1,29 @@
 """
 Services module exports
 """
-from .rag_service import search_pdf_knowledge, load_vectorstore, load_bm25
+from .rag_service import search_pdf_knowledge
+from .index_manager import index_manager
 from .search_service import youtube_search, google_search
 from .api_service import (
     fetch_conversation_history,
     save_message,
     save_exchange,
+    fetch_conversation_summary,
+    save_conversation_summary,
     api_headers
 )
 from .car_deal_service import car_search
 
 __all__ = [
     "search_pdf_knowledge",
-    "load_vectorstore",
-    "load_bm25",
+    "index_manager",
     "youtube_search",
     "google_search",
     "fetch_conversation_history",
     "save_message",
     "save_exchange",
+    "fetch_conversation_summary",
+    "save_conversation_summary",
     "api_headers",
     "car_search",
 ]
\ No newline at end of file
@@ -1,7 +1,10 @@
-
+import logging
 import requests
 from typing import List, Dict, Optional
 from config.settings import settings
+from core.deadline import io_timeout
+
+logger = logging.getLogger(__name__)
 
 
 def api_headers(access_token: str) -> Dict[str, str]:
@@ -34,16 +37,16 @@ def fetch_conversation_history(conv_id: str, access_token: str) -> List[Dict]:
     url = f"{settings.SPRING_API_URL}/api/conversations/{conv_id}/messages"
     
     try:
-        resp = requests.get(url, headers=api_headers(access_token), timeout=5)
+        resp = requests.get(url, headers=api_headers(access_token), timeout=io_timeout(settings.SPRING_TIMEOUT))
         
         if resp.status_code != 200:
-            print(f"⚠️ Failed to fetch history: {resp.status_code}")
+            logger.warning(f"⚠️ Failed to fetch history: {resp.status_code}")
             return []
         
         return resp.json()
     
     except requests.RequestException as e:
-        print(f"⚠️ Error fetching conversation history: {e}")
+        logger.warning(f"⚠️ Error fetching conversation history: {e}")
         return []
 
 
@@ -67,17 +70,82 @@ def save_message(conv_id: str, role: str, content: str, access_token: str) -> bo
             url,
             json={"role": role, "content": content},
             headers=api_headers(access_token),
-            timeout=5
+            timeout=io_timeout(settings.SPRING_TIMEOUT)
+        )
+        
+        if resp.status_code >= 400:
+            logger.warning(f"⚠️ Failed to save message: {resp.status_code} - {resp.text}")
+            return False
+        
+        return True
+    
+    except requests.RequestException as e:
+        logger.error(f"❌ Error saving message: {e}")
+        return False
+
+
+def fetch_conversation_summary(conv_id: str, access_token: str) -> Optional[Dict]:
+    """
+    Fetch the stored rolling summary of a conversation from Spring Boot API
+    
+    Args:
+        conv_id: Conversation ID
+        access_token: Authorization token
+        
+    Returns:
+        {"summary", "covered"} or None if there is none
+    """
+    url = f"{settings.SPRING_API_URL}/api/conversations/{conv_id}/summary"
+    
+    try:
+        resp = requests.get(url, headers=api_headers(access_token), timeout=io_timeout(settings.SPRING_TIMEOUT))
+        
+        if resp.status_code != 200:
+            if resp.status_code != 404:
+                logger.warning(f"⚠️ Failed to fetch summary: {resp.status_code}")
+            return None
+        
+        record = resp.json()
+        if not isinstance(record, dict) or not isinstance(record.get("summary"), str):
+            return None
+        return {"summary": record["summary"], "covered": int(record.get("covered") or 0)}
+    
+    except (requests.RequestException, ValueError) as e:
+        logger.warning(f"⚠️ Error fetching conversation summary: {e}")
+        return None
+
+
+def save_conversation_summary(conv_id: str, summary: str, covered: int, access_token: str) -> bool:
+    """
+    Store the rolling summary of a conversation in Spring Boot API
+    
+    Args:
+        conv_id: Conversation ID
+        summary: Summary text
+        covered: Number of leading messages the summary includes
+        access_token: Authorization token
+        
+    Returns:
+        True if successful, False otherwise
+    """
+    url = f"{settings.SPRING_API_URL}/api/conversations/{conv_id}/summary"
+    
+    try:
+        resp = requests.put(
+            url,
+            json={"summary": summary, "covered": covered},
+            headers=api_headers(access_token),
+            timeout=io_timeout(settings.SPRING_TIMEOUT)
         )
         
         if resp.status_code >= 400:
-            print(f"⚠️ Failed to save message: {resp.status_code} - {resp.text}")
+            logger.warning(f"⚠️ Failed to save summary: {resp.status_code} - {resp.text}")
             return False
         
         return True
     
     except requests.RequestException as e:
-        print(f"❌ Error saving message: {e}")
+        logger.warning(f"⚠️ Error saving conversation summary: {e}")
         return False
 
 
@@ -0,0 +1,235 @@
+"""
+Car listing search for the agent's car_search tool
+
+Answers from the local listing store (services/listing_store.py), which the
+scraper runs keep up to date: the question is parsed into make, model, year,
+price, mileage and fuel constraints and run as one indexed query, so no
+browser is started while the user waits.
+
+Every matching listing is then scored on numpy columns (price against the
+budget, year, mileage, fuel) and only the best few are loaded and returned,
+already ranked, so the model does not have to compare raw listings itself.
+"""
+import json
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from config.settings import settings
+from services.listing_store import listing_store, parse_amount, parse_fuel
+from utils.vehicles import detect_makes, detect_models, detect_years
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Share of the score per criterion (each scored 0..1, unknown values 0)
+WEIGHTS = {"price": 0.4, "year": 0.3, "mileage": 0.3}
+# Listings of another fuel than asked keep this share of their score
+FUEL_MISMATCH = 0.5
+# Columns read for every match; full rows are only loaded for the best ones
+SCORE_COLUMNS = ("id", "price_eur", "year", "mileage_km", "fuel")
+
+_NUMBER = r"(\d{1,3}(?:[.,\s]\d{3})+(?!\d)|\d+)"
+_AMOUNT = r"(?:€|eur|euros?)?\s*" + _NUMBER + r"\s*(k|thousand)?\s*(?:€|eur|euros?)?"
+_PRICE_MAX_RE = re.compile(r"\b(?:under|below|less than|max(?:imum)?|up to|cheaper than|budget(?: of)?)\s*" + _AMOUNT, re.IGNORECASE)
+_PRICE_MIN_RE = re.compile(r"\b(?:over|above|more than|at least|min(?:imum)?)\s*" + _AMOUNT + r"(?!\s*km)", re.IGNORECASE)
+_PRICE_RANGE_RE = re.compile(r"\bbetween\s*" + _AMOUNT + r"\s*and\s*" + _AMOUNT, re.IGNORECASE)
+_MILEAGE_RE = re.compile(r"\b(?:under|below|less than|max(?:imum)?|up to)\s*" + _NUMBER + r"\s*(k|thousand)?\s*(?:km|kilometers|kilometres|miles)\b", re.IGNORECASE)
+_YEAR_FROM_RE = re.compile(r"\b(?:from|after|since|newer than|or newer)\s*((?:19|20)\d\d)\b|\b((?:19|20)\d\d)\s*(?:or newer|and newer|\+)", re.IGNORECASE)
+
+
+@dataclass
+class CarQuery:
+    """Constraints of a listing search (None = any)"""
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+    price_min: Optional[int] = None
+    price_max: Optional[int] = None
+    mileage_max: Optional[int] = None
+    fuel: Optional[str] = None
+
+
+def _amount(number: str, thousands: Optional[str]) -> int:
+    value = parse_amount(number)
+    return value * 1000 if thousands else value
+
+
+def parse_car_query(query: str) -> CarQuery:
+    """
+    Search constraints from a natural-language request
+
+    "2020 BMW X5 under €50,000" -> make=bmw, model=x5, year 2020, price <= 50000
+    """
+    parsed = CarQuery()
+    makes = detect_makes(query)
+    if makes:
+        parsed.make = makes[0]
+    models = detect_models(query)
+    if models:
+        parsed.model = models[0]
+    elif parsed.make:
+        # Models the scrapers have seen for this make ("X5", "A4", "C-Class")
+        for model in listing_store.models(parsed.make):
+            if re.search(rf"(?<![\w-]){re.escape(model)}(?![\w-])", query, re.IGNORECASE):
+                parsed.model = model
+                break
+
+    # Mileage first, so "under 100,000 km" is not read as a price
+    mileage = _MILEAGE_RE.search(query)
+    if mileage:
+        parsed.mileage_max = _amount(mileage.group(1), mileage.group(2))
+        if re.search(r"miles", mileage.group(0), re.IGNORECASE):
+            parsed.mileage_max = int(parsed.mileage_max * 1.609)
+        query = query.replace(mileage.group(0), " ")
+
+    price_range = _PRICE_RANGE_RE.search(query)
+    if price_range:
+        parsed.price_min = _amount(price_range.group(1), price_range.group(2))
+        parsed.price_max = _amount(price_range.group(3), price_range.group(4))
+        query = query.replace(price_range.group(0), " ")
+    else:
+        for pattern, field in ((_PRICE_MAX_RE, "price_max"), (_PRICE_MIN_RE, "price_min")):
+            match = pattern.search(query)
+            # A bare year ("newer than 2018") is not a price
+            if match and not (match.group(2) is None and re.fullmatch(r"(19|20)\d\d", match.group(1).strip())):
+                setattr(parsed, field, _amount(match.group(1), match.group(2)))
+                query = query.replace(match.group(0), " ")
+
+    year_from = _YEAR_FROM_RE.search(query)
+    if year_from:
+        parsed.year_min = int(year_from.group(1) or year_from.group(2))
+    else:
+        years = detect_years(query)
+        if years:
+            parsed.year_min, parsed.year_max = years
+
+    parsed.fuel = parse_fuel(query)
+    return parsed
+
+
+def _scaled(values: "np.ndarray", low: float, high: float) -> "np.ndarray":
+    """values mapped to 0..1 over low..high (clipped; NaN -> 0)"""
+    import numpy as np
+
+    if not high > low:
+        return np.where(np.isnan(values), 0.0, 1.0)
+    return np.nan_to_num(np.clip((values - low) / (high - low), 0.0, 1.0), nan=0.0)
+
+
+def score_listings(rows: List[Dict], parsed: CarQuery) -> "np.ndarray":
+    """
+    Match score (0..1) of every listing, computed over whole columns
+
+    - price: share of the budget (price_max, else the dearest listing) left over
+    - year: position in the requested year range (else the listings' range), newer is better
+    - mileage: share of mileage_max (else the highest mileage) not yet driven
+    - fuel: listings of another fuel than requested keep FUEL_MISMATCH of their score
+    """
+    import numpy as np
+
+    if not rows:
+        return np.empty(0)
+    price = np.array([row["price_eur"] for row in rows], dtype=np.float64)
+    year = np.array([row["year"] for row in rows], dtype=np.float64)
+    mileage = np.array([row["mileage_km"] for row in rows], dtype=np.float64)
+
+    def bound(value: Optional[int], values: "np.ndarray", reduce) -> float:
+        if value is not None:
+            return float(value)
+        return float(reduce(values)) if not np.isnan(values).all() else 0.0
+
+    budget = bound(parsed.price_max, price, np.nanmax)
+    price_score = 1.0 - _scaled(price, bound(parsed.price_min, price, lambda v: 0.0), budget)
+    price_score[np.isnan(price)] = 0.0
+    year_score = _scaled(year, bound(parsed.year_min, year, np.nanmin), bound(parsed.year_max, year, np.nanmax))
+    mileage_score = 1.0 - _scaled(mileage, 0.0, bound(parsed.mileage_max, mileage, np.nanmax))
+    mileage_score[np.isnan(mileage)] = 0.0
+
+    score = (WEIGHTS["price"] * price_score
+             + WEIGHTS["year"] * year_score
+             + WEIGHTS["mileage"] * mileage_score)
+    if parsed.fuel:
+        fuel = np.array([row["fuel"] for row in rows], dtype=object)
+        score = np.where(fuel == parsed.fuel, score, score * FUEL_MISMATCH)
+    return score
+
+
+def rank_listings(rows: List[Dict], parsed: CarQuery, k: int) -> List[Dict]:
+    """The k best-scoring listings, best first, each with its score"""
+    import numpy as np
+
+    scores = score_listings(rows, parsed)
+    # Stable sort: equal scores keep the store's cheapest-first order
+    order = np.argsort(-scores, kind="stable")[:k]
+    return [{**rows[i], "score": round(float(scores[i]), 3)} for i in order]
+
+
+def _freshness(scraped_at: float) -> str:
+    age = max(0, time.time() - scraped_at)
+    if age < 3600:
+        return f"{int(age // 60)} min ago"
+    if age < 86400:
+        return f"{int(age // 3600)} h ago"
+    return f"{int(age // 86400)} days ago"
+
+
+def _listing(row: Dict) -> Dict:
+    return {
+        "title": row["title"],
+        "price": f"€{row['price_eur']:,}".replace(",", ".") if row["price_eur"] is not None else None,
+        "year": row["year"],
+        "mileage": f"{row['mileage_km']:,} km".replace(",", ".") if row["mileage_km"] is not None else None,
+        "fuel": row["fuel"],
+        "transmission": row["transmission"],
+        "link": row["url"],
+        "scraped_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(row["scraped_at"])),
+        "freshness": _freshness(row["scraped_at"]),
+        "score": row.get("score"),
+    }
+
+
+def car_search(query: str) -> str:
+    """
+    Search the local listing store for cars matching a natural-language request
+
+    Args:
+        query: e.g. "2020 BMW X5 under €50,000"
+
+    Returns:
+        JSON with the parsed constraints, the number of matching listings and
+        the CAR_SEARCH_LIMIT best of them (best first), each with when it was
+        scraped
+    """
+    try:
+        start = time.perf_counter()
+        parsed = parse_car_query(query)
+        max_age = settings.LISTINGS_MAX_AGE_HOURS * 3600 if settings.LISTINGS_MAX_AGE_HOURS > 0 else None
+        # Score every match (not a cheapest-first prefix), then load the winners
+        candidates = listing_store.search(**asdict(parsed), max_age_seconds=max_age,
+                                          limit=None, columns=SCORE_COLUMNS)
+        best = rank_listings(candidates, parsed, settings.CAR_SEARCH_LIMIT)
+        scores = {row["id"]: row["score"] for row in best}
+        best = [{**row, "score": scores[row["id"]]} for row in listing_store.get(scores)]
+        logger.debug(f"🚗 car_search {asdict(parsed)}: {len(candidates)} listings, ranked "
+                     f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        if not candidates:
+            if not listing_store.stats()["listings"]:
+                return "No car listings available yet: the listing store is empty (run a scraper import first)."
+            return f"No car listings found matching '{query}'. Try a higher budget, a wider year range or another model."
+
+        return json.dumps({
+            "filters": {k: v for k, v in asdict(parsed).items() if v is not None},
+            "matches": len(candidates),
+            "ranked": [_listing(row) for row in best],
+        }, ensure_ascii=False, indent=2)
+
+    except Exception as e:
+        logger.error(f"❌ Car search error: {e}")
+        return f"Error searching car listings: {str(e)}"
@@ -0,0 +1,426 @@
+"""
+Versioned knowledge index with hot reload
+
+An index generation is a directory holding a saved FAISS store
+(index.faiss + index.pkl). Generations live in subdirectories of
+VECTORSTORE_PATH and the newest name wins, e.g.
+
+    data/vector_store_faiss/20261019-0100/index.faiss
+
+A store saved directly in VECTORSTORE_PATH is the "base" generation, older
+than any subdirectory. Publish a new generation by saving it under
+a hidden name (".20261019-0100") and renaming it: the rename is atomic, so the
+watcher never sees a half-written index.
+
+A generation is either one flat store or, when built with sharding
+(services/ingest_service.py), a shards.json manifest and one store per shard
+(brand or document type) in its own subdirectory. Shards are loaded
+independently and queries are routed to the shards of the makes they name.
+
+A new generation is loaded next to the active one (FAISS + BM25) and swapped
+in atomically. Queries hold a reference to the version they started on, so
+in-flight queries finish on the old index; the old version is dropped when
+its last query releases it.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config.settings import settings
+from services.metadata_index import MetadataIndex
+
+if TYPE_CHECKING:
+    from langchain.retrievers import BM25Retriever
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+BASE_VERSION = "base"
+# Shard of an unsharded generation (one FAISS store for every document)
+DEFAULT_SHARD = "all"
+SHARDS_MANIFEST = "shards.json"
+
+
+class IndexNotFound(Exception):
+    """Raised when no complete index generation exists"""
+
+
+@dataclass
+class Shard:
+    """
+    One independently built sub-index (FAISS + BM25) of a generation,
+    loaded on first use
+    """
+    name: str
+    path: Path
+    makes: List[str] = field(default_factory=list)  # routing keys; empty = general
+    vector_store: Optional["FAISS"] = None
+    bm25_retriever: Optional["BM25Retriever"] = None
+    metadata: Optional[MetadataIndex] = None
+    load_ms: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.vector_store is not None
+
+    @property
+    def chunks(self) -> int:
+        return self.vector_store.index.ntotal if self.loaded else 0
+
+    def load(self) -> "Shard":
+        started = time.perf_counter()
+        self.vector_store = load_faiss(self.path)
+        self.bm25_retriever = build_bm25(self.vector_store)
+        self.metadata = build_metadata_index(self.vector_store)
+        self.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        return self
+
+    def unload(self) -> None:
+        self.vector_store = None
+        self.bm25_retriever = None
+        self.metadata = None
+
+    def describe(self) -> Dict:
+        return {"makes": self.makes, "loaded": self.loaded, "chunks": self.chunks, "load_ms": self.load_ms}
+
+
+@dataclass
+class IndexVersion:
+    """One generation of the knowledge index: its shards and their usage"""
+    version: str
+    path: Path
+    shards: Dict[str, Shard]
+    loaded_at: float = field(default_factory=time.time)
+    load_ms: Optional[float] = None
+    in_flight: int = 0
+    retired: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def flat(cls, version: str, path: Path,
+             vector_store: Optional["FAISS"] = None,
+             bm25_retriever: Optional["BM25Retriever"] = None) -> "IndexVersion":
+        """An unsharded generation (optionally already loaded)"""
+        shard = Shard(DEFAULT_SHARD, path, vector_store=vector_store, bm25_retriever=bm25_retriever,
+                      metadata=build_metadata_index(vector_store) if vector_store else None)
+        return cls(version=version, path=path, shards={DEFAULT_SHARD: shard})
+
+    @property
+    def chunks(self) -> int:
+        return sum(shard.chunks for shard in self.shards.values())
+
+    def shard(self, name: str) -> Shard:
+        """
+        A shard, loaded from disk if needed
+
+        Raises:
+            RuntimeError: If the shard is needed after its retired version was released
+        """
+        shard = self.shards[name]
+        if not shard.loaded:
+            with self._lock:
+                if not shard.loaded:
+                    # Nothing would free it again: a retired version is dropped once, when it drains
+                    if self.retired and not self.in_flight:
+                        raise RuntimeError(f"Index version '{self.version}' was released")
+                    shard.load()
+                    logger.info(f"✅ Shard '{name}' of index '{self.version}' loaded "
+                                f"({shard.chunks} chunks, {shard.load_ms} ms)")
+        return shard
+
+    def load_all(self) -> None:
+        for name in self.shards:
+            self.shard(name)
+
+    def route(self, makes: Sequence[str]) -> List[str]:
+        """
+        Shards to search for the makes named in a query: their brand
+        shards plus the general ones, or every shard when no make has
+        a shard of its own (scatter-gather)
+        """
+        targeted = [name for name, shard in self.shards.items() if set(shard.makes) & set(makes)]
+        if not targeted:
+            return list(self.shards)
+        return targeted + [name for name, shard in self.shards.items() if not shard.makes]
+
+    def unload(self) -> None:
+        for shard in self.shards.values():
+            shard.unload()
+
+    def describe(self) -> Dict:
+        return {
+            "version": self.version,
+            "path": str(self.path),
+            "chunks": self.chunks,
+            "loaded_at": self.loaded_at,
+            "load_ms": self.load_ms,
+            "in_flight": self.in_flight,
+            "shards": {name: shard.describe() for name, shard in self.shards.items()},
+        }
+
+
+def is_complete(path: Path) -> bool:
+    """A saved FAISS store (index + docstore files) or a sharded generation (manifest)"""
+    return ((path / "index.faiss").is_file() and (path / "index.pkl").is_file()) \
+        or (path / SHARDS_MANIFEST).is_file()
+
+
+def read_shards(path: Path) -> Dict[str, Shard]:
+    """Shards of a generation directory: those of its manifest, or one flat shard"""
+    manifest = path / SHARDS_MANIFEST
+    if not manifest.is_file():
+        return {DEFAULT_SHARD: Shard(DEFAULT_SHARD, path)}
+    entries = json.loads(manifest.read_text())["shards"]
+    return {
+        name: Shard(name, path / name, makes=list(entry.get("makes", [])))
+        for name, entry in entries.items()
+    }
+
+
+def build_metadata_index(vector_store: "FAISS") -> MetadataIndex:
+    """Metadata bitmaps of a FAISS store's chunks, by FAISS id"""
+    return MetadataIndex((doc.metadata, doc.page_content) for doc in ordered_docs(vector_store))
+
+
+def load_faiss(path: Path) -> "FAISS":
+    """
+    Load a saved FAISS store with the shared embedding model; chunks saved
+    without display views (older generations) get them here
+    """
+    from langchain_community.vectorstores import FAISS
+    from services.rag_service import get_embeddings
+    from services.snippets import add_views
+
+    vector_store = FAISS.load_local(str(path), get_embeddings(), allow_dangerous_deserialization=True)
+    for doc in ordered_docs(vector_store):
+        add_views(doc)
+    return vector_store
+
+
+def ordered_docs(vector_store: "FAISS") -> List["Document"]:
+    """Documents of a FAISS store by FAISS id (the chunk positions)"""
+    ids = vector_store.index_to_docstore_id
+    return [vector_store.docstore.search(ids[i]) for i in range(vector_store.index.ntotal)]
+
+
+def build_bm25(vector_store: "FAISS") -> "BM25Retriever":
+    """Build the BM25 retriever over the documents of a FAISS store, in FAISS id order"""
+    from langchain.retrievers import BM25Retriever
+    from services.rag_service import CANDIDATES_K
+
+    docs = ordered_docs(vector_store)
+    retriever = BM25Retriever.from_documents(docs)
+    retriever.k = CANDIDATES_K
+    return retriever
+
+
+class IndexManager:
+    """Holds the active index version and swaps in new generations"""
+
+    def __init__(self, root: Optional[Path] = None):
+        self._root = root
+        self.active: Optional[IndexVersion] = None
+        self.retired: List[IndexVersion] = []
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()          # active / refcounts
+        self._reload_lock = threading.RLock()  # one load at a time
+        self._watch_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def root(self) -> Path:
+        return Path(self._root or settings.VECTORSTORE_PATH)
+
+    def generations(self) -> List[Tuple[str, Path]]:
+        """Complete generations on disk, oldest first"""
+        root = self.root
+        if not root.is_dir():
+            return []
+        found = [(BASE_VERSION, root)] if is_complete(root) else []
+        found += [
+            (p.name, p) for p in sorted(root.iterdir())
+            if p.is_dir() and not p.name.startswith(".") and is_complete(p)
+        ]
+        return found
+
+    def latest_generation(self) -> Optional[Tuple[str, Path]]:
+        generations = self.generations()
+        return generations[-1] if generations else None
+
+    def load(self, version: str, path: Path) -> IndexVersion:
+        """
+        Load a generation without activating it: every shard, or none
+        with INDEX_LAZY_SHARDS (each shard then loads on its first query)
+        """
+        logger.info(f"📂 Loading index version '{version}' from: {path}")
+        started = time.perf_counter()
+        index = IndexVersion(version=version, path=path, shards=read_shards(path))
+        if not settings.INDEX_LAZY_SHARDS:
+            index.load_all()
+        index.load_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(
+            f"✅ Index version '{version}' loaded ({len(index.shards)} shards, "
+            f"{index.chunks} chunks, {index.load_ms} ms)"
+        )
+        return index
+
+    def swap(self, index: IndexVersion) -> Optional[IndexVersion]:
+        """
+        Make a loaded version active; the previous one is retired and
+        dropped once its in-flight queries finish
+
+        Returns:
+            The previously active version
+        """
+        with self._lock:
+            old, self.active = self.active, index
+            self.swaps += 1
+            if old is not None:
+                old.retired = True
+                if old.in_flight:
+                    self.retired.append(old)
+        if old is not None:
+            logger.info(
+                f"🔀 Index version '{old.version}' -> '{index.version}' "
+                f"({old.in_flight} queries still on the old version)"
+            )
+            if not old.in_flight:
+                self._drop(old)
+        return old
+
+    def reload(self, version: Optional[str] = None, force: bool = False) -> Dict:
+        """
+        Load a generation and swap it in; on failure the active version stays
+
+        Args:
+            version: Generation to load (default: the newest on disk)
+            force: Reload even if the generation is already active
+
+        Returns:
+            Status after the reload, with "changed"
+
+        Raises:
+            IndexNotFound: If the generation does not exist
+        """
+        with self._reload_lock:
+            generations = dict(self.generations())
+            if version is None:
+                latest = self.latest_generation()
+                if latest is None:
+                    raise IndexNotFound(f"No saved FAISS index under {self.root}")
+                version = latest[0]
+            if version not in generations:
+                raise IndexNotFound(f"Index version '{version}' not found under {self.root}")
+
+            active = self.active
+            if active is not None and active.version == version and not force:
+                return {**self.status(), "changed": False}
+
+            try:
+                index = self.load(version, generations[version])
+            except Exception as e:
+                self.last_error = f"{version}: {e}"
+                logger.error(f"❌ Loading index version '{version}' failed: {e}")
+                raise
+            self.last_error = None
+            self.swap(index)
+            return {**self.status(), "changed": True}
+
+    def ensure_loaded(self) -> Optional[IndexVersion]:
+        """The active version, loading the newest generation on first use"""
+        if self.active is None:
+            with self._reload_lock:
+                if self.active is None:
+                    try:
+                        self.reload()
+                    except IndexNotFound as e:
+                        logger.error(f"❌ {e}")
+        return self.active
+
+    @contextmanager
+    def acquire(self) -> Iterator[Optional[IndexVersion]]:
+        """Pin the active version for the duration of a query"""
+        with self._lock:
+            index = self.active
+            if index is not None:
+                index.in_flight += 1
+        try:
+            yield index
+        finally:
+            if index is not None:
+                self.release(index)
+
+    def pin(self, index: IndexVersion) -> None:
+        """Pin a version already pinned by the caller (work outliving acquire), until release"""
+        with self._lock:
+            index.in_flight += 1
+
+    def release(self, index: IndexVersion) -> None:
+        """Unpin a version; a retired version is dropped when its last pin goes"""
+        with self._lock:
+            index.in_flight -= 1
+            drained = index.retired and index.in_flight == 0 and index in self.retired
+            if drained:
+                self.retired.remove(index)
+        if drained:
+            self._drop(index)
+
+    def _drop(self, index: IndexVersion) -> None:
+        """Release the memory of a retired version"""
+        index.unload()
+        logger.info(f"🗑️ Index version '{index.version}' released")
+
+    def clear(self) -> None:
+        """Forget the active version (the next query loads from disk)"""
+        with self._lock:
+            self.active = None
+
+    def start_watching(self, interval: float) -> None:
+        """Poll for newer generations every interval seconds and swap them in"""
+        if self._watch_thread is not None or interval <= 0:
+            return
+        self._watch_thread = threading.Thread(
+            target=self._watch_loop, args=(interval,), name="index-watch", daemon=True
+        )
+        self._watch_thread.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+    def _watch_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            latest = self.latest_generation()
+            active = self.active
+            if latest is None or (active is not None and active.version == latest[0]):
+                continue
+            if self.last_error and self.last_error.startswith(f"{latest[0]}:"):
+                continue  # generations are immutable: don't retry a broken one
+            try:
+                self.reload(latest[0])
+            except Exception:
+                # Logged by reload; retried at the next poll
+                pass
+
+    def status(self) -> Dict:
+        """Active and draining versions and the generations on disk"""
+        with self._lock:
+            active = self.active.describe() if self.active else None
+            retired = [index.describe() for index in self.retired]
+        return {
+            "active": active,
+            "draining": retired,
+            "available": [name for name, _ in self.generations()],
+            "swaps": self.swaps,
+            "last_error": self.last_error,
+        }
+
+
+# Global index manager
+index_manager = IndexManager()
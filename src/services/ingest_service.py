@@ -0,0 +1,209 @@
+"""
+Build the knowledge index from the PDFs in DATA_DIR
+
+    cd src
+    python -m services.ingest_service                  # one flat index
+    python -m services.ingest_service --shard-by make  # one shard per make
+
+Each run writes a new generation directory under VECTORSTORE_PATH (see
+services/index_manager.py): it is built under a hidden name and renamed when
+complete, so a running service can swap it in (INDEX_WATCH_INTERVAL or
+POST /admin/index/reload).
+
+With --shard-by make, PDFs in a subdirectory of DATA_DIR go to the shard of
+that name (data/PDF/toyota/*.pdf -> "toyota", data/PDF/bulletins/*.pdf ->
+"bulletins"); other PDFs go to the shard of the make in their file name, or
+to "general". Shards without a make are searched for every query.
+
+Every chunk gets the metadata retrieval can filter on: make, model,
+year_min / year_max and doc_type of its document, and the section (topic)
+of its own text. Near-duplicate chunks of a shard (repeated warnings and
+procedures) are then compacted into one chunk that cites all their pages
+(services/near_duplicates.py; --dedup-threshold 0 keeps them all). Last,
+each chunk gets the header and key-sentence summary the agent reads
+(services/snippets.py).
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from services.index_manager import DEFAULT_SHARD, SHARDS_MANIFEST
+from services.metadata_index import document_metadata
+from services.near_duplicates import THRESHOLD as DEDUP_THRESHOLD, compact_chunks
+from services.snippets import add_views
+from utils.vehicles import classify_section, detect_makes, slug
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+GENERAL_SHARD = "general"
+
+
+def discover_pdfs(data_dir: Path) -> List[Path]:
+    """PDF files under data_dir (recursively), in a stable order"""
+    return sorted(p for p in Path(data_dir).rglob("*") if p.suffix.lower() == ".pdf")
+
+
+def shard_of(pdf: Path, data_dir: Path) -> Tuple[str, List[str]]:
+    """
+    Shard a PDF belongs to and the makes that route queries to it
+
+    Returns:
+        (shard name, makes)
+    """
+    parts = pdf.relative_to(data_dir).parts
+    if len(parts) > 1:
+        return slug(parts[0]), detect_makes(parts[0])
+    makes = detect_makes(pdf.stem)
+    if makes:
+        return slug(makes[0]), makes[:1]
+    return GENERAL_SHARD, []
+
+
+def load_chunks(pdf: Path) -> List["Document"]:
+    """Pages of a PDF split into overlapping chunks"""
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    pages = PyPDFLoader(str(pdf)).load()
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    return splitter.split_documents(pages)
+
+
+def build_store(chunks: List["Document"]) -> "FAISS":
+    """Embed chunks into a new FAISS store"""
+    from langchain_community.vectorstores import FAISS
+    from services.rag_service import get_embeddings
+
+    return FAISS.from_documents(chunks, get_embeddings())
+
+
+def build_generation(data_dir: Path,
+                     root: Path,
+                     version: Optional[str] = None,
+                     shard_by: str = "none",
+                     dedup_threshold: float = DEDUP_THRESHOLD) -> Path:
+    """
+    Chunk, embed and save every PDF of data_dir as a new index generation
+
+    Args:
+        data_dir: Directory of PDF files
+        root: Directory holding the generations (VECTORSTORE_PATH)
+        version: Generation name (default: current timestamp)
+        shard_by: "none" (one store) or "make" (one store per shard)
+        dedup_threshold: Jaccard similarity from which chunks are compacted (0: keep duplicates)
+
+    Returns:
+        Path of the published generation
+
+    Raises:
+        FileNotFoundError: If there are no PDFs to index
+        FileExistsError: If the generation already exists
+    """
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    target = Path(root) / version
+    staging = Path(root) / f".{version}"
+    if target.exists():
+        raise FileExistsError(f"Index generation already exists: {target}")
+
+    pdfs = discover_pdfs(data_dir)
+    if not pdfs:
+        raise FileNotFoundError(f"No PDF files found in {data_dir}")
+
+    chunks_by_shard: Dict[str, List["Document"]] = defaultdict(list)
+    makes_by_shard: Dict[str, List[str]] = {}
+    sources_by_shard: Dict[str, List[str]] = defaultdict(list)
+    for pdf in pdfs:
+        shard, makes = shard_of(pdf, data_dir) if shard_by == "make" else (DEFAULT_SHARD, [])
+        try:
+            chunks = load_chunks(pdf)
+        except Exception as e:
+            logger.warning(f"⚠️ Error loading {pdf.name}: {e}")
+            continue
+        if not chunks:
+            logger.warning(f"⚠️ No text extracted from {pdf.name} (scanned PDF?)")
+            continue
+        # Filterable metadata (services/metadata_index.py): document-level
+        # fields from the file name and first page, a section per chunk
+        fields = document_metadata(pdf.stem, chunks[0].page_content)
+        if fields["make"] is None and makes:
+            fields["make"] = makes[0]
+        for chunk in chunks:
+            chunk.metadata.update(fields, shard=shard, section=classify_section(chunk.page_content))
+        chunks_by_shard[shard].extend(chunks)
+        makes_by_shard[shard] = makes
+        sources_by_shard[shard].append(pdf.name)
+        logger.info(f"📄 {pdf.name}: {len(chunks)} chunks -> shard '{shard}'")
+
+    if not chunks_by_shard:
+        raise FileNotFoundError(f"No PDF in {data_dir} could be loaded")
+
+    merged_by_shard: Dict[str, int] = {}
+    if dedup_threshold > 0:
+        for shard, chunks in chunks_by_shard.items():
+            started = time.perf_counter()
+            chunks_by_shard[shard], stats = compact_chunks(chunks, dedup_threshold)
+            merged_by_shard[shard] = stats["merged"]
+            logger.info(
+                f"🧹 Shard '{shard}': {stats['merged']} near-duplicate chunks merged into "
+                f"{stats['clusters']} ({stats['chunks']} -> {stats['kept']}) "
+                f"in {time.perf_counter() - started:.2f}s"
+            )
+
+    # Display views last: the header cites every page of a compacted chunk
+    for chunks in chunks_by_shard.values():
+        for chunk in chunks:
+            add_views(chunk)
+
+    staging.mkdir(parents=True, exist_ok=True)
+    if shard_by != "make":
+        build_store(chunks_by_shard[DEFAULT_SHARD]).save_local(str(staging))
+    else:
+        manifest = {"shards": {}, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        for shard, chunks in chunks_by_shard.items():
+            build_store(chunks).save_local(str(staging / shard))
+            manifest["shards"][shard] = {
+                "makes": makes_by_shard[shard],
+                "chunks": len(chunks),
+                "merged_duplicates": merged_by_shard.get(shard, 0),
+                "sources": sources_by_shard[shard],
+            }
+            logger.info(f"🧩 Shard '{shard}': {len(chunks)} chunks")
+        (staging / SHARDS_MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    # Publish atomically: the index manager ignores hidden directories
+    os.replace(staging, target)
+    logger.info(f"✅ Index generation '{version}' written to {target}")
+    return target
+
+
+def main():
+    from config.log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Build a knowledge index generation from PDFs")
+    parser.add_argument("--data-dir", type=Path, default=settings.DATA_DIR)
+    parser.add_argument("--output", type=Path, default=settings.VECTORSTORE_PATH,
+                        help="Directory holding the index generations")
+    parser.add_argument("--version", help="Generation name (default: timestamp)")
+    parser.add_argument("--shard-by", choices=["none", "make"], default="none")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="Jaccard similarity from which near-duplicate chunks are merged (0 = off)")
+    args = parser.parse_args()
+
+    setup_logging()
+    build_generation(args.data_dir, args.output, args.version, args.shard_by, args.dedup_threshold)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Local store of scraped car listings (SQLite)
+
+Scraper runs upsert listings here (keyed by URL) and car_search answers from
+it with an indexed range query instead of scraping on every question. Every
+listing carries the time it was last scraped, so answers can say how fresh
+they are and stale listings can be skipped or pruned.
+
+Import a scraper CSV (title, price, year, mileage, fuel_type, link):
+    cd src && python -m services.listing_store import results.csv --source webcar
+"""
+import argparse
+import csv
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from utils.vehicles import MAKES, detect_makes, detect_models
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    id           INTEGER PRIMARY KEY,
+    url          TEXT NOT NULL UNIQUE,
+    source       TEXT NOT NULL,
+    title        TEXT,
+    make         TEXT,
+    model        TEXT,
+    year         INTEGER,
+    price_eur    INTEGER,
+    mileage_km   INTEGER,
+    fuel         TEXT,
+    transmission TEXT,
+    location     TEXT,
+    first_seen   REAL NOT NULL,
+    scraped_at   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_make_model_year ON listings (make, model, year, price_eur);
+CREATE INDEX IF NOT EXISTS idx_listings_make_price ON listings (make, price_eur);
+CREATE INDEX IF NOT EXISTS idx_listings_year ON listings (year);
+CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price_eur);
+CREATE INDEX IF NOT EXISTS idx_listings_mileage ON listings (mileage_km);
+CREATE INDEX IF NOT EXISTS idx_listings_fuel_price ON listings (fuel, price_eur);
+CREATE INDEX IF NOT EXISTS idx_listings_scraped_at ON listings (scraped_at);
+"""
+
+COLUMNS = ("url", "source", "title", "make", "model", "year", "price_eur",
+           "mileage_km", "fuel", "transmission", "location")
+
+FUELS = {
+    "petrol": "petrol", "gasoline": "petrol", "gas": "petrol", "benzin": "petrol",
+    "diesel": "diesel",
+    "electric": "electric", "ev": "electric", "bev": "electric",
+    "hybrid": "hybrid", "plug-in hybrid": "hybrid", "phev": "hybrid",
+    "lpg": "lpg", "cng": "cng",
+}
+
+# "24.990" / "24,990" / "24 990" -> "24990" (a separator followed by exactly three digits)
+_THOUSANDS_RE = re.compile(r"(?<=\d)[., \u00a0](?=\d{3}(?!\d))")
+
+
+def _first_per_value(pattern: str, values: Iterable[Optional[object]], thousands: bool = False) -> "np.ndarray":
+    """
+    First match of pattern (one group, anchored per line) in every value, as
+    floats (NaN where none)
+
+    The values are joined into one text, a line each, so the whole column
+    is parsed by a couple of regex passes instead of one search per value.
+    """
+    import numpy as np
+
+    texts = ["" if v is None else str(v).replace("\n", " ") for v in values]
+    if not texts:
+        return np.empty(0)
+    joined = "\n".join(texts)
+    if thousands:
+        joined = _THOUSANDS_RE.sub("", joined)
+    tokens = np.array(re.findall(pattern, joined, re.MULTILINE))
+    parsed = np.full(len(tokens), np.nan)
+    found = tokens != ""
+    parsed[found] = tokens[found].astype(np.float64)
+    return parsed
+
+
+def parse_amounts(values: Iterable[Optional[object]]) -> "np.ndarray":
+    """
+    Amount of every value of a column ("€24.990", "120.000 km", "24.990,00 €",
+    15000, None); dots, commas and spaces before three digits are thousands
+    separators
+
+    Returns:
+        float array, NaN where there is no number
+    """
+    return _first_per_value(r"^[^\d\n]*(\d*)", values, thousands=True)
+
+
+def parse_amount(text: Optional[object]) -> Optional[int]:
+    """Integer amount from a scraped string ("€24.990", "120.000 km"), see parse_amounts"""
+    value = parse_amounts([text])[0]
+    return None if value != value else int(value)
+
+
+def parse_years(values: Iterable[Optional[object]]) -> "np.ndarray":
+    """Model year of every value of a column ("2019", "03/2019", "EZ 2019"), NaN where none"""
+    return _first_per_value(r"^(?:[^\n]*?(?<!\d)(19[5-9]\d|20[0-4]\d)(?!\d))?", values)
+
+
+def parse_fuel(text: Optional[str]) -> Optional[str]:
+    """Canonical fuel type (petrol, diesel, electric, hybrid, lpg, cng)"""
+    if not text:
+        return None
+    lowered = str(text).lower()
+    for word in sorted(FUELS, key=len, reverse=True):
+        if re.search(rf"\b{re.escape(word)}\b", lowered):
+            return FUELS[word]
+    return None
+
+
+def split_title(title: str) -> Tuple[Optional[str], Optional[str]]:
+    """Make and model from a listing title ("BMW X5 xDrive30d M Sport" -> bmw, x5)"""
+    makes = detect_makes(title or "")
+    if not makes:
+        return None, None
+    make = makes[0]
+    models = detect_models(title)
+    if models:
+        return make, models[0]
+    # Otherwise the model is the word after the make (or its alias)
+    names = sorted([make, *MAKES.get(make, [])], key=len, reverse=True)
+    match = re.search(r"(?<![\w-])(?:" + "|".join(re.escape(n) for n in names) + r")\s+([\w-]+)",
+                      title, re.IGNORECASE)
+    return make, match.group(1).lower() if match else None
+
+
+def normalize(raw: Dict, source: str) -> Optional[Dict]:
+    """
+    Typed store row from a scraped listing (title, price, year, mileage,
+    fuel_type, link); None without a link
+    """
+    rows = normalize_batch([raw], source)
+    return rows[0] if rows else None
+
+
+def normalize_batch(listings: Iterable[Dict], source: str) -> List[Dict]:
+    """
+    Typed store rows from scraped listings, numeric columns parsed in bulk;
+    listings without a link are dropped
+    """
+    listings = [raw for raw in listings if raw.get("url") or raw.get("link")]
+    prices = parse_amounts(raw.get("price_eur", raw.get("price")) for raw in listings)
+    mileages = parse_amounts(raw.get("mileage_km", raw.get("mileage")) for raw in listings)
+    years = parse_years(raw.get("year") for raw in listings)
+
+    rows = []
+    for raw, price, mileage, year in zip(listings, prices.tolist(), mileages.tolist(), years.tolist()):
+        title = (raw.get("title") or "").strip()
+        make, model = split_title(title)
+        rows.append({
+            "url": raw.get("url") or raw.get("link"),
+            "source": source,
+            "title": title or None,
+            # Lowercase like the search filters, which compare with =
+            "make": str(raw.get("make") or "").strip().lower() or make,
+            "model": str(raw.get("model") or "").strip().lower() or model,
+            "year": None if year != year else int(year),
+            "price_eur": None if price != price else int(price),
+            "mileage_km": None if mileage != mileage else int(mileage),
+            "fuel": parse_fuel(raw.get("fuel") or raw.get("fuel_type")),
+            "transmission": raw.get("transmission"),
+            "location": raw.get("location"),
+        })
+    return rows
+
+
+class ListingStore:
+    """SQLite listing table with one connection per thread (WAL: readers don't block the writer)"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self._path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def path(self) -> Path:
+        return Path(self._path or settings.LISTINGS_DB_PATH)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._initialized:
+                conn.executescript(SCHEMA)
+                self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        with self._write_lock:
+            with conn:
+                yield conn
+
+    def upsert(self, listings: Iterable[Dict], source: str = "unknown") -> int:
+        """
+        Insert or refresh scraped listings (matched by URL); first_seen is kept
+
+        Args:
+            listings: Raw scraped listings or normalized rows
+            source: Site the listings come from
+
+        Returns:
+            Number of listings written
+        """
+        now = time.time()
+        rows = normalize_batch(listings, source)
+        if not rows:
+            return 0
+        placeholders = ", ".join(f":{c}" for c in COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c != "url")
+        sql = (
+            f"INSERT INTO listings ({', '.join(COLUMNS)}, first_seen, scraped_at) "
+            f"VALUES ({placeholders}, :now, :now) "
+            f"ON CONFLICT(url) DO UPDATE SET {updates}, scraped_at = excluded.scraped_at"
+        )
+        with self._transaction() as conn:
+            conn.executemany(sql, [{**row, "now": now} for row in rows])
+        logger.info(f"🚗 Stored {len(rows)} listings from {source}")
+        return len(rows)
+
+    def search(self,
+               make: Optional[str] = None,
+               model: Optional[str] = None,
+               year_min: Optional[int] = None,
+               year_max: Optional[int] = None,
+               price_min: Optional[int] = None,
+               price_max: Optional[int] = None,
+               mileage_max: Optional[int] = None,
+               fuel: Optional[str] = None,
+               max_age_seconds: Optional[float] = None,
+               limit: Optional[int] = 10,
+               columns: Optional[Iterable[str]] = None) -> List[Dict]:
+        """
+        Listings matching every given constraint, cheapest first
+
+        Args:
+            limit: Maximum number of rows (None = every match)
+            columns: Only these columns (default: all)
+
+        Returns:
+            Rows as dicts (scraped_at: epoch seconds)
+        """
+        where, params = [], []
+        for column, value in (("make", make), ("model", model), ("fuel", fuel)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value.lower())
+        for column, op, value in (("year", ">=", year_min), ("year", "<=", year_max),
+                                  ("price_eur", ">=", price_min), ("price_eur", "<=", price_max),
+                                  ("mileage_km", "<=", mileage_max)):
+            if value is not None:
+                where.append(f"{column} {op} ?")
+                params.append(value)
+        if max_age_seconds:
+            where.append("scraped_at >= ?")
+            params.append(time.time() - max_age_seconds)
+
+        selected = "*"
+        if columns:
+            columns = list(columns)
+            unknown = set(columns) - set(COLUMNS) - {"id", "scraped_at"}
+            if unknown:
+                raise ValueError(f"Unknown listing columns: {sorted(unknown)}")
+            selected = ", ".join(columns)
+        sql = f"SELECT {selected} FROM listings"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY price_eur IS NULL, price_eur"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def get(self, ids: Iterable[int]) -> List[Dict]:
+        """Full rows of the given listing IDs, in that order (missing ones skipped)"""
+        ids = list(ids)
+        if not ids:
+            return []
+        rows = self._connect().execute(
+            f"SELECT * FROM listings WHERE id IN ({', '.join('?' * len(ids))})", ids
+        )
+        by_id = {row["id"]: dict(row) for row in rows}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def models(self, make: str) -> List[str]:
+        """Distinct models of a make in the store"""
+        rows = self._connect().execute(
+            "SELECT DISTINCT model FROM listings WHERE make = ? AND model IS NOT NULL", (make.lower(),)
+        )
+        return [row["model"] for row in rows]
+
+    def prune(self, older_than_seconds: float) -> int:
+        """Delete listings not seen by a scraper run for older_than_seconds"""
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM listings WHERE scraped_at < ?",
+                                  (time.time() - older_than_seconds,))
+        return cursor.rowcount
+
+    def stats(self) -> Dict:
+        """Listing count and scrape time range"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS listings, MIN(scraped_at) AS oldest, MAX(scraped_at) AS newest FROM listings"
+        ).fetchone()
+        return dict(row)
+
+
+def import_csv(path: Path, source: str, store: Optional["ListingStore"] = None) -> int:
+    """Load a scraper results CSV into the store"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return (store or listing_store).upsert(csv.DictReader(f), source)
+
+
+def main():
+    from config.log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Manage the local car listings store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Import a scraper results CSV")
+    imp.add_argument("csv", type=Path)
+    imp.add_argument("--source", default="webcar")
+    prune = sub.add_parser("prune", help="Delete listings not scraped recently")
+    prune.add_argument("--hours", type=float, default=settings.LISTINGS_MAX_AGE_HOURS)
+    sub.add_parser("stats", help="Show listing count and freshness")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.command == "import":
+        import_csv(args.csv, args.source)
+    elif args.command == "prune":
+        logger.info(f"🧹 Deleted {listing_store.prune(args.hours * 3600)} stale listings")
+    print(listing_store.stats())
+
+
+# Global listing store
+listing_store = ListingStore()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Bitmap indexes over chunk metadata, for filtering before scoring
+
+Every chunk has a position (its FAISS id; BM25 uses the same order). For
+each filterable value the index keeps a bitmap (a Python int, bit i = chunk
+i) of the chunks that have it, so a filter is a few ANDs and ORs of
+bitmaps. BM25 then scores only the chosen positions and FAISS searches with
+an ID selector over the same bitmap.
+
+Filters map a field to the accepted values; fields are ANDed, values ORed.
+None accepts chunks that do not have the field, e.g. general maintenance
+text for any make:
+
+    {"make": ["toyota", None], "year": [2016, None], "section": ["brakes"]}
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from utils.vehicles import (
+    classify_doc_type,
+    classify_section,
+    detect_makes,
+    detect_models,
+    detect_years,
+)
+
+# Exact-match fields; "year" matches the year_min..year_max range of a chunk
+FIELDS = ("make", "model", "section", "doc_type")
+FILTER_FIELDS = FIELDS + ("year",)
+
+Filters = Dict[str, Sequence[Optional[object]]]
+
+_INLINE_RE = re.compile(r"\b(make|model|year|section|doc_type):([\w\-]+)", re.IGNORECASE)
+
+
+def document_metadata(name: str, title_text: str = "") -> Dict:
+    """
+    Document-level metadata from a PDF file name and its first page
+
+    Returns:
+        make, model, year_min, year_max, doc_type (None when not found)
+    """
+    makes = detect_makes(name) or detect_makes(title_text)
+    models = detect_models(name) or detect_models(title_text)
+    years = detect_years(name.replace("_", " ")) or detect_years(title_text)
+    return {
+        "make": makes[0] if len(makes) == 1 else None,
+        "model": models[0] if len(models) == 1 else None,
+        "year_min": years[0] if years else None,
+        "year_max": years[1] if years else None,
+        "doc_type": classify_doc_type(name, title_text[:500]),
+    }
+
+
+def chunk_metadata(metadata: Dict, text: str) -> Dict:
+    """
+    Filter fields of a chunk: stored ones, or derived from the source name
+    and text for chunks indexed before they were stored
+    """
+    if "section" in metadata:
+        return metadata
+    source = re.split(r"[\\/]", metadata.get("source", ""))[-1]
+    return {**document_metadata(source.rsplit(".", 1)[0]), "section": classify_section(text)}
+
+
+class MetadataIndex:
+    """Bitmaps of chunk positions per metadata value"""
+
+    def __init__(self, chunks: Iterable[Tuple[Dict, str]]):
+        """
+        Args:
+            chunks: (metadata, text) per chunk, in position order
+        """
+        members: Dict[str, Dict[Optional[object], List[int]]] = {field: {} for field in FILTER_FIELDS}
+        size = 0
+        for position, (metadata, text) in enumerate(chunks):
+            fields = chunk_metadata(metadata, text)
+            for field in FIELDS:
+                members[field].setdefault(fields.get(field), []).append(position)
+            first, last = fields.get("year_min"), fields.get("year_max")
+            for year in (range(first, (last or first) + 1) if first else [None]):
+                members["year"].setdefault(year, []).append(position)
+            size = position + 1
+
+        self.size = size
+        self.all = (1 << size) - 1
+        self.bitmaps: Dict[str, Dict[Optional[object], int]] = {
+            field: {value: bitmap(found, size) for value, found in values.items()}
+            for field, values in members.items()
+        }
+
+    def select(self, filters: Optional[Filters]) -> int:
+        """
+        Bitmap of the chunks matching every field of filters
+
+        Raises:
+            ValueError: For an unknown field
+        """
+        selected = self.all
+        for field, values in (filters or {}).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown filter field '{field}' (use {', '.join(FILTER_FIELDS)})")
+            bitmaps = self.bitmaps[field]
+            accepted = 0
+            for value in values:
+                if field == "year" and value is not None:
+                    value = int(value)
+                elif isinstance(value, str):
+                    value = value.lower()
+                accepted |= bitmaps.get(value, 0)
+            selected &= accepted
+            if not selected:
+                break
+        return selected
+
+    def counts(self, field: str) -> Dict[str, int]:
+        """Chunks per value of a field"""
+        return {str(value): bin(bits).count("1") for value, bits in self.bitmaps[field].items()}
+
+
+def bitmap(found: Sequence[int], size: int) -> int:
+    """Bitmap with the given chunk positions set"""
+    import numpy as np
+
+    bits = np.zeros(size, dtype=np.uint8)
+    bits[list(found)] = 1
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def positions(bits: int, size: int) -> List[int]:
+    """Chunk positions set in a bitmap, ascending"""
+    import numpy as np
+
+    packed = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder="little")[:size]).tolist()
+
+
+def query_filters(query: str) -> Filters:
+    """
+    Filters implied by a question: the make, model and year it names,
+    each also accepting chunks that are not specific to one
+    """
+    filters: Filters = {}
+    makes = detect_makes(query)
+    if makes:
+        filters["make"] = [*makes, None]
+    models = detect_models(query)
+    if models:
+        filters["model"] = [*models, None]
+    years = detect_years(query)
+    if years and years[0] == years[1]:
+        filters["year"] = [years[0], None]
+    return filters
+
+
+def parse_inline_filters(query: str) -> Tuple[str, Filters]:
+    """
+    Split "field:value" terms (make:toyota section:brakes year:2016) off a query
+
+    Returns:
+        (query without the terms, strict filters)
+    """
+    filters: Dict[str, List] = {}
+    for field, value in _INLINE_RE.findall(query):
+        field = field.lower()
+        if field == "make":
+            value = (detect_makes(value.replace("-", " ")) or [value])[0]
+        filters.setdefault(field, []).append(value)
+    return " ".join(_INLINE_RE.sub("", query).split()), filters
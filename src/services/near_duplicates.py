@@ -0,0 +1,183 @@
+"""
+Near-duplicate chunk compaction at ingest time
+
+Manuals repeat boilerplate (safety warnings, headers, the same procedure in
+several chapters). Each chunk is reduced to a MinHash signature of its word
+shingles; LSH banding over the signatures finds candidate pairs without
+comparing every chunk with every other, and a pair is merged when the exact
+Jaccard similarity of its shingle sets reaches the threshold.
+
+Every cluster is replaced by one canonical chunk (its longest member) at the
+position of its first member. The canonical chunk keeps the references of
+all members in metadata["refs"] ([{"source", "page"}, ...], document order),
+so a snippet can still cite every page it came from.
+
+Only chunks with the same filterable metadata (services/metadata_index.py)
+are merged, so filtering on make, model, year, doc_type or section gives the
+same answers as before compaction.
+"""
+import re
+import zlib
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Sequence, Set, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+SHINGLE_WORDS = 5
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 4 rows per band: pairs at Jaccard 0.8 become candidates > 99.9% of the time
+THRESHOLD = 0.8
+
+# Metadata that must be equal for two chunks to be merged
+GROUP_FIELDS = ("shard", "make", "model", "year_min", "year_max", "doc_type", "section")
+
+_WORD_RE = re.compile(r"\w+")
+_PRIME = 4294967311  # > 2**32, the range of crc32
+_SEED = 20240601
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> Set[int]:
+    """Hashes of the overlapping `size`-word windows of a text (case-insensitive)"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+
+def _permutations(n: int):
+    """Coefficients of n universal hash functions (a * x + b) mod _PRIME"""
+    import numpy as np
+
+    rng = np.random.default_rng(_SEED)
+    # Below 2**31 so that a * x + b stays within uint64 for 32-bit x
+    a = rng.integers(1, 1 << 31, size=n, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, size=n, dtype=np.uint64)
+    return a, b
+
+
+def signatures(shingle_sets: Sequence[Set[int]], num_permutations: int = NUM_PERMUTATIONS):
+    """
+    MinHash signature of every shingle set
+
+    Returns:
+        uint64 array (len(shingle_sets), num_permutations); empty sets get all-max rows
+    """
+    import numpy as np
+
+    a, b = _permutations(num_permutations)
+    result = np.full((len(shingle_sets), num_permutations), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for row, values in enumerate(shingle_sets):
+        if values:
+            x = np.fromiter(values, dtype=np.uint64, count=len(values))
+            result[row] = ((a[:, None] * x[None, :] + b[:, None]) % _PRIME).min(axis=1)
+    return result
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_clusters(texts: Sequence[str],
+                  groups: Sequence[Tuple] = (),
+                  threshold: float = THRESHOLD,
+                  bands: int = BANDS) -> List[List[int]]:
+    """
+    Clusters of near-duplicate texts
+
+    Args:
+        texts: Chunk texts
+        groups: Optional key per text; only texts with equal keys are compared
+        threshold: Minimum Jaccard similarity of shingle sets to merge a pair
+        bands: LSH bands (NUM_PERMUTATIONS must be a multiple)
+
+    Returns:
+        Clusters of two or more positions, each ascending, ordered by first position
+    """
+    sets = [shingles(text) for text in texts]
+    sigs = signatures(sets)
+    rows = sigs.shape[1] // bands
+    groups = groups or [()] * len(texts)
+
+    parent = list(range(len(texts)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    checked: Set[Tuple[int, int]] = set()
+    for band in range(bands):
+        buckets: Dict[Tuple, List[int]] = defaultdict(list)
+        for i in range(len(texts)):
+            if sets[i]:
+                buckets[(groups[i], sigs[i, band * rows:(band + 1) * rows].tobytes())].append(i)
+        for members in buckets.values():
+            for n, j in enumerate(members[1:], start=1):
+                # Compared with earlier members until one matches; clusters then merge through union-find
+                for i in members[:n]:
+                    ri, rj = root(i), root(j)
+                    if ri == rj:
+                        break
+                    if (i, j) in checked:
+                        continue
+                    checked.add((i, j))
+                    if jaccard(sets[i], sets[j]) >= threshold:
+                        parent[max(ri, rj)] = min(ri, rj)
+                        break
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(texts)):
+        clusters[root(i)].append(i)
+    return sorted((members for members in clusters.values() if len(members) > 1), key=lambda m: m[0])
+
+
+def reference(doc: "Document") -> Dict:
+    return {"source": doc.metadata.get("source"), "page": doc.metadata.get("page")}
+
+
+def compact_chunks(chunks: List["Document"], threshold: float = THRESHOLD) -> Tuple[List["Document"], Dict]:
+    """
+    Replace every cluster of near-duplicate chunks by one canonical chunk
+
+    Args:
+        chunks: Chunks in index order (with the metadata set by ingestion)
+        threshold: Minimum Jaccard similarity of shingle sets to merge a pair
+
+    Returns:
+        (compacted chunks in the original order, stats: chunks, kept, merged, clusters)
+    """
+    from langchain_core.documents import Document
+
+    clusters = find_clusters(
+        [chunk.page_content for chunk in chunks],
+        [tuple(chunk.metadata.get(field) for field in GROUP_FIELDS) for chunk in chunks],
+        threshold,
+    )
+
+    replacement: Dict[int, "Document"] = {}
+    dropped: Set[int] = set()
+    for members in clusters:
+        canonical = chunks[max(members, key=lambda i: (len(chunks[i].page_content), -i))]
+        refs = []
+        for i in members:
+            ref = reference(chunks[i])
+            if ref not in refs:
+                refs.append(ref)
+        replacement[members[0]] = Document(
+            page_content=canonical.page_content,
+            metadata={**canonical.metadata, "refs": refs, "duplicates": len(members) - 1},
+        )
+        dropped.update(members[1:])
+
+    compacted = [replacement.get(i, chunk) for i, chunk in enumerate(chunks) if i not in dropped]
+    stats = {
+        "chunks": len(chunks),
+        "kept": len(compacted),
+        "merged": len(dropped),
+        "clusters": len(clusters),
+    }
+    return compacted, stats
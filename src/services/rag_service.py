@@ -1,122 +1,528 @@
 """
 RAG (Retrieval-Augmented Generation) service for PDF knowledge base
+
+FAISS, BM25 and the embedding model are imported and loaded on first use
+(or by the startup warm-up), never at import time. The FAISS store and BM25
+retriever belong to an index version (services/index_manager.py) that can be
+swapped while the service runs. A version may be split into shards (one per
+make or document type): queries search the shards of the makes they name and
+fall back to all shards (scatter-gather) when no make is recognised.
+
+BM25 and FAISS run concurrently; when one of them is slow or fails, the
+query is answered from the other one (see retrieve). Query embeddings of
+concurrent searches are computed in batches and cached (QueryEmbedder).
 """
-import os
-from typing import Optional
-from langchain_community.vectorstores import FAISS
-from langchain.retrievers import BM25Retriever, EnsembleRetriever
-from langchain_huggingface import HuggingFaceEmbeddings
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import copy_context
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
 from config.settings import settings
 
+from core.deadline import RequestCancelled, io_timeout, wait_event
+from core.metrics import RETRIEVER_SECONDS
+
+from services.index_manager import IndexVersion, index_manager
+from services.metadata_index import Filters, parse_inline_filters, positions, query_filters
+from services.snippets import render
+
+from utils.vehicles import detect_makes
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Hybrid retrieval: candidates per retriever, fused with weighted reciprocal rank
+CANDIDATES_K = 15
+RESULTS_K = 3
+BM25_WEIGHT = 0.4
+FAISS_WEIGHT = 0.6  # Favor semantic search slightly
+RRF_C = 60
 
 # Global variables for singleton pattern
-vector_store: Optional[FAISS] = None
-bm25_retriever: Optional[BM25Retriever] = None
+embeddings: Optional["Embeddings"] = None
+# Serializes loading between the warm-up thread and early requests
+_load_lock = threading.RLock()
+# BM25 and FAISS searches; a retriever a query stopped waiting for finishes here
+_retrieval_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-retrieval")
 
 
-def load_vectorstore() -> Optional[FAISS]:
+def get_embeddings() -> "Embeddings":
     """
-    Load FAISS vectorstore from disk if not already in memory
+    Embedding model used for the FAISS index and queries (loaded once)
     
     Returns:
-        FAISS vectorstore instance or None if not found
+        Embeddings instance
     """
-    global vector_store
+    global embeddings
     
-    if vector_store is None:
-        if os.path.exists(settings.VECTORSTORE_PATH):
-            print(f"📂 Loading FAISS vectorstore from: {settings.VECTORSTORE_PATH}")
-            
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2"
-            )
-            
-            vector_store = FAISS.load_local(
-                str(settings.VECTORSTORE_PATH),
-                embeddings,
-                allow_dangerous_deserialization=True
-            )
-            print("✅ FAISS vectorstore loaded successfully")
+    with _load_lock:
+        if embeddings is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            embeddings = HuggingFaceEmbeddings(model_name=settings.EMBEDDING_MODEL)
+    
+    return embeddings
+
+
+class _PendingQuery:
+    def __init__(self, text: str):
+        self.text = text
+        self.vector: Optional[List[float]] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class QueryEmbedder:
+    """
+    Query embeddings for FAISS searches, batched and cached
+    
+    One worker thread embeds the queries waiting when it becomes free in a
+    single embed_documents call (up to max_batch), so concurrent searches
+    share one model pass instead of queueing for one each; an idle worker
+    starts a lone query at once. Vectors are kept in an LRU cache by text.
+    """
+    
+    def __init__(self, max_batch: int, cache_size: int):
+        self.max_batch = max(1, max_batch)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._pending: List[_PendingQuery] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._model: Optional["Embeddings"] = None
+        self.batches = 0
+        self.embedded = 0
+    
+    def embed(self, text: str) -> List[float]:
+        """
+        Embedding of one query
+        
+        Raises:
+            RequestCancelled: If the current request is cancelled while waiting
+        """
+        model = get_embeddings()
+        with self._cond:
+            if model is not self._model:
+                # Vectors of another model (replaced embeddings) are not comparable
+                self._cache.clear()
+                self._model = model
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                return vector
+            pending = _PendingQuery(text)
+            self._pending.append(pending)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="query-embedder", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        wait_event(pending.done)
+        if pending.error is not None:
+            raise pending.error
+        return pending.vector
+    
+    def clear(self) -> None:
+        with self._cond:
+            self._cache.clear()
+    
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            texts = list(dict.fromkeys(p.text for p in batch))
+            try:
+                model = self._model or get_embeddings()
+                # A lone query goes through embed_query, exactly as before batching
+                vectors = [model.embed_query(texts[0])] if len(texts) == 1 else model.embed_documents(texts)
+                by_text = dict(zip(texts, vectors))
+                with self._cond:
+                    self.batches += 1
+                    self.embedded += len(texts)
+                    if self.cache_size > 0:
+                        self._cache.update(by_text)
+                        while len(self._cache) > self.cache_size:
+                            self._cache.popitem(last=False)
+                for p in batch:
+                    p.vector = by_text[p.text]
+            except Exception as e:
+                for p in batch:
+                    p.error = e
+            for p in batch:
+                p.done.set()
+
+
+query_embedder = QueryEmbedder(settings.RAG_EMBED_BATCH_SIZE, settings.RAG_QUERY_CACHE_SIZE)
+
+
+@contextmanager
+def _stage(timings: Optional[Dict[str, float]], name: str):
+    """Add the duration of a block to timings[name] (seconds) when timings is given"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - started
+
+
+def bm25_search(query: str,
+                index: Optional[IndexVersion] = None,
+                shards: Optional[Sequence[str]] = None,
+                eligible: Optional[Dict[str, int]] = None) -> List["Document"]:
+    """
+    Keyword candidates (BM25), best first, merged across shards by score
+    (default: every shard of the active index version). Each shard scores
+    with its own term statistics, close enough to merge on.
+    
+    Args:
+        eligible: Bitmap of the chunks to score per shard (default: all)
+    """
+    index = index or index_manager.active
+    shards = shards or list(index.shards)
+    scored = []
+    for name in shards:
+        shard = index.shard(name)
+        retriever = shard.bm25_retriever
+        tokens = retriever.preprocess_func(query)
+        bits = eligible.get(name) if eligible else None
+        if bits is None or bits == shard.metadata.all:
+            scores = retriever.vectorizer.get_scores(tokens)
+            # Same order as BM25Retriever.invoke (numpy argsort, descending)
+            top = scores.argsort()[::-1][:retriever.k]
+            scored.extend((scores[i], retriever.docs[i]) for i in top)
         else:
-            print(f"❌ No saved FAISS vectorstore found at: {settings.VECTORSTORE_PATH}")
+            import numpy as np
+            ids = positions(bits, shard.metadata.size)
+            scores = np.asarray(retriever.vectorizer.get_batch_scores(tokens, ids))
+            top = scores.argsort()[::-1][:retriever.k]
+            scored.extend((scores[j], retriever.docs[ids[j]]) for j in top)
+    if len(shards) > 1:
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [doc for _, doc in scored[:CANDIDATES_K]]
+
+
+def _faiss_filtered(vector_store: "FAISS", query_vector: List[float], k: int, bits: int, size: int):
+    """Nearest chunks among those set in bits (FAISS ID selector), with their distances"""
+    import faiss
+    import numpy as np
     
-    return vector_store
+    selector = faiss.IDSelectorBitmap(np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8))
+    distances, ids = vector_store.index.search(
+        np.asarray([query_vector], dtype=np.float32), k, params=faiss.SearchParameters(sel=selector)
+    )
+    docstore_ids = vector_store.index_to_docstore_id
+    return [
+        (vector_store.docstore.search(docstore_ids[i]), float(d))
+        for d, i in zip(distances[0], ids[0]) if i != -1
+    ]
 
 
-def load_bm25() -> Optional[BM25Retriever]:
+def faiss_search(query: str,
+                 k: int = CANDIDATES_K,
+                 timings: Optional[Dict[str, float]] = None,
+                 index: Optional[IndexVersion] = None,
+                 shards: Optional[Sequence[str]] = None,
+                 eligible: Optional[Dict[str, int]] = None) -> List["Document"]:
     """
-    Rebuild BM25 retriever from FAISS stored documents if needed
+    Semantic candidates (FAISS), best first, merged across shards by distance
+    (default: every shard of the active index version)
+    
+    Args:
+        eligible: Bitmap of the chunks to search per shard (default: all)
+    """
+    index = index or index_manager.active
+    shards = shards or list(index.shards)
+    with _stage(timings, "embed"):
+        query_vector = query_embedder.embed(query)
+    with _stage(timings, "faiss"):
+        scored = []
+        for name in shards:
+            shard = index.shard(name)
+            bits = eligible.get(name) if eligible else None
+            if bits is None or bits == shard.metadata.all:
+                scored.extend(shard.vector_store.similarity_search_with_score_by_vector(query_vector, k=k))
+            else:
+                scored.extend(_faiss_filtered(shard.vector_store, query_vector, k, bits, shard.metadata.size))
+        if len(shards) > 1:
+            scored.sort(key=lambda pair: pair[1])  # L2 distance, comparable across shards
+        return [doc for doc, _ in scored[:k]]
+
+
+def select_chunks(index: IndexVersion,
+                  shards: Sequence[str],
+                  filters: Optional[Filters]) -> Dict[str, int]:
+    """
+    Bitmap of the chunks matching filters in each shard
     
     Returns:
-        BM25Retriever instance or None if vectorstore not available
+        Shard name -> bitmap, for the shards with at least one match
     """
-    global bm25_retriever, vector_store
+    eligible = {}
+    for name in shards:
+        bits = index.shard(name).metadata.select(filters)
+        if bits:
+            eligible[name] = bits
+    return eligible
+
+
+def fuse(doc_lists: Sequence[List["Document"]],
+         weights: Sequence[float],
+         c: int = RRF_C) -> List["Document"]:
+    """
+    Weighted reciprocal rank fusion (same ranking as langchain's EnsembleRetriever)
     
-    if bm25_retriever is None and vector_store is not None:
-        print("🔄 Rebuilding BM25 retriever from FAISS docs...")
+    Args:
+        doc_lists: Ranked candidates per retriever
+        weights: Weight per retriever
+        c: RRF constant
         
-        # FAISS stores docs internally
-        docs = list(vector_store.docstore._dict.values())
-        bm25_retriever = BM25Retriever.from_documents(docs)
-        bm25_retriever.k = 15
+    Returns:
+        Documents deduplicated by content, best first
+    """
+    scores: Dict[str, float] = {}
+    unique: Dict[str, "Document"] = {}
+    for docs, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(docs, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (rank + c)
+            unique.setdefault(key, doc)
+    
+    return sorted(unique.values(), key=lambda doc: scores[doc.page_content], reverse=True)
+
+
+def format_sources(sources: Dict[str, Dict]) -> str:
+    """One-line retrieval report appended to the observation: time and hit count per retriever"""
+    parts = []
+    for name, result in sources.items():
+        ms = round(result["seconds"] * 1000)
+        if result["status"] == "ok":
+            parts.append(f"{name} {ms} ms ({len(result['docs'])} hits)")
+        elif result["status"] == "late":
+            parts.append(f"{name} skipped (no result after {ms} ms)")
+        else:
+            parts.append(f"{name} failed after {ms} ms")
+    return "⏱️ Retrieval: " + ", ".join(parts)
+
+
+def format_snippets(docs: List["Document"], full: Optional[bool] = None) -> str:
+    """
+    Render documents as "📄 [source - page N]" snippets from the views stored
+    at ingest (services/snippets.py): the key-sentence summary of each chunk,
+    or its whole text with full (default: RAG_OBSERVATION_VIEW == "full")
+    """
+    if full is None:
+        full = settings.RAG_OBSERVATION_VIEW == "full"
+    return "\n\n".join(render(doc, full) for doc in docs)
+
+
+def _run_source(name: str, search: Callable[[Dict[str, float]], List["Document"]]) -> Dict:
+    """Run one retriever in the pool and report how it went instead of raising"""
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        docs, error = search(timings), None
+    except Exception as e:
+        logger.warning(f"⚠️ {name} retrieval failed: {e}")
+        docs, error = [], str(e)
+    return {"docs": docs, "error": error, "seconds": time.perf_counter() - started, "timings": timings}
+
+
+def gather_sources(searches: Dict[str, Callable[[Dict[str, float]], List["Document"]]],
+                   timeout: Optional[float],
+                   straggler: Optional[float],
+                   on_done: Optional[Callable[[], None]] = None) -> Dict[str, Dict]:
+    """
+    Run retrievers concurrently and collect those done in time
+    
+    Waits until every retriever is done, `straggler` seconds after the first
+    one returned results, or `timeout` seconds after the start, whichever
+    comes first. A failed retriever does not start the straggler window: the
+    others get the whole timeout.
+    
+    Args:
+        searches: Retriever name -> search(timings) returning ranked documents
+        timeout: Seconds to wait at most (None: no limit)
+        straggler: Seconds to wait for the others once one has results (None: no limit)
+        on_done: Called once per retriever when it has finished, late ones included
         
-        print("✅ BM25 retriever ready")
+    Returns:
+        Retriever name -> {"status": "ok" | "error" | "late", "docs", "error",
+        "seconds", "timings"}; a late retriever has no documents and keeps
+        running in the background
+    """
+    started = time.monotonic()
+    deadline = started + timeout if timeout is not None else None
+    # Retrievers run in the caller's context: the request's cancel token caps
+    # their waits (query embedding) and I/O like in the caller's thread
+    futures: Dict[Future, str] = {
+        _retrieval_pool.submit(copy_context().run, _run_source, name, search): name
+        for name, search in searches.items()
+    }
+    if on_done is not None:
+        for future in futures:
+            future.add_done_callback(lambda f: on_done())
+    
+    results: Dict[str, Dict] = {}
+    pending = set(futures)
+    while pending:
+        wait_for = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        if not done:
+            break  # Deadline passed
+        for future in done:
+            name = futures[future]
+            result = future.result()
+            result["status"] = "error" if result["error"] else "ok"
+            RETRIEVER_SECONDS.observe(result["seconds"], retriever=name, status=result["status"])
+            results[name] = result
+            if result["status"] == "ok" and straggler is not None:
+                window_end = time.monotonic() + straggler
+                deadline = window_end if deadline is None else min(deadline, window_end)
     
-    return bm25_retriever
+    waited = time.monotonic() - started
+    for future in pending:
+        name = futures[future]
+        results[name] = {"status": "late", "docs": [], "error": None, "seconds": waited, "timings": {}}
+        # Still measured once it finishes, to show how late it was
+        future.add_done_callback(
+            lambda f, name=name: f.cancelled()
+            or RETRIEVER_SECONDS.observe(f.result()["seconds"], retriever=name, status="late")
+        )
+    return {name: results[name] for name in searches}
 
 
-def search_pdf_knowledge(query: str) -> str:
+def retrieve(query: str,
+             timings: Optional[Dict[str, float]] = None,
+             index: Optional[IndexVersion] = None,
+             filters: Optional[Filters] = None,
+             sources: Optional[Dict[str, Dict]] = None) -> List["Document"]:
     """
-    Hybrid RAG search with semantic + keyword results
+    Hybrid retrieval: BM25 and FAISS candidates fused by weighted reciprocal rank,
+    both scoring only the chunks that pass the metadata filters
+    
+    The two retrievers run concurrently. Once one has results the other gets
+    RAG_STRAGGLER_MS more, and neither waits past RAG_RETRIEVAL_TIMEOUT (or
+    the request's deadline): a retriever that is late or fails is left out
+    and the query is answered from the other one.
     
     Args:
         query: Search query
+        timings: Optional dict receiving per-stage seconds (route, filter, bm25,
+            embed, faiss of the retrievers done in time, retrieval wall time, fusion)
+        index: Index version to search (default: the active one, which must be loaded)
+        filters: Metadata filters (see services/metadata_index.py); default: the
+            make / model / year named in the query, {} for none
+        sources: Optional dict receiving per-retriever outcome (see gather_sources)
         
     Returns:
-        Formatted search results or error message
+        Fused documents, best first
+        
+    Raises:
+        RuntimeError: If no retriever returned results in time and at least one failed
     """
-    global vector_store, bm25_retriever
+    # Both retrievers search the same version even if a swap happens meanwhile
+    index = index or index_manager.active
+    with _stage(timings, "route"):
+        shards = index.route(detect_makes(query))
+    with _stage(timings, "filter"):
+        eligible = select_chunks(index, shards, query_filters(query) if filters is None else filters)
+        shards = [name for name in shards if name in eligible]
+    if len(index.shards) > 1 or filters:
+        logger.debug(f"🧭 Searching shards: {', '.join(shards)} (filters: {filters})")
+    if not shards:
+        return []
     
-    print(f"🔍 Searching PDF knowledge base for: '{query}'")
+    def keyword(source_timings):
+        with _stage(source_timings, "bm25"):
+            return bm25_search(query, index, shards, eligible)
     
-    # Load vectorstore and BM25 if needed
-    vector_store = load_vectorstore()
-    bm25_retriever = load_bm25()
+    def semantic(source_timings):
+        return faiss_search(query, timings=source_timings, index=index, shards=shards, eligible=eligible)
     
-    if vector_store is None or bm25_retriever is None:
-        return "❌ RAG system not initialized. Please ensure FAISS vectorstore exists."
+    timeout = io_timeout(settings.RAG_RETRIEVAL_TIMEOUT) if settings.RAG_RETRIEVAL_TIMEOUT > 0 else None
+    straggler = settings.RAG_STRAGGLER_MS / 1000 if settings.RAG_STRAGGLER_MS > 0 else None
+    searches = {"bm25": keyword, "faiss": semantic}
+    # Each retriever pins the version until it is done: a late one outlives the
+    # caller's pin, and a swap must not unload the version under it
+    for _ in searches:
+        index_manager.pin(index)
+    with _stage(timings, "retrieval"):
+        results = gather_sources(searches, timeout, straggler, on_done=lambda: index_manager.release(index))
+    if sources is not None:
+        sources.update(results)
+    if timings is not None:
+        for result in results.values():
+            for stage, seconds in result["timings"].items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
     
-    try:
-        # Create FAISS retriever
-        faiss_retriever = vector_store.as_retriever(search_kwargs={"k": 15})
-        
-        # Create ensemble retriever combining BM25 and FAISS
-        ensemble = EnsembleRetriever(
-            retrievers=[bm25_retriever, faiss_retriever],
-            weights=[0.4, 0.6]  # Favor semantic search slightly
+    used = [name for name in ("bm25", "faiss") if results[name]["status"] == "ok"]
+    if len(used) < 2:
+        logger.info(
+            f"⏱️ Partial retrieval for '{query}': "
+            + ", ".join(f"{name} {result['status']}" for name, result in results.items())
         )
+    if not used and any(result["status"] == "error" for result in results.values()):
+        raise RuntimeError("; ".join(result["error"] for result in results.values() if result["error"]))
+    
+    with _stage(timings, "fusion"):
+        return fuse([results["bm25"]["docs"], results["faiss"]["docs"]], [BM25_WEIGHT, FAISS_WEIGHT])
+
+
+def search_pdf_knowledge(query: str,
+                         timings: Optional[Dict[str, float]] = None,
+                         filters: Optional[Filters] = None) -> str:
+    """
+    Hybrid RAG search with semantic + keyword results
+    
+    Args:
+        query: Search query; "field:value" terms (make:toyota section:brakes
+            year:2016 doc_type:owner_manual) are applied as strict filters
+        timings: Optional dict receiving per-stage seconds (see retrieve, plus format)
+        filters: Extra metadata filters, added to those implied by the query
         
-        # Retrieve relevant documents
-        docs = ensemble.get_relevant_documents(query)
-        
-        if not docs:
-            print("❌ No relevant information found in PDFs")
-            return "The PDF documents do not contain specific information about this topic."
-        
-        print(f"✅ Found {len(docs)} relevant chunks, selecting top 3")
-        
-        # Format top 3 results
-        final_docs = docs[:3]
-        snippets = []
+    Returns:
+        Formatted search results followed by the per-retriever timings, or error message
+    """
+    logger.debug(f"🔍 Searching PDF knowledge base for: '{query}'")
+    
+    # Load the index if needed, then pin the active version for this query
+    index_manager.ensure_loaded()
+    
+    with index_manager.acquire() as index:
+        if index is None:
+            return "❌ RAG system not initialized. Please ensure FAISS vectorstore exists."
         
-        for i, doc in enumerate(final_docs, 1):
-            source = os.path.basename(doc.metadata.get('source', 'unknown.pdf'))
-            page = doc.metadata.get('page', 'N/A')
-            content = doc.page_content.strip()
-            snippets.append(f"📄 [{source} - page {page}]\n{content}")
+        try:
+            # Inline terms and explicit filters are strict, those implied by the query are not
+            query, inline = parse_inline_filters(query)
+            filters = {**query_filters(query), **inline, **(filters or {})}
+            
+            # Retrieve relevant documents
+            sources: Dict[str, Dict] = {}
+            docs = retrieve(query, timings, index, filters, sources)
+            
+            if not docs:
+                logger.debug("❌ No relevant information found in PDFs")
+                if any(result["status"] != "ok" for result in sources.values()):
+                    return f"No relevant information found in time.\n\n{format_sources(sources)}"
+                return "The PDF documents do not contain specific information about this topic."
+            
+            logger.debug(f"✅ Found {len(docs)} relevant chunks, selecting top {RESULTS_K}")
+            
+            # Format top results
+            with _stage(timings, "format"):
+                return f"{format_snippets(docs[:RESULTS_K])}\n\n{format_sources(sources)}"
         
-        return "\n\n".join(snippets)
-    
-    except Exception as e:
-        print(f"❌ Error searching documents: {e}")
-        return f"❌ Error searching documents: {str(e)}"
\ No newline at end of file
+        except RequestCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"❌ Error searching documents: {e}")
+            return f"❌ Error searching documents: {str(e)}"
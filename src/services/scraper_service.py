@@ -0,0 +1,505 @@
+"""
+Batch scraping of car listing sites into the listing store
+
+A run is a list of searches (site, make, model, page) executed by a thread
+pool. Each search first tries the static fast path: the results page is
+fetched over a pooled HTTP session and parsed with lxml XPath selectors, no
+browser involved. Only pages that need JavaScript (no listings in the static
+HTML, or sites marked static=False) go to a small pool of headless Chrome
+drivers, which wait explicitly for the listing elements, then hand the page
+source to the same lxml parser: one WebDriver round trip per page instead of
+one per selector per listing.
+
+Parsing works on plain HTML, so saved pages can be scraped offline:
+
+    cd src
+    python -m services.scraper_service --make audi --model a4 --pages 5
+    python -m services.scraper_service --html page_structure.html --dry-run
+    python -m services.scraper_service --make bmw --pages 2 --save-html ../benchmarks/data
+"""
+import argparse
+import csv
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote_plus, urljoin
+
+from config.settings import settings
+from services.listing_store import listing_store
+
+if TYPE_CHECKING:
+    import requests
+    from selenium.webdriver.remote.webdriver import WebDriver
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+
+_YEAR_RE = re.compile(r"\b(19[5-9]\d|20[0-4]\d)\b")
+_MILEAGE_RE = re.compile(r"(\d{1,3}(?:[.,\s]\d{3})*|\d+)\s*km\b", re.IGNORECASE)
+_FUELS = ("plug-in hybrid", "hybrid", "electric", "diesel", "petrol", "gasoline", "lpg", "cng")
+
+
+@dataclass(frozen=True)
+class Site:
+    """Where a site's results are and how to read them (XPath, tried in order)"""
+    name: str
+    search_url: str  # formatted with make, model, page
+    listing: Tuple[str, ...]
+    title: Tuple[str, ...]
+    price: Tuple[str, ...]
+    cookie_button: str = ""
+    static: bool = True  # results are in the server-rendered HTML
+    pagination: Tuple[str, ...] = ()  # the page links; a page without them says nothing about the next
+    next_page: Tuple[str, ...] = ()  # the "next" link within them
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+SITES: Dict[str, Site] = {
+    "webcar": Site(
+        name="webcar",
+        search_url="https://www.webcar.eu/eu-en/car-search?brand={make}&model={model}&page={page}",
+        listing=(
+            f"//*[{_has_class('vehicle-card')}]",
+            "//*[contains(@data-testid, 'vehicle')]",
+            f"//*[{_has_class('car-listing')} or {_has_class('vehicle-item')} or {_has_class('listing-card')}]",
+            f"//*[{_has_class('result-item')}]",
+            "//article",
+        ),
+        title=(
+            f".//*[{_has_class('title')} or {_has_class('vehicle-title')} or {_has_class('car-title')}]",
+            ".//h2", ".//h3", ".//h4",
+            f".//*[{_has_class('name')}]",
+        ),
+        price=(
+            f".//*[{_has_class('price')} or {_has_class('vehicle-price')} or {_has_class('car-price')}]",
+            ".//*[contains(@class, 'price')]",
+            ".//strong",
+        ),
+        cookie_button="//button[@id='acceptCookies' or contains(@class, 'cookie-accept-all') or contains(@class, 'accept')]",
+        pagination=(f"//*[{_has_class('pagination')}]", "//nav[contains(@aria-label, 'agination')]"),
+        next_page=(".//a[@rel='next']", f".//a[{_has_class('next')} and not({_has_class('disabled')})]"),
+    ),
+}
+
+
+@dataclass(frozen=True)
+class Search:
+    """One results page to scrape"""
+    site: str
+    make: str = ""
+    model: str = ""
+    page: int = 1
+
+    @property
+    def url(self) -> str:
+        return SITES[self.site].search_url.format(
+            make=quote_plus(self.make), model=quote_plus(self.model), page=self.page
+        )
+
+
+@dataclass
+class ScrapeResult:
+    """Listings of one search and how they were obtained"""
+    search: Search
+    listings: List[Dict] = field(default_factory=list)
+    path: str = "failed"  # "static", "browser", "html" or "failed"
+    seconds: float = 0.0
+    error: Optional[str] = None
+    has_next: Optional[bool] = None  # None: the page has no pagination links
+
+
+def _first_text(element, xpaths: Tuple[str, ...], accept=lambda text: len(text) > 3) -> Optional[str]:
+    for xpath in xpaths:
+        for found in element.xpath(xpath):
+            text = " ".join(found.text_content().split())
+            if text and accept(text):
+                return text
+    return None
+
+
+def parse_listing(element, site: Site, base_url: str) -> Optional[Dict]:
+    """
+    Listing fields from one result element (title, price, year, mileage,
+    fuel_type, link: the columns services/listing_store.py imports)
+    """
+    lines = [line for line in (" ".join(t.split()) for t in element.itertext()) if line]
+    text = " | ".join(lines)
+    data = {
+        "title": _first_text(element, site.title),
+        "price": _first_text(element, site.price, lambda t: "€" in t),
+    }
+    # Fall back to the text lines: the price has a €, the title is the first other line
+    if not data["price"]:
+        data["price"] = next((line for line in lines if "€" in line), None)
+    if not data["title"]:
+        data["title"] = next((line for line in lines if "€" not in line and len(line) > 5), None)
+
+    year = _YEAR_RE.search(text)
+    mileage = _MILEAGE_RE.search(text)
+    # Fuel from the detail lines first: titles name trims ("Corolla Hybrid Look")
+    details = " | ".join(line for line in lines if line != data["title"]).lower()
+    lowered = details if any(fuel in details for fuel in _FUELS) else text.lower()
+    data["year"] = year.group() if year else None
+    data["mileage"] = mileage.group() if mileage else None
+    data["fuel_type"] = next((fuel.title() for fuel in _FUELS if fuel in lowered), None)
+    hrefs = element.xpath("./@href") or element.xpath(".//a/@href")
+    data["link"] = urljoin(base_url, hrefs[0]) if hrefs else None
+
+    if data["price"] or data["title"]:
+        return data
+    return None
+
+
+def parse_listings(html: str, site: Site, base_url: str = "") -> List[Dict]:
+    """
+    Listings of a results page
+
+    The first listing selector matching more than two elements is used (a
+    single match is usually a container or an ad, not a result list).
+    """
+    import lxml.html
+
+    if not html.strip():
+        return []
+    tree = lxml.html.fromstring(html)
+    for xpath in site.listing:
+        elements = tree.xpath(xpath)
+        if len(elements) > 2:
+            listings = [parse_listing(element, site, base_url) for element in elements]
+            return [listing for listing in listings if listing]
+    return []
+
+
+def has_next_page(html: str, site: Site) -> Optional[bool]:
+    """
+    Whether a results page links to a next page
+
+    Returns:
+        None when the page has no pagination links (unknown, e.g. a single page of results)
+    """
+    import lxml.html
+
+    if not html.strip() or not site.pagination:
+        return None
+    tree = lxml.html.fromstring(html)
+    for xpath in site.pagination:
+        containers = tree.xpath(xpath)
+        if containers:
+            return any(container.xpath(link) for container in containers for link in site.next_page)
+    return None
+
+
+class BrowserPool:
+    """Headless Chrome drivers shared by the scraping threads, started on demand"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._idle: List["WebDriver"] = []
+        self._created = 0
+        # Guards the counts; waiters are woken when a driver is released or discarded
+        self._cond = threading.Condition()
+        self._all: List["WebDriver"] = []
+
+    def _start(self) -> "WebDriver":
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument("--window-size=1920,1080")
+        options.add_argument(f"--user-agent={USER_AGENT}")
+        # Listings are read from the DOM: skip images, don't wait for every subresource
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.page_load_strategy = "eager"
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(settings.SCRAPER_TIMEOUT)
+        logger.info(f"🌐 Started headless browser {len(self._all) + 1}/{self.size}")
+        return driver
+
+    @contextmanager
+    def acquire(self) -> Iterator["WebDriver"]:
+        """Idle driver, a new one while below size, or wait for one to be released or discarded"""
+        with self._cond:
+            while not self._idle and self._created >= self.size:
+                self._cond.wait()
+            driver = self._idle.pop() if self._idle else None
+            if driver is None:
+                self._created += 1
+        if driver is None:
+            try:
+                driver = self._start()
+            except Exception:
+                self._free_slot()
+                raise
+            with self._cond:
+                self._all.append(driver)
+        try:
+            yield driver
+        except Exception:
+            # A driver that failed mid-page may be in any state: replace it
+            self._discard(driver)
+            raise
+        else:
+            with self._cond:
+                self._idle.append(driver)
+                self._cond.notify()
+
+    def _free_slot(self) -> None:
+        """One driver less: a waiting thread may start a new one"""
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _discard(self, driver: "WebDriver"):
+        with self._cond:
+            if driver in self._all:
+                self._all.remove(driver)
+        self._free_slot()
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._cond:
+            drivers, self._all, self._idle, self._created = self._all, [], [], 0
+            self._cond.notify_all()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+
+class ScrapePipeline:
+    """Runs searches in parallel: static HTTP + lxml first, headless browsers when needed"""
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 browsers: Optional[int] = None,
+                 use_browser: bool = True,
+                 save_html: Optional[Path] = None):
+        self.workers = workers or settings.SCRAPER_WORKERS
+        self.browsers = BrowserPool(browsers or settings.SCRAPER_BROWSERS) if use_browser else None
+        self.save_html = save_html
+        self._session: Optional["requests.Session"] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> "requests.Session":
+        """HTTP session whose connection pool is shared by all workers"""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.workers)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "en"})
+                    self._session = session
+        return self._session
+
+    def _fetch_static(self, search: Search) -> Optional[str]:
+        try:
+            resp = self.session.get(search.url, timeout=settings.SCRAPER_TIMEOUT)
+        except Exception as e:
+            logger.debug(f"Static fetch failed for {search.url}: {e}")
+            return None
+        if resp.status_code != 200:
+            logger.debug(f"Static fetch of {search.url}: HTTP {resp.status_code}")
+            return None
+        # Without a charset header requests assumes ISO-8859-1, which turns € into mojibake
+        if "charset=" not in resp.headers.get("Content-Type", "").lower():
+            resp.encoding = "utf-8"
+        return resp.text
+
+    def _fetch_browser(self, search: Search) -> str:
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        site = SITES[search.site]
+        with self.browsers.acquire() as driver:
+            driver.get(search.url)
+            # Kept on the driver: a replacement driver may get a discarded one's id()
+            if site.cookie_button and not getattr(driver, "cookies_accepted", False):
+                try:
+                    WebDriverWait(driver, 3).until(
+                        EC.element_to_be_clickable((By.XPATH, site.cookie_button))
+                    ).click()
+                except TimeoutException:
+                    pass
+                driver.cookies_accepted = True
+            try:
+                WebDriverWait(driver, settings.SCRAPER_TIMEOUT).until(
+                    EC.presence_of_element_located((By.XPATH, " | ".join(site.listing)))
+                )
+            except TimeoutException:
+                logger.warning(f"⚠️ No listings appeared on {search.url}")
+            return driver.page_source
+
+    def scrape(self, search: Search) -> ScrapeResult:
+        """Listings of one search (static path first, then a browser)"""
+        site = SITES[search.site]
+        result = ScrapeResult(search)
+        start = time.perf_counter()
+        try:
+            html = self._fetch_static(search) if site.static else None
+            listings = parse_listings(html, site, search.url) if html else []
+            if listings:
+                result.path = "static"
+            elif self.browsers:
+                html = self._fetch_browser(search)
+                listings = parse_listings(html, site, search.url)
+                result.path = "browser"
+            else:
+                reason = "no listings in static HTML" if html else \
+                    "static fetch failed" if site.static else "site needs JavaScript"
+                result.error = f"{reason}, browser disabled"
+            result.listings = listings
+            if html:
+                result.has_next = has_next_page(html, site)
+            if html and self.save_html:
+                self.save_html.mkdir(parents=True, exist_ok=True)
+                name = f"{search.site}-{search.make or 'all'}-{search.model or 'all'}-p{search.page}.html"
+                (self.save_html / name).write_text(html, encoding="utf-8")
+        except Exception as e:
+            result.path, result.error = "failed", str(e)
+            logger.warning(f"⚠️ Scraping {search.url} failed: {e}")
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def run(self, searches: List[Search], store: bool = True) -> Tuple[List[ScrapeResult], Dict]:
+        """
+        Scrape all searches in parallel, storing each page's listings as it completes
+
+        Pages after the last page of a search (one whose pagination has no
+        "next" link) are not fetched if they have not started yet.
+
+        Returns:
+            (results per search, run stats with listings per minute)
+        """
+        start = time.perf_counter()
+        results: List[ScrapeResult] = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scrape") as pool:
+                futures = {pool.submit(self.scrape, search): search for search in searches}
+                for future in as_completed(futures):
+                    if future.cancelled():
+                        continue
+                    result = future.result()
+                    results.append(result)
+                    if result.has_next is False:
+                        self._skip_after(result.search, futures)
+                    if store and result.listings:
+                        listing_store.upsert(result.listings, result.search.site)
+        finally:
+            if self.browsers:
+                self.browsers.close()
+        return results, run_stats(results, time.perf_counter() - start)
+
+    @staticmethod
+    def _skip_after(last: Search, futures: Dict) -> None:
+        """Cancel the queued searches for pages after last"""
+        skipped = 0
+        for future, search in futures.items():
+            if (search.site, search.make, search.model) == (last.site, last.make, last.model) \
+                    and search.page > last.page and future.cancel():
+                skipped += 1
+        if skipped:
+            logger.info(f"📄 {last.url} is the last page: {skipped} later pages skipped")
+
+
+def run_stats(results: List[ScrapeResult], seconds: float) -> Dict:
+    """Totals of a run: pages per path, listings, listings per minute"""
+    paths: Dict[str, int] = {}
+    for result in results:
+        paths[result.path] = paths.get(result.path, 0) + 1
+    listings = sum(len(result.listings) for result in results)
+    return {
+        "pages": len(results),
+        "paths": paths,
+        "listings": listings,
+        "seconds": round(seconds, 3),
+        "listings_per_minute": round(listings / seconds * 60, 1) if seconds > 0 else None,
+    }
+
+
+def scrape_html_files(paths: List[Path], site: str, workers: int) -> Tuple[List[ScrapeResult], Dict]:
+    """Parse saved results pages (offline, e.g. page_structure.html)"""
+    def parse(path: Path) -> ScrapeResult:
+        start = time.perf_counter()
+        html = path.read_text(encoding="utf-8", errors="replace")
+        listings = parse_listings(html, SITES[site], SITES[site].search_url.split("?")[0])
+        return ScrapeResult(Search(site), listings, "html", time.perf_counter() - start,
+                            has_next=has_next_page(html, SITES[site]))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(parse, paths))
+    return results, run_stats(results, time.perf_counter() - start)
+
+
+def write_csv(results: List[ScrapeResult], path: Path):
+    """Listings as CSV (title, price, year, mileage, fuel_type, link)"""
+    columns = ["title", "price", "year", "mileage", "fuel_type", "link"]
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        for result in results:
+            writer.writerows(result.listings)
+
+
+def main():
+    from config.log_config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Scrape car listings into the listing store")
+    parser.add_argument("--site", choices=sorted(SITES), default="webcar")
+    parser.add_argument("--make", action="append", default=[], help="Make to search (repeatable)")
+    parser.add_argument("--model", default="")
+    parser.add_argument("--pages", type=int, default=1, help="Results pages per make")
+    parser.add_argument("--workers", type=int, default=settings.SCRAPER_WORKERS)
+    parser.add_argument("--browsers", type=int, default=settings.SCRAPER_BROWSERS)
+    parser.add_argument("--no-browser", action="store_true", help="Static HTML only")
+    parser.add_argument("--html", type=Path, nargs="+", help="Parse saved pages instead of fetching")
+    parser.add_argument("--save-html", type=Path, help="Keep fetched pages here (offline fixtures)")
+    parser.add_argument("--csv", type=Path, help="Also write the listings to a CSV file")
+    parser.add_argument("--dry-run", action="store_true", help="Don't write to the listing store")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.html:
+        results, stats = scrape_html_files(args.html, args.site, args.workers)
+        if not args.dry_run:
+            for result in results:
+                listing_store.upsert(result.listings, args.site)
+    else:
+        searches = [Search(args.site, make, args.model, page)
+                    for make in (args.make or [""]) for page in range(1, args.pages + 1)]
+        pipeline = ScrapePipeline(args.workers, args.browsers, not args.no_browser, args.save_html)
+        results, stats = pipeline.run(searches, store=not args.dry_run)
+
+    if args.csv:
+        write_csv(results, args.csv)
+    logger.info(f"📊 Scraped {stats['listings']} listings from {stats['pages']} pages "
+                f"in {stats['seconds']}s ({stats['listings_per_minute']}/min) {stats['paths']}")
+
+
+if __name__ == "__main__":
+    main()
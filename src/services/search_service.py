@@ -1,10 +1,32 @@
 """
 Search services for YouTube and Google
 """
+import logging
 import os
 from typing import Optional
-from serpapi import GoogleSearch
 from config.settings import settings
+from core.deadline import RequestCancelled, io_timeout, run_cancellable
+
+logger = logging.getLogger(__name__)
+
+
+def serpapi_search(params: dict) -> dict:
+    """
+    Run a SerpAPI query against SERPAPI_BASE_URL
+    
+    Args:
+        params: SerpAPI parameters (engine, query, api_key, ...)
+        
+    Returns:
+        Parsed JSON results
+    """
+    from serpapi import GoogleSearch
+    
+    search = GoogleSearch(params)
+    search.BACKEND = settings.SERPAPI_BASE_URL
+    # The client's default timeout is 60000 s; stay within the request's budget
+    search.timeout = io_timeout(settings.SERPAPI_TIMEOUT)
+    return run_cancellable(search.get_dict)
 
 
 def youtube_search(query: str) -> str:
@@ -21,7 +43,7 @@ def youtube_search(query: str) -> str:
         return "❌ YouTube search unavailable: SERPAPI_API_KEY not configured"
     
     try:
-        print(f"🎬 Searching YouTube for: '{query}'")
+        logger.debug(f"🎬 Searching YouTube for: '{query}'")
         
         params = {
             "engine": "youtube",
@@ -29,15 +51,14 @@ def youtube_search(query: str) -> str:
             "api_key": settings.SERPAPI_API_KEY
         }
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = serpapi_search(params)
         video_results = results.get("video_results", [])
         
         if not video_results:
-            print("❌ No videos found")
+            logger.debug("❌ No videos found")
             return f"No YouTube videos found for '{query}'"
         
-        print(f"✅ Found {len(video_results)} videos, returning top 3")
+        logger.debug(f"✅ Found {len(video_results)} videos, returning top 3")
         
         # Collect structured video data
         videos_data = []
@@ -77,8 +98,10 @@ def youtube_search(query: str) -> str:
         
         return result_text
     
+    except RequestCancelled:
+        raise
     except Exception as e:
-        print(f"❌ YouTube search failed: {e}")
+        logger.error(f"❌ YouTube search failed: {e}")
         return f"❌ YouTube search error: {str(e)}"
 
 
@@ -96,7 +119,7 @@ def google_search(query: str) -> str:
         return "❌ Google search unavailable: SERPAPI_API_KEY not configured"
     
     try:
-        print(f"🔍 Searching Google for: '{query}'")
+        logger.debug(f"🔍 Searching Google for: '{query}'")
         
         params = {
             "engine": "google",
@@ -105,15 +128,14 @@ def google_search(query: str) -> str:
             "num": 5
         }
         
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        results = serpapi_search(params)
         organic_results = results.get("organic_results", [])
         
         if not organic_results:
-            print("❌ No results found")
+            logger.debug("❌ No results found")
             return f"No Google results found for '{query}'"
         
-        print(f"✅ Found {len(organic_results)} results")
+        logger.debug(f"✅ Found {len(organic_results)} results")
         
         # Format top 3 results
         formatted_results = []
@@ -136,9 +158,11 @@ def google_search(query: str) -> str:
             "\n\n".join(formatted_results)
         )
         
-        print("✅ Google search completed")
+        logger.debug("✅ Google search completed")
         return final_result
     
+    except RequestCancelled:
+        raise
     except Exception as e:
-        print(f"❌ Google search failed: {e}")
+        logger.error(f"❌ Google search failed: {e}")
         return f"❌ Google search error: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Precomputed display views of knowledge chunks
+
+Ingestion stores two views in every chunk's metadata, so the observation
+the agent reads is a concatenation at query time:
+
+- header: the "📄 [file.pdf - page N]" citation line, with the other pages of
+  a chunk compacted from near-duplicates (services/near_duplicates.py)
+- summary: the chunk's key sentences within SUMMARY_TOKENS, whitespace
+  collapsed (utils.text.key_sentences)
+
+Chunks of indexes built before the views existed get them when the index
+is loaded (services/index_manager.py).
+"""
+import re
+from typing import TYPE_CHECKING, Dict
+
+from utils.text import key_sentences
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# Approximate tokens of a chunk's summary (a full 1000-character chunk is ~200)
+SUMMARY_TOKENS = 80
+# Pages cited per header when a chunk stands for several near-duplicates
+MAX_CITATIONS = 4
+
+
+def citation(ref: Dict) -> str:
+    """"file.pdf - page N" (sources may be Windows paths)"""
+    source = re.split(r"[\\/]", ref.get("source") or "unknown.pdf")[-1]
+    page = ref.get("page")
+    return f"{source} - page {'N/A' if page is None else page}"
+
+
+def snippet_header(metadata: Dict) -> str:
+    """Citation line of a chunk, listing up to MAX_CITATIONS pages"""
+    refs = metadata.get("refs") or [metadata]
+    text = citation(refs[0])
+    if len(refs) > 1:
+        others = [citation(ref) for ref in refs[1:MAX_CITATIONS]]
+        more = len(refs) - MAX_CITATIONS
+        text += f"; also {', '.join(others)}" + (f" and {more} more" if more > 0 else "")
+    return f"📄 [{text}]"
+
+
+def add_views(doc: "Document") -> "Document":
+    """Store the header and summary of a chunk in its metadata (kept if already there)"""
+    if "header" not in doc.metadata:
+        doc.metadata["header"] = snippet_header(doc.metadata)
+    if "summary" not in doc.metadata:
+        doc.metadata["summary"] = key_sentences(doc.page_content, SUMMARY_TOKENS)
+    return doc
+
+
+def render(doc: "Document", full: bool = False) -> str:
+    """
+    Observation text of a chunk: its header, then its summary (or whole text)
+    """
+    metadata = doc.metadata
+    header = metadata.get("header") or snippet_header(metadata)
+    if full:
+        return f"{header}\n{doc.page_content.strip()}"
+    summary = metadata.get("summary")
+    if summary is None:
+        summary = key_sentences(doc.page_content, SUMMARY_TOKENS)
+    return f"{header}\n{summary}"
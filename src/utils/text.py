@@ -0,0 +1,112 @@
+"""Token estimates and extractive trimming of text (sentences, summaries)"""
+import re
+from typing import Dict, List, Set
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}|\n(?=[-•*\d])")
+
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "in", "is", "it", "my", "of", "on", "or", "should", "the",
+    "to", "what", "when", "where", "which", "why", "with", "you", "your",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (words and punctuation marks)"""
+    if not text:
+        return 0
+    return len(_TOKEN_RE.findall(text))
+
+
+def keywords(text: str) -> Set[str]:
+    """Lower-cased content words of a text"""
+    return {w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1}
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences / bullet lines"""
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text after roughly max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    matches = list(_TOKEN_RE.finditer(text))
+    if len(matches) <= max_tokens:
+        return text
+    return text[:matches[max_tokens - 1].end()].rstrip() + " …"
+
+
+def top_sentences(text: str, query: str, max_tokens: int) -> str:
+    """
+    Extractive trim: keep the sentences that best match the query,
+    in their original order, within max_tokens
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = split_sentences(text)
+    terms = keywords(query)
+    scored = []
+    for idx, sentence in enumerate(sentences):
+        overlap = len(terms & keywords(sentence))
+        # Earlier sentences win ties (headings / context come first)
+        scored.append((overlap, -idx, idx, sentence))
+    scored.sort(reverse=True)
+
+    chosen = []
+    used = 0
+    for _, _, idx, sentence in scored:
+        cost = estimate_tokens(sentence)
+        if used + cost > max_tokens:
+            continue
+        chosen.append((idx, sentence))
+        used += cost
+
+    if not chosen:
+        return truncate_tokens(text, max_tokens)
+    chosen.sort()
+    return " ".join(sentence for _, sentence in chosen)
+
+
+def key_sentences(text: str, max_tokens: int, min_tokens: int = 4) -> str:
+    """
+    Query-independent extractive summary: the sentences richest in the
+    text's frequent content words, in their original order, within max_tokens
+    (whitespace collapsed; fragments under min_tokens such as page headers skipped)
+    """
+    sentences = [" ".join(s.split()) for s in split_sentences(text)]
+    if estimate_tokens(text) <= max_tokens:
+        return " ".join(sentences)
+
+    frequency: Dict[str, int] = {}
+    for sentence in sentences:
+        for word in keywords(sentence):
+            frequency[word] = frequency.get(word, 0) + 1
+
+    scored = []
+    for idx, sentence in enumerate(sentences):
+        tokens = estimate_tokens(sentence)
+        if tokens < min_tokens:
+            continue
+        words = keywords(sentence)
+        # Words repeated across the chunk carry its topic; long sentences don't win on length alone
+        score = sum(frequency[w] for w in words) / (len(words) ** 0.5) if words else 0.0
+        scored.append((score, -idx, idx, sentence, tokens))
+    scored.sort(reverse=True)
+
+    chosen = []
+    used = 0
+    for _, _, idx, sentence, tokens in scored:
+        if used + tokens > max_tokens:
+            continue
+        chosen.append((idx, sentence))
+        used += tokens
+
+    if not chosen:
+        return truncate_tokens(" ".join(sentences), max_tokens)
+    chosen.sort()
+    return " ".join(sentence for _, sentence in chosen)
@@ -0,0 +1,182 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Canonical make -> other ways people write it
+MAKES: Dict[str, List[str]] = {
+    "acura": [],
+    "alfa romeo": ["alfa"],
+    "audi": [],
+    "bmw": [],
+    "buick": [],
+    "cadillac": [],
+    "chevrolet": ["chevy"],
+    "chrysler": [],
+    "citroen": ["citroën"],
+    "dacia": [],
+    "dodge": [],
+    "fiat": [],
+    "ford": [],
+    "gmc": [],
+    "honda": [],
+    "hyundai": [],
+    "infiniti": [],
+    "jaguar": [],
+    "jeep": [],
+    "kia": [],
+    "land rover": ["range rover"],
+    "lexus": [],
+    "mazda": [],
+    "mercedes-benz": ["mercedes", "mercedes benz", "benz"],
+    "mini": [],
+    "mitsubishi": [],
+    "nissan": [],
+    "opel": ["vauxhall"],
+    "peugeot": [],
+    "porsche": [],
+    "ram": [],
+    "renault": [],
+    "seat": [],
+    "skoda": ["škoda"],
+    "subaru": [],
+    "suzuki": [],
+    "tesla": [],
+    "toyota": [],
+    "volkswagen": ["vw"],
+    "volvo": [],
+}
+
+# Well-known model names -> make, for queries that only name the model
+MODELS: Dict[str, str] = {
+    "camry": "toyota", "corolla": "toyota", "rav4": "toyota", "prius": "toyota",
+    "hilux": "toyota", "tacoma": "toyota", "yaris": "toyota",
+    "civic": "honda", "accord": "honda", "cr-v": "honda", "crv": "honda", "jazz": "honda",
+    "f-150": "ford", "f150": "ford", "focus": "ford", "fiesta": "ford", "mustang": "ford",
+    "explorer": "ford", "ranger": "ford",
+    "silverado": "chevrolet", "malibu": "chevrolet", "camaro": "chevrolet", "corvette": "chevrolet",
+    "golf": "volkswagen", "passat": "volkswagen", "polo": "volkswagen", "jetta": "volkswagen",
+    "tiguan": "volkswagen",
+    "altima": "nissan", "sentra": "nissan", "qashqai": "nissan", "rogue": "nissan",
+    "elantra": "hyundai", "tucson": "hyundai", "sonata": "hyundai",
+    "sportage": "kia", "sorento": "kia", "rio": "kia",
+    "outback": "subaru", "forester": "subaru", "impreza": "subaru",
+    "wrangler": "jeep", "cherokee": "jeep",
+    "clio": "renault", "megane": "renault", "duster": "dacia", "sandero": "dacia",
+    "model 3": "tesla", "model s": "tesla", "model y": "tesla",
+}
+
+# Also ordinary words: only counted when capitalized ("Seat Ibiza", not "seat belt")
+_AMBIGUOUS = {"mini", "ram", "seat", "focus", "golf", "jazz", "ranger", "explorer", "rio", "polo", "benz"}
+
+_ALIASES = {make: make for make in MAKES}
+_ALIASES.update({alias: make for make, aliases in MAKES.items() for alias in aliases})
+_ALIASES.update(MODELS)
+
+# Longest names first so "range rover" wins over "rover", "model 3" over "model"
+_NAME_RE = re.compile(
+    r"(?<![\w-])(" + "|".join(re.escape(n) for n in sorted(_ALIASES, key=len, reverse=True)) + r")(?![\w-])",
+    re.IGNORECASE,
+)
+
+
+def detect_makes(text: str) -> List[str]:
+    """Canonical makes named in a text (directly, by alias or by model), in order of appearance"""
+    makes: List[str] = []
+    for match in _NAME_RE.finditer(text.replace("_", " ")):
+        name = match.group(1)
+        if name.lower() in _AMBIGUOUS and not name[0].isupper():
+            continue
+        make = _ALIASES[name.lower()]
+        if make not in makes:
+            makes.append(make)
+    return makes
+
+
+def detect_models(text: str) -> List[str]:
+    """Known model names in a text, in order of appearance"""
+    models: List[str] = []
+    for match in _NAME_RE.finditer(text.replace("_", " ")):
+        name = match.group(1)
+        model = name.lower()
+        if model not in MODELS or (model in _AMBIGUOUS and not name[0].isupper()):
+            continue
+        model = model.replace("crv", "cr-v").replace("f150", "f-150")
+        if model not in models:
+            models.append(model)
+    return models
+
+
+_YEAR_RE = re.compile(r"(?<!\d)(19[5-9]\d|20[0-4]\d)(?:\s*[-–]\s*(19[5-9]\d|20[0-4]\d|\d{2}))?(?!\d)")
+
+
+def detect_years(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Model-year range named in a text ("2015", "2015-2018", "2015-18")
+
+    Returns:
+        (first, last) year over all mentions, or None
+    """
+    years: List[int] = []
+    for match in _YEAR_RE.finditer(text):
+        first = int(match.group(1))
+        years.append(first)
+        if match.group(2):
+            last = int(match.group(2))
+            if last < 100:
+                last += first - first % 100
+            if first <= last <= first + 30:
+                years.append(last)
+    return (min(years), max(years)) if years else None
+
+
+# Topic sections of manuals, by the words that identify them
+SECTIONS: Dict[str, List[str]] = {
+    "brakes": ["brake", "brakes", "pads", "rotor", "rotors", "caliper", "abs"],
+    "tires": ["tire", "tires", "tyre", "tyres", "tread", "wheel", "wheels", "rotation", "lug", "spare"],
+    "engine": ["engine", "spark", "plug", "plugs", "piston", "timing", "belt", "cylinder", "ignition"],
+    "oil": ["oil", "lubricant", "viscosity", "dipstick"],
+    "cooling": ["coolant", "radiator", "antifreeze", "thermostat", "overheating", "overheat"],
+    "electrical": ["battery", "alternator", "fuse", "fuses", "starter", "wiring", "headlight", "bulb"],
+    "transmission": ["transmission", "clutch", "gear", "gearbox", "shift", "drivetrain"],
+    "suspension": ["suspension", "shock", "shocks", "strut", "struts", "alignment", "steering"],
+    "fuel": ["fuel", "gasoline", "injector", "injectors", "octane", "diesel"],
+    "climate": ["air conditioning", "a/c", "heater", "cabin", "filter", "refrigerant"],
+    "safety": ["airbag", "airbags", "seatbelt", "seat belt", "warning", "emergency", "jack"],
+}
+
+_SECTION_RES = {
+    section: re.compile(r"\b(" + "|".join(re.escape(w) for w in words) + r")\b", re.IGNORECASE)
+    for section, words in SECTIONS.items()
+}
+
+# Document types, by words in the file name or the first page
+DOC_TYPES: Dict[str, List[str]] = {
+    "owner_manual": ["owner", "owners", "owner's", "user manual", "handbook"],
+    "repair_guide": ["repair", "workshop", "service manual", "haynes", "chilton"],
+    "maintenance_guide": ["maintenance", "maintencance", "care guide", "upkeep"],
+    "bulletin": ["bulletin", "recall", "tsb"],
+}
+
+
+def classify_section(text: str, min_hits: int = 2) -> Optional[str]:
+    """Section whose words occur most often in a text (None below min_hits)"""
+    best, best_hits = None, 0
+    for section, pattern in _SECTION_RES.items():
+        hits = len(pattern.findall(text))
+        if hits > best_hits:
+            best, best_hits = section, hits
+    return best if best_hits >= min_hits else None
+
+
+def classify_doc_type(*texts: str) -> str:
+    """Document type from the first of its texts (file name, title page) that tells ("guide" when unknown)"""
+    for text in texts:
+        text = text.replace("_", " ").lower()
+        for doc_type, words in DOC_TYPES.items():
+            if any(word in text for word in words):
+                return doc_type
+    return "guide"
+
+
+def slug(name: str) -> str:
+    """File-system friendly name of a make or shard ("Land Rover" -> "land-rover")"""
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
@@ -0,0 +1,8 @@
+import os
+from pathlib import Path
+
+# Required settings without defaults; the tests never call these services
+os.environ.setdefault("SERPAPI_API_KEY", "test")
+os.environ.setdefault("SPRING_API_URL", "http://localhost:8080")
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "data"
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from core.admission import AdmissionController, AdmissionRejected, tenant_key
+
+
+def controller(**overrides):
+    options = {"max_concurrent": 1, "max_queue": 10, "max_per_tenant": 0, "queue_timeout": 5.0}
+    return AdmissionController(**{**options, **overrides})
+
+
+def test_free_slot_is_granted_at_once():
+    async def scenario():
+        admission = controller(max_concurrent=2)
+        first = await admission.acquire("a")
+        second = await admission.acquire("b")
+        return admission.snapshot(), first, second
+
+    snapshot, first, second = asyncio.run(scenario())
+    assert snapshot["in_flight"] == 2
+    assert first.granted_at is not None and second.granted_at is not None
+
+
+def test_waiting_tenants_are_served_round_robin():
+    async def scenario():
+        admission = controller()
+        holder = await admission.acquire("busy")
+        order = []
+
+        async def request(tenant):
+            ticket = await admission.acquire(tenant)
+            order.append(tenant)
+            admission.release(ticket)
+
+        # "busy" queues three requests before "quiet" queues one
+        tasks = [asyncio.ensure_future(request(t)) for t in ("busy", "busy", "busy", "quiet")]
+        await asyncio.sleep(0)
+        admission.release(holder)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["busy", "quiet", "busy", "busy"]
+
+
+def test_tenant_limit_rejects_with_429():
+    async def scenario():
+        admission = controller(max_concurrent=4, max_per_tenant=1)
+        await admission.acquire("a")
+        other = await admission.acquire("b")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("a")
+        return rejected.value, other, admission.snapshot()
+
+    rejected, other, snapshot = asyncio.run(scenario())
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert other.granted_at is not None
+    assert snapshot["rejected_total"]["tenant_limit"] == 1
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def scenario():
+        admission = controller(max_queue=2)
+        await admission.acquire("a")
+        waiting = [asyncio.ensure_future(admission.acquire(t)) for t in ("b", "c")]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("d")
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        return rejected.value, admission.snapshot()
+
+    rejected, snapshot = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    # Initial service time estimate 5 s, two requests ahead plus this one, one slot
+    assert rejected.retry_after == 15
+    assert snapshot["rejected_total"]["queue_full"] == 1
+    assert snapshot["queue_depth"] == 0  # cancelled waiters leave the queue
+
+
+def test_queue_timeout_rejects_and_frees_the_place():
+    async def scenario():
+        admission = controller(queue_timeout=0.05)
+        await admission.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("b")
+        return rejected.value, admission.snapshot()
+
+    rejected, snapshot = asyncio.run(scenario())
+    assert rejected.status_code == 503
+    assert snapshot["queue_depth"] == 0
+    assert snapshot["rejected_total"]["timeout"] == 1
+
+
+def test_release_is_idempotent():
+    async def scenario():
+        admission = controller()
+        ticket = await admission.acquire("a")
+        admission.release(ticket)
+        admission.release(ticket)
+        return admission.snapshot()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
+
+
+def test_background_thread_waits_for_a_slot():
+    async def scenario():
+        admission = controller()
+        assert await asyncio.to_thread(admission.acquire_threadsafe, "summary") is None  # no loop yet
+
+        first = await admission.acquire("a")
+        waiting = asyncio.ensure_future(asyncio.to_thread(admission.acquire_threadsafe, "summary"))
+        await asyncio.sleep(0.05)
+        queued = admission.snapshot()["queue_depth"]
+        admission.release(first)
+        ticket = await waiting
+        admission.release(ticket)
+        await asyncio.sleep(0)
+        return queued, ticket, admission.snapshot()
+
+    queued, ticket, snapshot = asyncio.run(scenario())
+    assert queued == 1
+    assert ticket.tenant == "summary"
+    assert snapshot["in_flight"] == 0
+
+
+def test_tenant_key_from_jwt_subject():
+    # {"sub": "42"}
+    token = "eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOiI0MiJ9.signature"
+    assert tenant_key(token, "conv-1") == "user:42"
+    assert tenant_key("not-a-jwt", "conv-1") == "conv:conv-1"
+    assert tenant_key(None, "conv-1") == "conv:conv-1"
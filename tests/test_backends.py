@@ -0,0 +1,139 @@
+import socket
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from core.backends import BackendPool, NoBackendAvailable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+import fakes  # noqa: E402
+
+URLS = ["http://a:11434", "http://b:11434", "http://c:11434"]
+
+
+def pool(**overrides):
+    options = {"failure_threshold": 2, "cooldown": 30.0, "probe_interval": 0}
+    return BackendPool(URLS, **{**options, **overrides})
+
+
+def backend(p, url):
+    return next(b for b in p.backends if b.url == url)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_least_outstanding_backend_is_chosen():
+    p = pool()
+    leases = [p.acquire() for _ in range(3)]
+
+    assert sorted(lease.url for lease in leases) == sorted(URLS)
+    p.release(leases[1])
+    assert p.acquire().url == leases[1].url
+
+
+def test_release_is_idempotent():
+    p = pool()
+    lease = p.acquire()
+    p.release(lease)
+    p.release(lease)
+
+    assert all(b.outstanding == 0 for b in p.backends)
+
+
+def test_affinity_key_prefers_the_same_backend():
+    p = pool()
+    first = p.acquire("conv-1")
+    p.release(first)
+
+    for _ in range(5):
+        lease = p.acquire("conv-1")
+        assert lease.url == first.url
+        p.release(lease)
+
+
+def test_affinity_gives_way_to_a_much_busier_backend():
+    p = pool(affinity_slack=1)
+    preferred = p.acquire("conv-1")
+    assert p.acquire("conv-1").url == preferred.url
+
+    # Preferred now has 2 outstanding, the others 0: more than the slack allows
+    assert p.acquire("conv-1").url != preferred.url
+
+
+def test_circuit_opens_after_consecutive_failures():
+    p = pool(failure_threshold=2)
+    target = backend(p, URLS[0])
+    for _ in range(2):
+        leases = [p.acquire() for _ in URLS]  # one on each backend
+        for lease in leases:
+            p.release(lease, ok=lease.url != target.url)
+
+    assert p._circuit(target) == "open"
+    for _ in range(10):
+        lease = p.acquire()
+        assert lease.url != target.url
+        p.release(lease)
+
+
+def test_half_open_circuit_allows_one_trial_and_closes_on_success(monkeypatch):
+    p = BackendPool([URLS[0]], failure_threshold=1, cooldown=10.0, probe_interval=0)
+    lease = p.acquire()
+    p.release(lease, ok=False)
+    with pytest.raises(NoBackendAvailable):
+        p.acquire()
+
+    now = time.monotonic()
+    monkeypatch.setattr("core.backends.time.monotonic", lambda: now + 11)
+    trial = p.acquire()
+    assert trial.trial
+    with pytest.raises(NoBackendAvailable):
+        p.acquire()  # only one trial request while half open
+
+    p.release(trial, ok=True)
+    assert p.snapshot()[0]["circuit"] == "closed"
+    assert not p.acquire().trial
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    p = BackendPool([URLS[0]], failure_threshold=1, cooldown=10.0, probe_interval=0)
+    p.release(p.acquire(), ok=False)
+
+    now = time.monotonic()
+    monkeypatch.setattr("core.backends.time.monotonic", lambda: now + 11)
+    p.release(p.acquire(), ok=False)
+
+    assert p.snapshot()[0]["circuit"] == "open"
+    assert not p.has_available()
+
+
+def test_probe_fails_over_from_a_down_backend():
+    server = fakes.serve(fakes.FakeOllama, 0)
+    up = f"http://127.0.0.1:{server.server_address[1]}"
+    down = f"http://127.0.0.1:{free_port()}"
+    try:
+        p = BackendPool([down, up], failure_threshold=1, probe_interval=0)
+        assert p.probe_all() == {down: False, up: True}
+
+        for _ in range(5):
+            lease = p.acquire("conv-1")
+            assert lease.url == up
+            p.release(lease)
+        assert p.has_available()
+        assert [b["healthy"] for b in p.snapshot()] == [False, True]
+    finally:
+        server.shutdown()
+
+
+def test_no_backend_available_when_all_are_down():
+    p = BackendPool([f"http://127.0.0.1:{free_port()}"], failure_threshold=1, probe_interval=0)
+    p.probe_all()
+
+    assert not p.has_available()
+    with pytest.raises(NoBackendAvailable):
+        p.acquire()
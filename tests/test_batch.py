@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core import batch, runs
+from core.admission import AdmissionController
+from core.backends import BackendPool
+from core.batch import BatchItem, BatchRunner, read_items
+
+
+@pytest.fixture
+def fake_agent(monkeypatch):
+    """
+    Fresh admission controller and backend pool, and an agent that answers at
+    once unless the question starts with "slow" (then it runs until cancelled)
+    """
+    admission = AdmissionController(max_concurrent=4, max_queue=100, max_per_tenant=0, queue_timeout=5.0)
+    pool = BackendPool(["http://ollama:11434"], probe_interval=0)
+    for module in (batch, runs):
+        monkeypatch.setattr(module, "admission", admission)
+        monkeypatch.setattr(module, "backend_pool", pool)
+
+    calls = []
+    cancelled = []
+
+    def invoke(question, base_url, token, cb, trace):
+        calls.append(question)
+        if question.lower().startswith("slow"):
+            try:
+                token.wait_for(threading.Event())
+            except Exception:
+                cancelled.append(question)
+                raise
+        return f"answer to {question}"
+
+    monkeypatch.setattr(BatchRunner, "_invoke", staticmethod(invoke))
+    return {"calls": calls, "cancelled": cancelled, "admission": admission, "pool": pool}
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_read_items():
+    items = read_items(['{"question": "What is ABS?", "id": "q1"}', "", '{"question": "Oil change?"}'])
+
+    assert items == [BatchItem(0, "What is ABS?", "q1"), BatchItem(1, "Oil change?", None)]
+
+
+@pytest.mark.parametrize("line", ['{"id": 1}', '{"question": "  "}', '["What is ABS?"]', "not json"])
+def test_read_items_rejects_invalid_lines(line):
+    with pytest.raises(ValueError):
+        read_items(['{"question": "ok"}', line])
+
+
+def test_duplicate_questions_are_answered_once(fake_agent):
+    items = read_items(['{"question": "What is ABS?"}', '{"question": "what is  ABS?"}',
+                        '{"question": "Oil change?"}'])
+
+    async def scenario():
+        return [result async for result in BatchRunner(concurrency=3).run(items)]
+
+    results = sorted(asyncio.run(scenario()), key=lambda r: r["index"])
+
+    assert sorted(fake_agent["calls"]) == ["Oil change?", "What is ABS?"]
+    assert [r["coalesced"] for r in results] == [False, True, False]
+    assert results[1]["answer"] == "answer to What is ABS?"
+    assert results[1]["question"] == "what is  ABS?"
+    assert fake_agent["admission"].snapshot()["in_flight"] == 0
+
+
+def test_follower_answers_itself_when_the_leader_is_cancelled(fake_agent):
+    runner = BatchRunner(concurrency=2)
+
+    async def scenario():
+        leader = asyncio.ensure_future(runner._answer(BatchItem(0, "slow question")))
+        while not fake_agent["calls"]:
+            await asyncio.sleep(0.01)
+        follower = asyncio.ensure_future(runner._answer(BatchItem(1, "SLOW question")))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        await asyncio.sleep(0.05)
+        # The follower now runs the question itself; end it like a disconnect would
+        runner.cancel("disconnect")
+        return await follower
+
+    result = asyncio.run(scenario())
+
+    assert fake_agent["calls"] == ["slow question", "SLOW question"]
+    assert not result["coalesced"]
+    assert result["error"] == "Request cancelled (disconnect)"
+    assert wait_for(lambda: len(fake_agent["cancelled"]) == 2)
+
+
+def test_closing_the_stream_cancels_running_and_queued_items(fake_agent):
+    items = [BatchItem(0, "fast question")] + [BatchItem(i, f"slow question {i}") for i in range(1, 5)]
+    runner = BatchRunner(concurrency=2)
+
+    async def scenario():
+        results = runner.run(items)
+        first = await results.__anext__()
+        await results.aclose()
+        return first
+
+    first = asyncio.run(scenario())
+
+    assert first["answer"] == "answer to fast question"
+    assert runner.token.cancelled
+    # Two slow items were running (cancelled), the queued ones never started
+    running = ["slow question 1", "slow question 2"]
+    assert wait_for(lambda: sorted(fake_agent["cancelled"]) == running)
+    assert sorted(fake_agent["calls"]) == ["fast question"] + running
+    assert fake_agent["admission"].snapshot()["in_flight"] == 0
+    assert fake_agent["pool"].snapshot()[0]["outstanding"] == 0
@@ -0,0 +1,100 @@
+import json
+import math
+from pathlib import Path
+
+import pytest
+
+from services import car_deal_service
+from services.car_deal_service import CarQuery, parse_car_query, rank_listings, score_listings
+from services.listing_store import ListingStore
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    """Models known to the scrapers come from the listing store"""
+    store = ListingStore(Path(":memory:"))
+    store.upsert([{"title": "BMW X5 xDrive30d", "link": "https://example.com/1"},
+                  {"title": "Volkswagen Golf 1.5 TSI", "link": "https://example.com/2"}], "test")
+    monkeypatch.setattr(car_deal_service, "listing_store", store)
+    return store
+
+
+def row(url, price=None, year=None, mileage=None, fuel=None):
+    return {"url": url, "price_eur": price, "year": year, "mileage_km": mileage, "fuel": fuel}
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("2020 BMW X5 under €50,000",
+     CarQuery(make="bmw", model="x5", year_min=2020, year_max=2020, price_max=50000)),
+    ("Audi diesel between 10k and 20k euros",
+     CarQuery(make="audi", price_min=10000, price_max=20000, fuel="diesel")),
+    ("toyota corolla under 100,000 km from 2018",
+     CarQuery(make="toyota", model="corolla", year_min=2018, mileage_max=100000)),
+    ("VW golf 2015-2018 max 15.000 eur",
+     CarQuery(make="volkswagen", model="golf", year_min=2015, year_max=2018, price_max=15000)),
+    ("cheap hybrid newer than 2018", CarQuery(year_min=2018, fuel="hybrid")),
+    ("mercedes under 80000 miles", CarQuery(make="mercedes-benz", mileage_max=128720)),
+])
+def test_parse_car_query(query, expected):
+    assert parse_car_query(query) == expected
+
+
+def test_cheaper_newer_and_less_driven_scores_higher():
+    rows = [row("old", 20000, 2012, 200000), row("best", 15000, 2020, 30000), row("dear", 40000, 2020, 30000)]
+
+    scores = score_listings(rows, CarQuery(price_max=40000))
+
+    assert scores.argmax() == 1
+    assert scores[0] < scores[1] and scores[2] < scores[1]
+    assert all(0.0 <= score <= 1.0 for score in scores)
+
+
+def test_unknown_values_score_zero_for_their_criterion():
+    rows = [row("known", 20000, 2018, 50000), row("unknown", None, 2018, None)]
+
+    scores = score_listings(rows, CarQuery(price_max=40000, mileage_max=100000))
+
+    assert scores[1] < scores[0]
+
+
+def test_fuel_mismatch_keeps_part_of_the_score():
+    rows = [row("diesel", 20000, 2018, 50000, "diesel"), row("petrol", 20000, 2018, 50000, "petrol")]
+
+    scores = score_listings(rows, CarQuery(fuel="diesel"))
+
+    assert scores[1] == pytest.approx(scores[0] * car_deal_service.FUEL_MISMATCH)
+
+
+def test_equal_values_do_not_divide_by_zero():
+    scores = score_listings([row("a", 20000, 2018, 50000), row("b", 20000, 2018, 50000)], CarQuery())
+
+    assert not any(math.isnan(score) for score in scores)
+    assert scores[0] == scores[1]
+
+
+def test_rank_keeps_store_order_on_ties_and_limits():
+    rows = [row(url, 20000, 2018, 50000) for url in "abcd"]
+
+    ranked = rank_listings(rows, CarQuery(), 3)
+
+    assert [r["url"] for r in ranked] == ["a", "b", "c"]
+    assert len({r["score"] for r in ranked}) == 1
+
+
+def test_rank_of_no_listings():
+    assert rank_listings([], CarQuery(), 3) == []
+
+
+def test_car_search_scores_every_match(store, monkeypatch):
+    monkeypatch.setattr(car_deal_service.settings, "CAR_SEARCH_LIMIT", 1)
+    # Many cheap old listings ahead of the best one in price order
+    store.upsert([{"title": f"Volkswagen Golf {i}", "price": f"{5000 + i}", "year": "2005",
+                   "mileage": "250.000 km", "link": f"https://example.com/old-{i}"} for i in range(300)]
+                 + [{"title": "Volkswagen Golf 8", "price": "19.000", "year": "2022", "mileage": "10.000 km",
+                     "link": "https://example.com/new"}], "test")
+
+    result = json.loads(car_deal_service.car_search("volkswagen golf under 20000"))
+
+    assert result["matches"] == 301
+    assert [listing["link"] for listing in result["ranked"]] == ["https://example.com/new"]
+    assert result["ranked"][0]["title"] == "Volkswagen Golf 8"
@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from core.deadline import CancelToken, RequestCancelled, current_token, run_cancellable, use_token, watchdog
+
+
+def test_deadline_cancels_the_token():
+    token = CancelToken(0.05)
+    cancelled = threading.Event()
+    token.on_cancel(cancelled.set)
+
+    assert cancelled.wait(2)
+    assert token.reason == "deadline"
+    with pytest.raises(RequestCancelled):
+        token.check()
+
+
+def test_finished_token_is_not_cancelled():
+    token = CancelToken(0.05)
+    token.finish()
+    time.sleep(0.15)
+
+    assert not token.cancelled
+    token.check()
+
+
+def test_finished_tokens_do_not_accumulate():
+    # Long deadlines, finished right away: the heap must not keep them all
+    for _ in range(2000):
+        CancelToken(3600).finish()
+    live = [CancelToken(3600) for _ in range(10)]
+
+    assert len(watchdog._heap) <= 2 * watchdog.COMPACT_MIN + len(live) + 2
+    for token in live:
+        token.finish()
+
+
+def test_remaining_and_timeout():
+    token = CancelToken(10)
+
+    assert 9 < token.remaining() <= 10
+    assert token.timeout(1.0) == 1.0
+    assert CancelToken().remaining() is None
+    token.finish()
+
+
+def test_run_cancellable_runs_in_the_callers_context():
+    token = CancelToken(None)
+    with use_token(token):
+        assert run_cancellable(current_token) is token
+    token.finish()
@@ -0,0 +1,92 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from services.listing_store import ListingStore, normalize, parse_amount, parse_fuel, split_title
+
+
+@pytest.fixture
+def store():
+    store = ListingStore(Path(":memory:"))
+    store.upsert([
+        {"title": "BMW X5 xDrive30d", "price": "€ 32.990", "year": "10/2017", "mileage": "146.000 km",
+         "fuel_type": "Diesel", "link": "https://example.com/1"},
+        {"title": "BMW X5 xDrive40e", "price": "€ 41.500", "year": "2020", "mileage": "60.000 km",
+         "fuel_type": "Plug-in Hybrid", "link": "https://example.com/2"},
+        {"title": "Audi A4 Avant 2.0 TDI", "price": "€ 15.990", "year": "2019", "mileage": "95.000 km",
+         "fuel_type": "Diesel", "link": "https://example.com/3"},
+        {"title": "Skoda Octavia", "price": "on request", "year": "2018", "link": "https://example.com/4"},
+        # Imported with the make and model spelled as the site shows them
+        {"title": "Used car", "make": "BMW", "model": "X5", "price": "28.000", "year": "2016",
+         "link": "https://example.com/5"},
+    ], source="test")
+    return store
+
+
+def urls(rows):
+    return [row["url"].rsplit("/", 1)[1] for row in rows]
+
+
+def test_parsers():
+    assert parse_amount("€24.990") == 24990
+    assert parse_amount("120.000 km") == 120000
+    assert parse_amount("on request") is None
+    assert parse_fuel("Plug-in Hybrid") == "hybrid"
+    assert split_title("BMW X5 xDrive30d M Sport") == ("bmw", "x5")
+
+
+def test_normalize_drops_listings_without_link():
+    assert normalize({"title": "BMW X5"}, "test") is None
+    assert normalize({"title": "BMW X5", "link": "u"}, "test")["make"] == "bmw"
+
+
+def test_search_by_make_and_model_cheapest_first(store):
+    assert urls(store.search(make="bmw", model="x5")) == ["5", "1", "2"]
+    assert urls(store.search(make="BMW", model="X5", limit=1)) == ["5"]
+
+
+def test_search_ranges_are_inclusive(store):
+    assert urls(store.search(year_min=2019, year_max=2020)) == ["3", "2"]
+    assert urls(store.search(price_max=32990)) == ["3", "5", "1"]
+    assert urls(store.search(mileage_max=95000)) == ["3", "2"]
+
+
+def test_search_selected_columns_without_limit(store):
+    rows = store.search(make="bmw", limit=None, columns=("id", "price_eur"))
+
+    assert [set(row) for row in rows] == [{"id", "price_eur"}] * 3
+    assert [row["url"] for row in store.get([rows[2]["id"], rows[0]["id"], -1])] == [
+        "https://example.com/2", "https://example.com/5"]
+    with pytest.raises(ValueError):
+        store.search(columns=("id; DROP TABLE listings",))
+
+
+def test_listings_without_price_come_last(store):
+    assert urls(store.search())[-1] == "4"
+
+
+def test_search_by_fuel(store):
+    assert urls(store.search(fuel="diesel")) == ["3", "1"]
+
+
+def test_upsert_refreshes_by_url(store):
+    first_seen = store.search(make="audi")[0]["first_seen"]
+    store.upsert([{"title": "Audi A4 Avant 2.0 TDI", "price": "€ 14.500", "link": "https://example.com/3"}], "test")
+
+    rows = store.search(make="audi")
+    assert len(rows) == 1
+    assert rows[0]["price_eur"] == 14500
+    assert rows[0]["first_seen"] == first_seen
+
+
+def test_stale_listings_are_skipped_and_pruned(store):
+    assert store.search(max_age_seconds=3600)
+    time.sleep(0.01)
+    assert store.search(max_age_seconds=0.001) == []
+    assert store.prune(0.001) == 5
+    assert store.search() == []
+
+
+def test_models_of_a_make(store):
+    assert store.models("BMW") == ["x5"]
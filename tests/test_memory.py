@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from config.settings import settings
+from core import memory as memory_module
+from core.memory import SummaryStore, load_previous_history, setup_memory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+import fakes  # noqa: E402
+
+
+@pytest.fixture
+def spring(monkeypatch):
+    server = fakes.serve(fakes.FakeSpring, 0)
+    monkeypatch.setattr(settings, "SPRING_API_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    fakes.FakeSpring.summaries.clear()
+    yield fakes.FakeSpring
+    server.shutdown()
+
+
+def test_summary_is_stored_with_the_conversation(tmp_path, spring):
+    SummaryStore(tmp_path / "node-a").save("conv-1", "User drives a 2015 Golf.", 12, "token")
+
+    # Another node without a local copy reads it from the API
+    record = SummaryStore(tmp_path / "node-b").load("conv-1", "token")
+    assert record == {"summary": "User drives a 2015 Golf.", "covered": 12}
+    assert spring.summaries["/api/conversations/conv-1/summary"]["covered"] == 12
+
+
+def test_load_prefers_the_record_covering_more_messages(tmp_path, spring):
+    store = SummaryStore(tmp_path)
+    store.save("conv-1", "old", 4, "token")
+    store.save("conv-1", "newer, local only", 8)
+
+    assert store.load("conv-1", "token")["summary"] == "newer, local only"
+    assert store.load("conv-2", "token") is None
+
+
+def test_local_cache_when_the_api_has_no_summaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SPRING_API_URL", "http://127.0.0.1:9")  # nothing listens
+    store = SummaryStore(tmp_path)
+    store.save("conv-1", "cached", 6, "token")
+
+    assert store.load("conv-1", "token")["summary"] == "cached"
+
+
+def history(n):
+    return [{"role": "USER" if i % 2 == 0 else "ASSISTANT", "content": f"message {i}"} for i in range(n)]
+
+
+def test_messages_not_covered_by_the_summary_are_sent_verbatim(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_WINDOW", 2)
+    monkeypatch.setattr(memory_module, "fetch_conversation_history", lambda conv_id, token: history(10))
+    store = SummaryStore(tmp_path)
+    store.save("conv-1", "Earlier: the user asked about brakes.", 4)
+    monkeypatch.setattr(memory_module, "summary_store", store)
+
+    memory = setup_memory()
+    load_previous_history(memory, "conv-1", None)
+    contents = [m.content for m in memory.buffer_as_messages]
+
+    # Summary of messages 0-3, messages 4-5 verbatim (summary update pending), window 6-9
+    assert contents == ["Summary of earlier conversation: Earlier: the user asked about brakes."] + [
+        f"message {i}" for i in range(4, 10)
+    ]
+
+
+def test_uncovered_messages_are_capped_at_one_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "MEMORY_WINDOW", 2)
+    monkeypatch.setattr(memory_module, "fetch_conversation_history", lambda conv_id, token: history(20))
+    monkeypatch.setattr(memory_module, "summary_store", SummaryStore(tmp_path))
+
+    memory = setup_memory()
+    load_previous_history(memory, "conv-1", None)
+
+    assert [m.content for m in memory.buffer_as_messages] == [f"message {i}" for i in range(12, 20)]
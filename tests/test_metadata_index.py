@@ -0,0 +1,72 @@
+import pytest
+
+from services.metadata_index import MetadataIndex, bitmap, parse_inline_filters, positions, query_filters
+
+
+def meta(make=None, model=None, year_min=None, year_max=None, section="brakes", doc_type="owner_manual"):
+    return {"make": make, "model": model, "year_min": year_min, "year_max": year_max,
+            "section": section, "doc_type": doc_type}
+
+
+@pytest.fixture
+def index():
+    return MetadataIndex([
+        (meta("toyota", "corolla", 2014, 2018), "Corolla brakes"),  # 0
+        (meta("toyota", "rav4", 2019, 2019, section="engine"), "RAV4 engine"),  # 1
+        (meta("bmw", "x5", 2016, 2020), "X5 brakes"),  # 2
+        (meta(section="tires", doc_type="guide"), "General tire care"),  # 3
+    ])
+
+
+def selected(index, filters):
+    return positions(index.select(filters), index.size)
+
+
+def test_bitmap_round_trip():
+    assert positions(bitmap([0, 3, 9], 10), 10) == [0, 3, 9]
+    assert positions(bitmap([], 5), 5) == []
+
+
+def test_no_filters_select_everything(index):
+    assert selected(index, None) == [0, 1, 2, 3]
+    assert selected(index, {}) == [0, 1, 2, 3]
+
+
+def test_values_are_ored_and_fields_anded(index):
+    assert selected(index, {"make": ["toyota", "bmw"]}) == [0, 1, 2]
+    assert selected(index, {"make": ["toyota"], "section": ["brakes"]}) == [0]
+
+
+def test_none_accepts_chunks_without_the_field(index):
+    assert selected(index, {"make": ["bmw", None]}) == [2, 3]
+
+
+def test_year_matches_the_chunk_range(index):
+    assert selected(index, {"year": [2017]}) == [0, 2]
+    assert selected(index, {"year": ["2019", None]}) == [1, 2, 3]
+    assert selected(index, {"year": [2030]}) == []
+
+
+def test_values_are_case_insensitive(index):
+    assert selected(index, {"make": ["BMW"]}) == [2]
+
+
+def test_unknown_field_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.select({"color": ["red"]})
+
+
+def test_counts(index):
+    assert index.counts("make") == {"toyota": 2, "bmw": 1, "None": 1}
+
+
+def test_query_filters_accept_generic_chunks():
+    assert query_filters("brake noise on my 2016 Toyota") == {"make": ["toyota", None], "year": [2016, None]}
+    assert query_filters("how do brakes work") == {}
+
+
+def test_inline_filters_are_split_off():
+    query, filters = parse_inline_filters("squealing brakes make:toyota section:brakes")
+
+    assert query == "squealing brakes"
+    assert filters == {"make": ["toyota"], "section": ["brakes"]}
@@ -0,0 +1,24 @@
+from core.metrics import CollectedCounter, Counter, Registry
+
+
+def test_collected_counter_is_exported_as_a_counter():
+    registry = Registry()
+    registry.register(CollectedCounter(
+        "admission_rejected_total", "Rejected requests by reason",
+        lambda: {("queue_full",): 2, ("timeout",): 1}, labelnames=["reason"]))
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE admission_rejected_total counter" in lines
+    assert any(line.startswith('admission_rejected_total{reason="queue_full",worker="') and line.endswith(" 2")
+               for line in lines)
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("tool_errors_total", "Errors", ["tool"]))
+    counter.inc(tool='C:\\tools\\"search"\nv2')
+
+    line = registry.render().splitlines()[-1]
+
+    assert line.startswith('tool_errors_total{tool="C:\\\\tools\\\\\\"search\\"\\nv2",worker="')
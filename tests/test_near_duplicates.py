@@ -0,0 +1,73 @@
+from langchain_core.documents import Document
+
+from services.near_duplicates import compact_chunks, find_clusters, jaccard, shingles
+
+WARNING = ("Never open the radiator cap while the engine is hot. Hot coolant can cause "
+           "serious burns. Wait until the engine has cooled down before checking the level.")
+
+
+def chunk(text, page, **metadata):
+    return Document(page_content=text, metadata={"source": "manual.pdf", "page": page, **metadata})
+
+
+def test_shingles_of_short_and_empty_texts():
+    assert shingles("") == set()
+    assert len(shingles("check the oil")) == 1
+    assert shingles("Check THE oil level now") == shingles("check the oil level now")
+
+
+def test_jaccard_of_empty_sets_is_zero():
+    assert jaccard(set(), set()) == 0.0
+    assert jaccard({1, 2}, {2, 3}) == 1 / 3
+
+
+def test_identical_and_near_identical_texts_cluster():
+    texts = [WARNING, "Rotate the tires every 10,000 km to even out tread wear.", WARNING + " See page 12.", WARNING]
+
+    assert find_clusters(texts) == [[0, 2, 3]]
+
+
+def test_threshold_is_inclusive():
+    a = " ".join(f"w{i}" for i in range(20))  # 16 shingles
+    b = " ".join(f"w{i}" for i in range(21))  # the same 16 plus one
+    similarity = jaccard(shingles(a), shingles(b))
+
+    assert find_clusters([a, b], threshold=similarity) == [[0, 1]]
+    assert find_clusters([a, b], threshold=similarity + 0.01) == []
+
+
+def test_different_groups_are_never_merged():
+    assert find_clusters([WARNING, WARNING], groups=[("toyota",), ("bmw",)]) == []
+
+
+def test_empty_texts_are_not_clustered():
+    assert find_clusters(["", "", "   "]) == []
+    assert find_clusters([]) == []
+
+
+def test_compaction_keeps_longest_member_at_first_position():
+    chunks = [
+        chunk(WARNING, 3),
+        chunk("Rotate the tires every 10,000 km to even out tread wear.", 4),
+        chunk(WARNING + " See page 12.", 9),
+        chunk(WARNING, 3),  # same page twice: one reference
+    ]
+
+    compacted, stats = compact_chunks(chunks)
+
+    assert stats == {"chunks": 4, "kept": 2, "merged": 2, "clusters": 1}
+    canonical = compacted[0]
+    assert canonical.page_content == WARNING + " See page 12."
+    assert canonical.metadata["refs"] == [{"source": "manual.pdf", "page": 3}, {"source": "manual.pdf", "page": 9}]
+    assert canonical.metadata["duplicates"] == 2
+    assert compacted[1] is chunks[1]
+    assert "refs" not in chunks[2].metadata  # the input chunks are left alone
+
+
+def test_compaction_respects_filterable_metadata():
+    chunks = [chunk(WARNING, 1, make="toyota"), chunk(WARNING, 1, make="bmw")]
+
+    compacted, stats = compact_chunks(chunks)
+
+    assert stats["merged"] == 0
+    assert compacted == chunks
@@ -0,0 +1,44 @@
+import json
+
+from core.prompt_builder import trim_json, trim_observation
+from utils.text import estimate_tokens
+
+
+def listings(n):
+    return {
+        "filters": {"make": "bmw"},
+        "matches": 30,
+        "ranked": [{"title": f"BMW X5 {i}", "price": "€20.000", "year": 2019, "mileage": "90.000 km",
+                    "fuel": "diesel", "link": f"https://example.com/{i}", "freshness": "1 h ago"}
+                   for i in range(n)],
+    }
+
+
+def test_short_observation_unchanged():
+    assert trim_observation("Brake pads last 50,000 km.", "brake pads", 100) == "Brake pads last 50,000 km."
+
+
+def test_json_observation_drops_whole_items():
+    observation = json.dumps(listings(3), indent=2)
+
+    trimmed = trim_observation(observation, "bmw x5", 80)
+
+    data = json.loads(trimmed)
+    assert estimate_tokens(trimmed) <= 80
+    assert [item["title"] for item in data["ranked"]] == ["BMW X5 0"]
+    assert data["matches"] == 30
+
+
+def test_json_drops_trailing_fields_once_one_item_is_left():
+    data = json.loads(trim_json(listings(3), 60))
+
+    assert data["filters"] == {"make": "bmw"}
+    assert data["ranked"] == [{"title": "BMW X5 0", "price": "€20.000", "year": 2019}]
+
+
+def test_invalid_json_falls_back_to_text_trim():
+    observation = "[not json] " + "Rotate the tires. " * 100
+
+    trimmed = trim_observation(observation, "tires", 20)
+
+    assert estimate_tokens(trimmed) <= 20
@@ -0,0 +1,39 @@
+import threading
+
+from core.deadline import CancelToken, current_token, use_token, wait_event
+from services.rag_service import gather_sources
+
+
+def test_retrievers_inherit_the_request_token():
+    token = CancelToken(None)
+    seen = {}
+
+    def search(timings):
+        seen["token"] = current_token()
+        return []
+
+    with use_token(token):
+        results = gather_sources({"bm25": search}, timeout=2, straggler=None)
+
+    assert results["bm25"]["status"] == "ok"
+    assert seen["token"] is token
+    token.finish()
+
+
+def test_cancelled_request_stops_a_waiting_retriever():
+    token = CancelToken(None)
+    never = threading.Event()
+
+    def search(timings):
+        wait_event(never)  # like a query waiting for its embedding
+        return []
+
+    try:
+        with use_token(token):
+            threading.Timer(0.05, token.cancel, args=("disconnect",)).start()
+            results = gather_sources({"faiss": search}, timeout=2, straggler=None)
+    finally:
+        never.set()  # don't leave a pool worker blocked if the token was not inherited
+
+    assert results["faiss"]["status"] == "error"
+    assert "disconnect" in results["faiss"]["error"]
@@ -0,0 +1,180 @@
+import threading
+import time
+
+import pytest
+
+from conftest import FIXTURES
+from services.scraper_service import SITES, BrowserPool, ScrapePipeline, Search, has_next_page, parse_listings
+
+SITE = SITES["webcar"]
+BASE_URL = "https://www.webcar.eu/eu-en/car-search"
+
+
+@pytest.fixture(scope="module")
+def html():
+    return (FIXTURES / "webcar_search.html").read_text(encoding="utf-8")
+
+
+def test_parse_listings_from_saved_page(html):
+    listings = parse_listings(html, SITE, BASE_URL)
+
+    # 24 vehicle cards; the promo card and the pagination are not listings
+    assert len(listings) == 24
+    assert listings[0] == {
+        "title": "Toyota Corolla 1.8 Hybrid",
+        "price": "€ 46.990",
+        "year": "2014",
+        "mileage": "106.000 km",
+        "fuel_type": "Diesel",  # from the details, not the trim in the title
+        "link": "https://www.webcar.eu/eu-en/car/toyota-corolla-100000",
+    }
+    assert listings[-1]["title"] == "Volkswagen Golf 1.5 TSI"
+    assert listings[-1]["link"].endswith("/volkswagen-golf-100023")
+
+
+def test_parse_listings_without_results():
+    assert parse_listings("", SITE) == []
+    assert parse_listings("<html><body><article>Only one</article></body></html>", SITE) == []
+
+
+def test_next_page_detected(html):
+    assert has_next_page(html, SITE) is True
+
+
+def test_last_page_detected():
+    html = ('<html><body><nav class="pagination"><a href="?page=1">1</a>'
+            '<span class="current">2</span><a class="next disabled">Next</a></nav></body></html>')
+    assert has_next_page(html, SITE) is False
+
+
+def test_page_without_pagination_is_unknown():
+    assert has_next_page("<html><body><p>24 vehicles</p></body></html>", SITE) is None
+
+
+def test_search_url_pages():
+    assert Search("webcar", "audi", "a4", 3).url.endswith("brand=audi&model=a4&page=3")
+
+
+class OfflinePipeline(ScrapePipeline):
+    """Serves pages from a dict instead of the network"""
+
+    def __init__(self, pages):
+        super().__init__(workers=1, use_browser=False)
+        self.pages = pages
+        self.fetched = []
+
+    def _fetch_static(self, search):
+        self.fetched.append(search.page)
+        return self.pages.get(search.page)
+
+
+def test_pages_after_the_last_are_skipped(html):
+    last = html.replace('rel="next" class="next"', 'class="next disabled"')
+    pipeline = OfflinePipeline({page: last if page == 1 else html for page in range(1, 7)})
+
+    results, stats = pipeline.run([Search("webcar", "audi", page=page) for page in range(1, 7)], store=False)
+
+    # One worker: page 2 may have started before page 1's result was seen, the others not
+    assert pipeline.fetched in ([1], [1, 2])
+    assert results[0].has_next is False
+    assert stats["pages"] == len(pipeline.fetched)
+
+
+def test_static_only_failure_has_a_reason():
+    pipeline = OfflinePipeline({1: "<html><body><p>Enable JavaScript</p></body></html>"})
+
+    result = pipeline.scrape(Search("webcar", "audi"))
+
+    assert result.path == "failed"
+    assert result.error == "no listings in static HTML, browser disabled"
+    assert pipeline.scrape(Search("webcar", "audi", page=2)).error == "static fetch failed, browser disabled"
+
+
+class FakeDriver:
+    def __init__(self, number):
+        self.number = number
+        self.quit_called = False
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeBrowserPool(BrowserPool):
+    """Starts fake drivers instead of Chrome"""
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.started = []
+
+    def _start(self):
+        driver = FakeDriver(len(self.started))
+        self.started.append(driver)
+        return driver
+
+
+def test_browser_pool_reuses_idle_drivers():
+    pool = FakeBrowserPool(2)
+
+    with pool.acquire() as first:
+        pass
+    with pool.acquire() as second:
+        pass
+
+    assert second is first
+    assert len(pool.started) == 1
+
+
+def test_browser_pool_waiter_gets_a_replacement_for_a_failed_driver():
+    pool = FakeBrowserPool(1)
+    holding = threading.Event()
+    fail = threading.Event()
+    got = []
+
+    def failing():
+        with pytest.raises(RuntimeError):
+            with pool.acquire():
+                holding.set()
+                fail.wait(5)
+                raise RuntimeError("page load timeout")
+
+    def waiting():
+        with pool.acquire() as driver:
+            got.append(driver)
+
+    first = threading.Thread(target=failing, daemon=True)
+    first.start()
+    assert holding.wait(5)
+    second = threading.Thread(target=waiting, daemon=True)
+    second.start()
+    time.sleep(0.05)
+    assert not got  # the pool is full: the second thread waits
+    fail.set()
+    first.join(5)
+    second.join(5)
+
+    assert not second.is_alive()
+    assert got == [pool.started[1]]
+    assert pool.started[0].quit_called
+
+
+def test_browser_pool_start_failure_frees_the_slot():
+    pool = FakeBrowserPool(1)
+    start = pool._start
+    pool._start = lambda: (_ for _ in ()).throw(RuntimeError("no chrome"))
+
+    with pytest.raises(RuntimeError):
+        with pool.acquire():
+            pass
+    pool._start = start
+    with pool.acquire() as driver:
+        assert driver is pool.started[0]
+
+
+def test_browser_pool_close_quits_every_driver():
+    pool = FakeBrowserPool(2)
+    with pool.acquire():
+        with pool.acquire():
+            pass
+    pool.close()
+
+    assert all(driver.quit_called for driver in pool.started)
@@ -0,0 +1,52 @@
+from utils.text import estimate_tokens, key_sentences, split_sentences, top_sentences, truncate_tokens
+
+MANUAL = ("Brake pads should be checked every 10,000 km. "
+          "The dashboard clock can be set from the settings menu. "
+          "Replace the brake pads when they are thinner than 3 mm. "
+          "Tire pressure is listed on the driver's door frame.")
+
+
+def test_estimate_tokens_counts_words_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("Check the oil, then start.") == 7
+
+
+def test_split_sentences_and_bullets():
+    assert split_sentences("First. Second!\n- bullet\n\nNew paragraph") == ["First.", "Second!", "- bullet", "New paragraph"]
+
+
+def test_truncate_tokens():
+    assert truncate_tokens("one two three", 5) == "one two three"
+    assert truncate_tokens("one two three four", 2) == "one two …"
+    assert truncate_tokens("anything", 0) == ""
+
+
+def test_top_sentences_keeps_best_matches_in_order():
+    trimmed = top_sentences(MANUAL, "when to replace brake pads", 25)
+
+    assert trimmed == ("Brake pads should be checked every 10,000 km. "
+                       "Replace the brake pads when they are thinner than 3 mm.")
+
+
+def test_top_sentences_ties_prefer_earlier_sentences():
+    text = "Alpha one here. Beta two here. Gamma three here."
+    assert top_sentences(text, "unrelated", 4) == "Alpha one here."
+
+
+def test_top_sentences_falls_back_to_truncation():
+    text = "A single very long sentence without any break that goes on and on"
+    assert top_sentences(text, "break", 3) == "A single very …"
+
+
+def test_key_sentences_summarize_within_budget():
+    text = "Page 12\n\n" + MANUAL
+
+    summary = key_sentences(text, 25)
+
+    assert estimate_tokens(summary) <= 25
+    assert "Page 12" not in summary  # fragments under min_tokens are skipped
+    assert "brake pads" in summary.lower()
+
+
+def test_key_sentences_of_short_text_collapse_whitespace():
+    assert key_sentences("Check   the\noil level.", 80) == "Check the oil level."
@@ -0,0 +1,76 @@
+import time
+
+from config.settings import settings
+from core.warmup import Warmup
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_all_steps_succeed():
+    warmup = Warmup()
+
+    assert warmup.run([("a", lambda: None), ("b", lambda: {"docs": 3})])
+    snapshot = warmup.snapshot()
+    assert snapshot["ready"]
+    assert snapshot["steps"]["b"]["detail"] == {"docs": 3}
+    assert snapshot["steps"]["a"]["attempts"] == 1
+
+
+def test_failed_step_is_retried_until_it_succeeds(monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_MAX", 0.02)
+    calls = {"ollama": 0, "index": 0}
+
+    def ollama():
+        calls["ollama"] += 1
+        if calls["ollama"] < 3:
+            raise ConnectionError("backend down")
+
+    def index():
+        calls["index"] += 1
+
+    warmup = Warmup()
+    assert not warmup.run([("index", index), ("ollama", ollama)])
+    assert warmup.status == "failed"
+
+    assert wait_for(lambda: warmup.ready)
+    assert calls == {"ollama": 3, "index": 1}
+    snapshot = warmup.snapshot()
+    assert snapshot["steps"]["ollama"]["status"] == "done"
+    assert snapshot["steps"]["ollama"]["attempts"] == 3
+    assert "retry_in_s" not in snapshot
+
+
+def test_retry_stops_on_request(monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_RETRY_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_MAX", 0.01)
+
+    def down():
+        raise ConnectionError("backend down")
+
+    warmup = Warmup()
+    warmup.run([("ollama", down)])
+    assert wait_for(lambda: warmup.steps["ollama"]["attempts"] >= 2)
+    warmup.stop()
+    warmup._retry_thread.join(1)
+
+    assert not warmup._retry_thread.is_alive()
+    assert warmup.status == "failed"
+
+
+def test_retry_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_RETRY_SECONDS", 0)
+
+    def down():
+        raise ConnectionError("backend down")
+
+    warmup = Warmup()
+    assert not warmup.run([("ollama", down)])
+    assert warmup._retry_thread is None